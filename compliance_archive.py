@@ -0,0 +1,220 @@
+# compliance_archive.py
+"""
+Content-addressed archive of the input exports.
+
+Each archived hours.xlsx / active.xlsx is stored once, keyed by the workbook's
+content hash, as normalized Parquet (zstd) instead of a copy of the workbook.
+Rows are deduplicated across snapshots on a hash of their normalized values: a
+snapshot adds only the rows no earlier snapshot of its kind holds, each under
+the next sequential Row Id, and keeps the ordered list of its Row Ids (mostly
+ascending runs, which compress to almost nothing). Consecutive near-identical
+exports therefore cost little more than their changed rows.
+
+    archive/catalog.json                      every snapshot: kind, digest, taken, rows, chunks
+    archive/<kind>/rows_<digest>.parquet      rows first seen in that snapshot, with Row Id and Row Hash
+    archive/<kind>/snapshot_<digest>.parquet  the snapshot's Row Ids, in export order
+
+The catalog is written last, so a snapshot exists once it is listed there.
+load_as_of() returns "hours (or the roster) as of date X" from the Parquet files
+alone; openpyxl is not involved. Archiving the same export twice is a no-op.
+"""
+import os
+import re
+import json
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from compliance_ingest import file_digest, load_normalized, apply_filters, project, categorize, decategorize
+
+ARCHIVE_VERSION = 1
+ARCHIVE_DIR_NAME = 'archive'
+CATALOG_NAME = 'catalog.json'
+HASH_COL = 'Row Hash'
+ID_COL = 'Row Id'
+COMPRESSION = 'zstd'
+
+
+# ---------- Catalog ----------
+def read_catalog(archive_dir):
+    path = os.path.join(archive_dir, CATALOG_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        catalog = json.load(f)
+    if catalog.get('version') != ARCHIVE_VERSION:
+        raise ValueError(f"{path} is archive version {catalog.get('version')}, expected {ARCHIVE_VERSION}")
+    return catalog['snapshots']
+
+
+def _write_catalog(archive_dir, snapshots):
+    path = os.path.join(archive_dir, CATALOG_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': ARCHIVE_VERSION, 'snapshots': snapshots}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def snapshots(archive_dir, kind):
+    # Catalog entries of kind, oldest first; 'taken' as a datetime
+    entries = [dict(e, taken=datetime.fromisoformat(e['taken'])) for e in read_catalog(archive_dir) if e['kind'] == kind]
+    return sorted(entries, key=lambda e: e['taken'])
+
+
+def as_of(archive_dir, kind, when):
+    # The latest snapshot of kind taken at or before `when`, else None
+    earlier = [e for e in snapshots(archive_dir, kind) if e['taken'] <= when]
+    return earlier[-1] if earlier else None
+
+
+# ---------- Archiving ----------
+def row_hashes(df):
+    return pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+
+
+def _rows_path(archive_dir, kind, digest):
+    return os.path.join(archive_dir, kind, f"rows_{digest}.parquet")
+
+
+def _snapshot_path(archive_dir, kind, digest):
+    return os.path.join(archive_dir, kind, f"snapshot_{digest}.parquet")
+
+
+def _write(df, path, **options):
+    tmp_path = path + '.tmp'
+    df.to_parquet(tmp_path, index=False, compression=COMPRESSION, **options)
+    os.replace(tmp_path, path)
+
+
+def archive_snapshot(archive_dir, path, kind, taken, cache_dir=None):
+    """
+    Adds the workbook at path (kind 'hours' or 'active') to the archive as taken
+    at `taken` and returns its catalog entry. The normalized frame comes through
+    the ingest cache when cache_dir is set. An export already archived keeps its
+    first entry.
+    """
+    digest = file_digest(path)
+    catalog = read_catalog(archive_dir)
+    for entry in catalog:
+        if entry['kind'] == kind and entry['digest'] == digest:
+            logging.info(f"{path} already archived as {kind} snapshot {digest[:12]} ({entry['taken']})")
+            return entry
+
+    frame = decategorize(load_normalized(path, kind, cache_dir))
+    hashes = row_hashes(frame)
+
+    # Row Id of every row an earlier chunk already holds, and which chunks those are
+    chunk_names = [e['digest'] for e in catalog if e['kind'] == kind and e['new_rows']]
+    known = [pd.read_parquet(_rows_path(archive_dir, kind, name), columns=[HASH_COL, ID_COL]).assign(Chunk=i)
+             for i, name in enumerate(chunk_names)]
+    known = (pd.concat(known, ignore_index=True) if known else
+             pd.DataFrame({HASH_COL: np.array([], dtype=np.uint64), ID_COL: np.array([], dtype=np.int64), 'Chunk': 0}))
+    position = pd.Index(known[HASH_COL]).get_indexer(hashes)
+    is_new = position < 0
+    ids = np.empty(len(hashes), dtype=np.int64)
+    ids[~is_new] = known[ID_COL].to_numpy()[position[~is_new]]
+    chunks = {chunk_names[i] for i in np.unique(known['Chunk'].to_numpy()[position[~is_new]])}
+
+    # New rows get the next Row Ids, one per distinct row
+    new_hashes, first, inverse = np.unique(hashes[is_new], return_index=True, return_inverse=True)
+    order = np.argsort(first)  # ids in order of first appearance
+    new_ids = np.empty(len(new_hashes), dtype=np.int64)
+    new_ids[order] = sum(e['new_rows'] for e in catalog if e['kind'] == kind) + np.arange(len(new_hashes))
+    ids[is_new] = new_ids[inverse]
+
+    os.makedirs(os.path.join(archive_dir, kind), exist_ok=True)
+    new_rows = frame.loc[is_new].assign(**{HASH_COL: hashes[is_new], ID_COL: ids[is_new]}).drop_duplicates(subset=HASH_COL)
+    if len(new_rows):
+        _write(new_rows, _rows_path(archive_dir, kind, digest))
+        chunks.add(digest)
+    # Delta encoding stores the ascending runs in a few bits per row
+    _write(pd.DataFrame({ID_COL: ids}), _snapshot_path(archive_dir, kind, digest),
+           use_dictionary=False, column_encoding={ID_COL: 'DELTA_BINARY_PACKED'})
+
+    entry = {'kind': kind, 'digest': digest, 'taken': taken.isoformat(timespec='seconds'),
+             'source': os.path.basename(path), 'rows': len(frame), 'new_rows': len(new_rows),
+             'chunks': sorted(chunks)}
+    _write_catalog(archive_dir, read_catalog(archive_dir) + [entry])
+    logging.info(f"Archived {path} as {kind} snapshot {digest[:12]}: {len(frame)} rows, {len(new_rows)} new")
+    return entry
+
+
+def archive_input(archive_dir, path, kind, taken, cache_dir=None):
+    # archive_snapshot(), or None (logged) when path is missing or cannot be archived
+    if not os.path.exists(path):
+        logging.warning(f"File not found, not archived: {path}")
+        return None
+    try:
+        return archive_snapshot(archive_dir, path, kind, taken, cache_dir)
+    except Exception as e:
+        logging.warning(f"Could not archive {path}; left in place: {e}")
+        return None
+
+
+def archive_workbooks(archive_dir, inputs, taken, cache_dir=None):
+    """
+    Archives every (path, kind) of inputs, then removes the workbooks, only once
+    all of them are archived, so an input is never removed without the rest.
+    Inputs already gone are skipped, so it can be run again after a failure.
+    Returns the catalog entries.
+    """
+    present = [(path, kind) for path, kind in inputs if os.path.exists(path)]
+    for path, _ in inputs:
+        if not os.path.exists(path):
+            logging.info(f"{path} already archived or never present")
+    entries = [archive_input(archive_dir, path, kind, taken, cache_dir) for path, kind in present]
+    if None in entries:
+        logging.warning("Not every input could be archived; all inputs left in place")
+        return [e for e in entries if e is not None]
+    for path, _ in present:
+        os.remove(path)
+        logging.info(f"Removed archived {path}")
+    return entries
+
+
+def import_legacy(archive_dir, legacy_dir, kind, cache_dir=None):
+    """
+    Archives the dated workbooks of the old layout (legacy_dir/<kind>_MM_DD_YYYY.xlsx)
+    as taken on their dates. They are left in place; ones already archived cost
+    only their content hash.
+    """
+    pattern = re.compile(rf"^{kind}_(\d{{2}}_\d{{2}}_\d{{4}})\.xlsx$")
+    for name in sorted(os.listdir(legacy_dir) if os.path.isdir(legacy_dir) else []):
+        match = pattern.match(name)
+        if match:
+            archive_snapshot(archive_dir, os.path.join(legacy_dir, name), kind,
+                             datetime.strptime(match.group(1), "%m_%d_%Y"), cache_dir)
+
+
+# ---------- Loading ----------
+def load_snapshot(archive_dir, entry, columns=None, filters=None):
+    """
+    The normalized frame of a catalog entry, rows in export order. columns
+    projects it (inside the Parquet scan) and filters (DNF, see
+    compliance_ingest.hours_filters) drops rows.
+    """
+    kind = entry['kind']
+    ids = pd.read_parquet(_snapshot_path(archive_dir, kind, entry['digest']))[ID_COL].to_numpy()
+    filter_cols = [col for conjunction in filters or [] for col, _, _ in conjunction]
+    read_columns = None if columns is None else list(dict.fromkeys([*columns, *filter_cols, ID_COL]))
+    # Filtered per chunk in memory: a small chunk's all-empty column has no type to compare in the scan
+    parts = [project(apply_filters(pd.read_parquet(_rows_path(archive_dir, kind, chunk), columns=read_columns),
+                                   filters), None if columns is None else [*columns, ID_COL])
+             for chunk in entry['chunks']]
+    if not parts:
+        return pd.DataFrame(columns=list(columns or []))
+    rows = pd.concat(parts, ignore_index=True).set_index(ID_COL).drop(columns=HASH_COL, errors='ignore')
+    # Rows dropped by the filters are missing from the chunks; duplicates come back from the id list
+    frame = rows.loc[ids[np.isin(ids, rows.index.to_numpy())]].reset_index(drop=True)
+    return categorize(frame, kind)
+
+
+def load_as_of(archive_dir, kind, when, columns=None, filters=None):
+    """
+    The hours or roster (kind) as of `when`: the latest snapshot taken at or
+    before it, via load_snapshot. Raises LookupError when there is none.
+    """
+    entry = as_of(archive_dir, kind, when)
+    if entry is None:
+        raise LookupError(f"No {kind} snapshot archived on or before {when}")
+    return load_snapshot(archive_dir, entry, columns, filters)
@@ -0,0 +1,196 @@
+# compliance_batch.py
+"""
+Batch runner: the weekly and/or monthly job for several site folders at once.
+
+Sites are listed in a JSON file, each with its own folder, pilot programs and
+settings (relative folders are resolved against the file):
+
+    [{"name": "main", "folder": "/data/gme/main", "pilots": ["NEUROSURG-Neurological Surgery-ACGME"]},
+     {"name": "west", "folder": "west", "pilots": null, "jobs": ["monthly"],
+      "weekly": {"archive": false}, "monthly": {"INCREMENTAL": true}}]
+
+"pilots" null covers every program; left out, each job's own PILOTS apply.
+"weekly" holds work_hours_compliance_generator.run() arguments, and "monthly"
+holds monthly_compliance_generator settings (its upper-case constants).
+
+The sites share one process pool (compliance_parallel.map_tasks); pandas,
+openpyxl and the compliance modules are imported before it forks, so no run
+pays the imports. A site's jobs share its folder and run one after another in
+its worker, in the order given; only the last one archives the inputs, so the
+jobs before it still find them. A failing run is recorded and the others carry on. One consolidated report, with
+every run's own stage report, is written next to the sites file as
+<sites>.run.json.
+
+    python compliance_batch.py SITES.json [--jobs weekly monthly] [--workers N]
+        [--reference-date YYYY-MM-DD] [--report PATH]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import importlib
+import traceback
+from datetime import datetime
+from compliance_telemetry import run_report, stage, write_report, report_path_for
+
+JOBS = ('weekly', 'monthly')
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(processName)s %(message)s')
+
+
+# ---------- Sites ----------
+def load_sites(path):
+    """
+    Site dicts from the JSON file at path, folders made absolute and names
+    defaulted to the folder name. Raises ValueError on a malformed entry.
+    """
+    with open(path) as f:
+        sites = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    for i, site in enumerate(sites):
+        if 'folder' not in site:
+            raise ValueError(f"{path}: site {i} has no folder")
+        unknown = set(site.get('jobs', [])) - set(JOBS)
+        if unknown:
+            raise ValueError(f"{path}: site {i} has unknown job(s) {sorted(unknown)}")
+        site['folder'] = os.path.normpath(os.path.join(base, site['folder']))
+        site.setdefault('name', os.path.basename(os.path.normpath(site['folder'])))
+    names = [site['name'] for site in sites]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{path}: site names must be unique, got {names}")
+    return sites
+
+
+def warm_imports():
+    # Imported once in the parent; forked workers inherit them
+    import pandas  # noqa: F401
+    import openpyxl  # noqa: F401
+    for name in ('compliance_ingest', 'compliance_engine', 'compliance_output', 'compliance_parallel',
+                 'compliance_directory', 'compliance_findings', 'compliance_incremental', 'compliance_archive',
+                 'compliance_checkpoint', 'work_hours_compliance_generator', 'monthly_compliance_generator'):
+        importlib.import_module(name)
+
+
+# ---------- Runs ----------
+def _run_weekly(site, reference_date, archive_inputs):
+    import work_hours_compliance_generator as weekly
+
+    options = dict(site.get('weekly', {}))
+    if 'pilots' in site:
+        options['programs'] = site['pilots']
+    if not archive_inputs:
+        # The previous list is still rotated; only the inputs stay for the next job
+        options['keep_inputs'] = True
+    out_path, _ = weekly.run(site['folder'], reference_date=reference_date, **options)
+    return out_path
+
+
+def _run_monthly(site, reference_date, archive_inputs):
+    import monthly_compliance_generator as monthly
+
+    settings = dict(site.get('monthly', {}))
+    if 'pilots' in site:
+        settings.update(PILOT_ONLY=site['pilots'] is not None, PILOTS=site['pilots'] or [])
+    unknown = [name for name in settings if not name.isupper() or not hasattr(monthly, name)]
+    if unknown:
+        raise ValueError(f"Unknown monthly setting(s) {unknown}")
+    # The settings are module constants: restored afterwards, so the worker's next site gets the defaults
+    defaults = {name: getattr(monthly, name) for name in settings}
+    try:
+        for name, value in settings.items():
+            setattr(monthly, name, value)
+        return monthly.run(site['folder'], reference_date=reference_date, archive=archive_inputs)
+    finally:
+        for name, value in defaults.items():
+            setattr(monthly, name, value)
+
+
+def run_job(site, job, reference_date=None, archive_inputs=True):
+    """
+    One job for one site. Never raises: returns a result dict with the status,
+    output path, error and the run's own stage report (when it wrote one).
+    Without archive_inputs the job leaves the input workbooks in the folder.
+    """
+    result = {'site': site['name'], 'job': job, 'folder': site['folder'], 'pid': os.getpid()}
+    t0 = time.perf_counter()
+    try:
+        runner = _run_weekly if job == 'weekly' else _run_monthly
+        out_path = runner(site, reference_date, archive_inputs)
+        result.update(status='ok', output=out_path)
+    except Exception as e:
+        logging.error(f"{job} run for site {site['name']} failed: {e!r}")
+        result.update(status='failed', error=repr(e), traceback=traceback.format_exc())
+        out_path = None
+    result['wall_seconds'] = round(time.perf_counter() - t0, 4)
+
+    report_path = report_path_for(out_path) if out_path else None
+    if report_path and os.path.exists(report_path):
+        try:
+            with open(report_path) as f:
+                result['report'] = json.load(f)
+        except Exception as e:
+            logging.warning(f"Could not read run report {report_path}: {e}")
+    return result
+
+
+def run_site(site, jobs, reference_date=None):
+    # The site's jobs in order (they share its folder), one result each; the inputs are archived after the last
+    site_jobs = [job for job in jobs if job in site.get('jobs', jobs)]
+    return [run_job(site, job, reference_date, archive_inputs=i == len(site_jobs) - 1)
+            for i, job in enumerate(site_jobs)]
+
+
+def run_batch(sites, jobs=('weekly',), workers=None, reference_date=None):
+    """
+    Runs jobs for every site over one shared process pool, one task per site,
+    and returns the run results in site order. A site's "jobs" restrict which
+    of jobs it runs.
+    """
+    from compliance_parallel import map_tasks
+
+    warm_imports()
+    runs = sum(job in site.get('jobs', jobs) for site in sites for job in jobs)
+    with stage('batch_runs', rows_in=runs) as record:
+        results = [r for site_results in map_tasks(run_site, [(site, jobs, reference_date) for site in sites],
+                                                    workers=workers)
+                   for r in site_results]
+        record['rows_out'] = sum(r['status'] == 'ok' for r in results)
+    return results
+
+
+# ---------- Main ----------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the compliance jobs for several site folders.")
+    parser.add_argument('sites', help="JSON file listing the sites (see module docstring).")
+    parser.add_argument('--jobs', nargs='+', choices=JOBS, default=['weekly'], help="Jobs to run for each site.")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Runs at a time in the shared process pool (0: one per spare CPU).")
+    parser.add_argument('--reference-date', type=lambda s: datetime.strptime(s, '%Y-%m-%d'),
+                        help="Run every job as if today were this date (YYYY-MM-DD).")
+    parser.add_argument('--report', help="Consolidated report path (default: <sites>.run.json).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sites = load_sites(args.sites)
+    report_path = args.report or report_path_for(args.sites)
+
+    report = None
+    try:
+        with run_report('batch', sites=[s['name'] for s in sites], jobs=args.jobs) as report:
+            report['runs'] = run_batch(sites, args.jobs, args.workers, args.reference_date)
+    finally:
+        if report is not None:
+            write_report(report, report_path)
+
+    failed = [f"{r['site']}/{r['job']}" for r in report['runs'] if r['status'] != 'ok']
+    logging.info(f"Batch complete: {len(report['runs']) - len(failed)} of {len(report['runs'])} runs ok"
+                 + (f"; failed: {failed}" if failed else ''))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
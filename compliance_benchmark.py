@@ -0,0 +1,354 @@
+# compliance_benchmark.py
+"""
+Synthetic-data benchmark for the weekly and monthly compliance generators.
+
+make_inputs(scale) builds raw active / hours / PD_and_PA frames with the export
+headers (compliance_ingest.*_COLS_RAW) at scale x today's volume, roughly 544
+trainees, 113 programs and 16k hours rows at 1x. The data is deterministic for
+a given (scale, seed) and exercises the paths the rules care about: a mix of
+shift types and lengths (24h+ call, night float, vacation days), ResQ rows,
+flagged violations, trainees who log nothing or only a day or two a week,
+Chief Residents, and hours from trainees who are no longer on the roster.
+
+run_benchmark() runs every stage of both generators through their own
+telemetry (compliance_telemetry), recording wall/CPU seconds, peak traced
+memory and row counts; results are written as JSON and can be compared against
+a stored baseline. Times are measured with tracemalloc running (unless
+--no-memory), so only compare against a baseline recorded the same way.
+
+    python compliance_benchmark.py [--scales 1 10 100] [--seed 0] [--ingest]
+        [--baseline FILE] [--save-baseline FILE] [--tolerance 0.25] [--no-memory]
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from compliance_ingest import HOURS_COLS_RAW, ACTIVE_COLS_RAW, PD_LIST_COLS_RAW, load_normalized
+from compliance_telemetry import run_report, stage
+from work_hours_compliance_generator import PILOTS
+
+# ---------- CONFIG ----------
+BASE_TRAINEES = 544
+BASE_PROGRAMS = 113
+
+# Ten Sunday-anchored weeks: covers November 2025 (the monthly run on 12/01/2025,
+# whose weeks start 10/26) and the weekly run on 11/17/2025 (week of 11/09)
+SYNTH_START = datetime(2025, 10, 5)
+SYNTH_DAYS = 70
+MONTHLY_REFERENCE_DATE = datetime(2025, 12, 1)
+WEEKLY_REFERENCE_DATE = datetime(2025, 11, 17)
+
+# Share of trainees, and chance they log a shift on any given day
+IDLE_SHARE = 0.08        # on the roster, never log hours
+SPARSE_SHARE = 0.10      # log a day or two a week -> partial coverage
+FORMER_SHARE = 0.03      # log hours but are no longer on the roster
+CHIEF_SHARE = 0.02       # Chief Residents, dropped from the roster by normalize_active
+DAILY_SHIFT_P = 0.47
+SPARSE_SHIFT_P = 0.15
+
+# Work Type, share of rows, start hour [lo, hi), length in hours [lo, hi)
+SHIFT_TYPES = [
+    ('Assigned Work/Shift', 0.80, (5, 9), (8, 14)),
+    ('ResQ Working', 0.05, (6, 9), (4, 12)),
+    ('Vacation', 0.05, (0, 1), (24, 25)),
+    ('Clinical Work from Home/Home Call', 0.03, (17, 20), (2, 10)),
+    ('Night Float', 0.02, (19, 20), (12, 13)),
+    ('In-House Call', 0.02, (6, 8), (24, 29)),
+    ('Sick Day', 0.02, (0, 1), (8, 10)),
+    ('Moonlighting', 0.01, (17, 19), (8, 13)),
+]
+OPEN_SHIFT_SHARE = 0.002  # entries without an end time
+VIOLATION_SHARE = 0.01
+RULE_SETS = ['ACGME Short Break', 'ACGME Day Off', 'ACGME 24+', 'ACGME 80 Hour',
+             'ACGME 80 Hour, ACGME Day Off', 'ACGME 24+, ACGME Short Break']
+STATUSES = ['PRG-1', 'PRG-2', 'PRG-3', 'PRG-4', 'PRG-5', 'FEL-PRG 1', 'FEL-PRG 2', 'FEL-PRG 3']
+
+BENCH_OUTPUT_PREFIX = "benchmark_monthly_compliance"
+
+
+# ---------- Synthetic inputs ----------
+def _excel_serial(ts):
+    # Excel day number, as the export stores Last Update and program dates
+    return (ts - pd.Timestamp('1899-12-30')) / pd.Timedelta(days=1)
+
+
+def _programs(n_programs):
+    # The pilot programs first, so PILOT_ONLY runs still find trainees; every tenth is non-ACGME
+    names = list(dict.fromkeys(PILOTS))
+    for k in range(len(names), n_programs):
+        suffix = '' if k % 10 == 9 else '-ACGME'
+        names.append(f"DEPT{k % 20:02d}-Synthetic Program {k:05d}{suffix}")
+    return names[:n_programs]
+
+
+def make_pd_list(n_programs):
+    k = np.arange(n_programs)
+    first, last = [f"Pat{i}" for i in k], [f"Director{i:05d}" for i in k]
+    return pd.DataFrame({
+        'program': _programs(n_programs),
+        'programtype': np.where(k % 3 == 0, 'Fellowship', 'Residency'),
+        'department': [f"DEPT{i % 20:02d}-Department {i % 20}" for i in k],
+        'programdirector_first_name': first,
+        'programdirector_last_name': last,
+        'programdirector': [f"{l}, {f}" for l, f in zip(last, first)],
+        'programdirectoremail': [f"pat{i}.director{i:05d}@example.org" for i in k],
+        # Coordinators cover several programs, and their emails come mixed-case like the export
+        'programcoordinator': [f"Coordinator{i // 3:05d}, Sam" for i in k],
+        'programcoordinatoremail': [f"Sam.Coordinator{i // 3:05d}@example.org" for i in k],
+    }, columns=PD_LIST_COLS_RAW)
+
+
+def make_inputs(scale=1, seed=0):
+    """
+    Returns raw (active, hours, pd_list) frames, as read_excel would return the exports,
+    at scale x the current volume. Same (scale, seed) -> same frames.
+    """
+    rng = np.random.default_rng(seed)
+    n_programs = max(len(set(PILOTS)), int(round(BASE_PROGRAMS * scale)))
+    n_trainees = max(1, int(round(BASE_TRAINEES * scale)))
+    pd_list = make_pd_list(n_programs)
+
+    # ---------- Trainees ----------
+    ids = np.arange(n_trainees)
+    program = rng.integers(0, n_programs, n_trainees)
+    kind = rng.choice(4, size=n_trainees, p=[1 - IDLE_SHARE - SPARSE_SHARE - FORMER_SHARE,
+                                              IDLE_SHARE, SPARSE_SHARE, FORMER_SHARE])
+    regular, idle, sparse, former = (kind == i for i in range(4))
+    status = np.array(STATUSES, dtype=object)[rng.integers(0, len(STATUSES), n_trainees)]
+    status[rng.random(n_trainees) < CHIEF_SHARE] = 'Chief Resident'
+    last = np.array([f"Last{i:07d}" for i in ids], dtype=object)
+    first = np.array([f"First{i:07d}" for i in ids], dtype=object)
+    email = np.array([f"first{i:07d}.last{i:07d}@example.org" for i in ids], dtype=object)
+    npi = 1_000_000_000.0 + ids
+    prog = pd_list.iloc[program]
+    director = prog['programdirector'].to_numpy()
+    coordinator = prog['programcoordinator'].str.replace(r'^(\w+), (\w+)$', r'\2 \1', regex=True).to_numpy()
+    coordinator_email = prog['programcoordinatoremail'].to_numpy()
+    program_name = prog['program'].to_numpy()
+
+    roster = ~former
+    active = pd.DataFrame({
+        'ID Number': (50_000.0 + ids)[roster],
+        'Last Name': last[roster],
+        'First Name': first[roster],
+        'Middle Name': np.nan,
+        "Person's National Provider Identifier": npi[roster],
+        "Person's Primary E-Mail Address": email[roster],
+        'Department/Division': prog['department'].to_numpy()[roster],
+        'Program': program_name[roster],
+        "Person's Program Director": director[roster],
+        'Status': status[roster],
+        "Person's Program Start Date": 45839,
+        "Person's Program End Date": 46568,
+        "Person's Coordinator Email": coordinator_email[roster],
+        "Person's Program Coordinator": coordinator[roster],
+    }, columns=ACTIVE_COLS_RAW)
+
+    # ---------- Shifts ----------
+    p_day = np.select([regular | former, sparse], [DAILY_SHIFT_P, SPARSE_SHIFT_P], 0.0)
+    worked = rng.random((n_trainees, SYNTH_DAYS)) < p_day[:, None]
+    who, day = np.nonzero(worked)
+    n = len(who)
+
+    shares = np.array([s for _, s, _, _ in SHIFT_TYPES])
+    shift = rng.choice(len(SHIFT_TYPES), size=n, p=shares / shares.sum())
+    start_lo, start_hi, len_lo, len_hi = (np.array([t[2][0] for t in SHIFT_TYPES])[shift],
+                                          np.array([t[2][1] for t in SHIFT_TYPES])[shift],
+                                          np.array([t[3][0] for t in SHIFT_TYPES])[shift],
+                                          np.array([t[3][1] for t in SHIFT_TYPES])[shift])
+    start_minutes = (day * 24 + rng.integers(start_lo, start_hi)) * 60 + rng.choice([0, 15, 30, 45], n)
+    length = rng.integers(len_lo, len_hi)
+    start = pd.Timestamp(SYNTH_START) + pd.to_timedelta(start_minutes, unit='min')
+    end = pd.Series(start + pd.to_timedelta(length, unit='h'))
+    end[rng.random(n) < OPEN_SHIFT_SHARE] = pd.NaT
+    logged = pd.Series(start + pd.to_timedelta(rng.integers(60, 72 * 60, n), unit='min'))
+
+    work_type = np.array([t[0] for t in SHIFT_TYPES], dtype=object)[shift]
+    is_resq = work_type == 'ResQ Working'
+    in_violation = rng.random(n) < VIOLATION_SHARE
+    rules = np.array(RULE_SETS, dtype=object)[rng.integers(0, len(RULE_SETS), n)]
+    source = np.where(is_resq, 'RESQ', np.array(['Res', 'Res', 'Res', 'Admin', 'SCHED'])[rng.integers(0, 5, n)])
+
+    hours = pd.DataFrame({
+        "Person's National Provider Identifier": npi[who],
+        'Person': [f"{l}, {f}" for l, f in zip(last[who], first[who])],
+        'Status': status[who],
+        'Program': program_name[who],
+        'Work Type': work_type,
+        'Start Date/Time': start,
+        'End Date/Time': end.to_numpy(),
+        'Hours Worked': length.astype(float),
+        'Rotation': np.nan,
+        'Rotation Start Date': pd.NaT,
+        'Rotation End Date': pd.NaT,
+        'Source': source,
+        'Resident Approved': np.where(rng.random(n) < 0.72, 'Yes', 'No'),
+        'Administrator Approved': np.where(rng.random(n) < 0.02, 'Yes', 'No'),
+        'Institution/Location': np.where(rng.random(n) < 0.13, '*Main Campus', None),
+        'In Violation': np.where(in_violation, 'Yes', 'No'),
+        'Violations': np.where(in_violation, 'Only 6 Hrs Off Between Shifts. Should Have 8 Hrs.', None),
+        'Rules Violated': np.where(in_violation, rules, None),
+        'Comment': np.nan,
+        'Comment By': np.nan,
+        'Last Update': _excel_serial(logged).to_numpy(),
+        'Date Logged': logged.to_numpy(),
+        "Person's Coordinator Email": coordinator_email[who],
+        "Person's Primary E-Mail Address": email[who],
+        "Person's Program Coordinator": coordinator[who],
+        "Person's Program Director": director[who],
+    }, columns=HOURS_COLS_RAW)
+    return active, hours, pd_list
+
+
+# ---------- Measurement ----------
+STAGE_METRICS = ['wall_seconds', 'cpu_seconds', 'peak_mb', 'max_rss_mb', 'rows_in', 'rows_out']
+
+
+def _stage_results(report, prefix=''):
+    return {prefix + r['stage']: {k: r.get(k) for k in STAGE_METRICS} for r in report['stages']}
+
+
+def run_scale(scale, seed=0, out_dir=None, trace_memory=True, ingest=False):
+    """
+    Generates the scale's inputs and runs every stage of both generators on them,
+    institution-wide (pilot filters off). Stages are recorded by the generators'
+    own telemetry; returns {stage: metrics}, monthly and weekly stages prefixed.
+    """
+    out_dir = out_dir or tempfile.mkdtemp(prefix='gme_bench_')
+    # Created up front: the workbooks are only written after every stage has run
+    os.makedirs(out_dir, exist_ok=True)
+    import monthly_compliance_generator as monthly
+    import work_hours_compliance_generator as weekly
+
+    with run_report('benchmark', trace_memory, scale=scale, seed=seed) as report:
+        with stage('generate') as record:
+            raw = make_inputs(scale, seed)
+            record['rows_out'] = len(raw[1])
+
+        if ingest:
+            hours_path = os.path.join(out_dir, f"hours_x{scale}.xlsx")
+            raw[1].to_excel(hours_path, index=False)
+            cache_dir = os.path.join(out_dir, 'ingest_cache')
+            for name in ('ingest_parse', 'ingest_cached'):
+                with stage(name) as record:
+                    record['rows_out'] = len(load_normalized(hours_path, 'hours', cache_dir))
+
+        frames = tuple(f.copy() for f in raw)
+        active, hours, directory = monthly.normalize_and_clean(*frames)
+
+        start_month, end_month = monthly.prev_month_range(MONTHLY_REFERENCE_DATE)
+        pilot_only = monthly.PILOT_ONLY
+        monthly.PILOT_ONLY = False
+        try:
+            with run_report('monthly', trace_memory) as month_report:
+                month_df = monthly.process_month(active, hours, start_month, end_month)
+                month_df, counts = monthly.add_program_info(month_df, directory)
+                monthly.save_output(month_df, start_month, end_month, counts, out_dir, BENCH_OUTPUT_PREFIX)
+        finally:
+            monthly.PILOT_ONLY = pilot_only
+
+        start_of_last_week, end_of_last_week, _ = weekly.last_week_range(WEEKLY_REFERENCE_DATE)
+        with run_report('weekly', trace_memory) as week_report:
+            week_df = weekly.process_week(active, hours, directory, start_of_last_week,
+                                          end_of_last_week, programs=None)
+            weekly.save_output(week_df, os.path.join(out_dir, weekly.COMPLIANCE_LIST_NAME))
+
+    return {**_stage_results(report), **_stage_results(month_report, 'monthly.'),
+            **_stage_results(week_report, 'weekly.')}
+
+
+def run_benchmark(scales=(1, 10), seed=0, out_dir=None, trace_memory=True, ingest=False):
+    # {scale (as str, for JSON): stage results}
+    return {str(scale): run_scale(scale, seed, out_dir, trace_memory, ingest) for scale in scales}
+
+
+# ---------- Baseline ----------
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    logging.info(f"Saved benchmark results to {path}")
+
+
+def compare(results, baseline, tolerance=0.25, min_seconds=0.05, min_mb=1.0):
+    """
+    Returns (scale, stage, metric, baseline, current) for every stage that got slower or
+    larger than baseline by more than tolerance (a fraction) and by more than the absolute
+    floor (min_seconds / min_mb), so noise on tiny stages is not reported.
+    """
+    regressions = []
+    for scale, stages in results.items():
+        for stage, current in stages.items():
+            base = baseline.get(scale, {}).get(stage)
+            if not base:
+                continue
+            for metric, floor in (('wall_seconds', min_seconds), ('peak_mb', min_mb)):
+                was, now = base.get(metric) or 0, current.get(metric) or 0
+                if now > was * (1 + tolerance) and now - was > floor:
+                    regressions.append((scale, stage, metric, was, now))
+    return regressions
+
+
+def format_report(results, baseline=None):
+    lines = [f"{'scale':>6} {'stage':<26} {'wall s':>8} {'cpu s':>8} {'peak MB':>8} {'rows':>9} {'vs baseline':>12}"]
+    for scale, stages in results.items():
+        for name, r in stages.items():
+            base = (baseline or {}).get(scale, {}).get(name)
+            delta = f"{r['wall_seconds'] / base['wall_seconds']:.2f}x" if base and base.get('wall_seconds') else ''
+            peak = '' if r['peak_mb'] is None else f"{r['peak_mb']:.1f}"
+            rows = r['rows_out']
+            # Stages returning several frames count each: shown as active/hours/directory
+            rows = '' if rows is None else '/'.join(map(str, rows.values())) if isinstance(rows, dict) else rows
+            lines.append(f"{scale:>6} {name:<26} {r['wall_seconds']:>8.3f} {r['cpu_seconds']:>8.3f} "
+                         f"{peak:>8} {rows:>9} {delta:>12}")
+    return '\n'.join(lines)
+
+
+# ---------- Main ----------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the compliance generators on synthetic data.")
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10],
+                        help="Volume multiples of today's inputs (default: 1 10).")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out-dir', help="Where workbooks are written (default: a temp folder).")
+    parser.add_argument('--ingest', action='store_true',
+                        help="Also write hours.xlsx and time parsing it cold and from the cache (slow at 10x+).")
+    parser.add_argument('--no-memory', action='store_true', help="Skip tracemalloc (faster, no peak MB).")
+    parser.add_argument('--baseline', help="Compare against this results file; exit 1 on regressions.")
+    parser.add_argument('--save-baseline', help="Write the results to this file.")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown/growth over the baseline, as a fraction (default: 0.25).")
+    parser.add_argument('--verbose', action='store_true')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The generators configure logging at INFO on import; keep the report readable
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    scales = [int(s) if float(s).is_integer() else s for s in args.scales]
+    results = run_benchmark(scales, args.seed, args.out_dir, not args.no_memory, args.ingest)
+
+    baseline = load_baseline(args.baseline) if args.baseline else None
+    print(format_report(results, baseline))
+    if args.save_baseline:
+        save_baseline(results, args.save_baseline)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for scale, stage, metric, was, now in regressions:
+            print(f"REGRESSION x{scale} {stage} {metric}: {was} -> {now}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
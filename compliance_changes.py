@@ -0,0 +1,139 @@
+# compliance_changes.py
+"""
+Week-over-week changes between two weekly compliance lists.
+
+Each list is taken apart into (Trainee Email, Issue) pairs, one per non-empty
+finding column (ISSUE_COLS), and the two sets of pairs are matched in a single
+hash join: a pair only in this week's list is New, only in last week's
+Resolved, in both Persisting. diff_lists() returns one row per pair with both
+weeks' details, for notification code; trainee_changes() folds it into one row
+per trainee with a new or resolved issue, the list's "Changes" sheet.
+
+Lists are read through the ingest cache (kind 'compliance_list'). The weekly
+run caches its list as Parquet as it writes it (cache_list), so next week's
+diff reads the previous list without parsing the workbook:
+
+    changes = compare_lists(previous_path, current_path, cache_dir)
+"""
+import logging
+import numpy as np
+import pandas as pd
+from compliance_engine import IDENTITY_COLS, trainee_identity
+from compliance_ingest import load_normalized, store_normalized
+
+ISSUE_COLS = ['ResQ Violations', 'Week of Missing Hours', 'Violations', '80 Hr', 'Day Off', '24+', 'SB']
+PAIR_KEY = ['Trainee Email', 'Issue']
+NEW, RESOLVED, PERSISTING = 'New', 'Resolved', 'Persisting'
+CHANGES = [NEW, RESOLVED, PERSISTING]
+CHANGE_COLS = ['Trainee Email'] + IDENTITY_COLS + ['Issue', 'Change', 'Previous', 'Current']
+
+
+# ---------- Lists ----------
+def load_list(path, cache_dir=None):
+    # A weekly compliance list workbook, normalized (Parquet copy when cached)
+    return load_normalized(path, 'compliance_list', cache_dir)
+
+
+def cache_list(path, compliance_list, cache_dir):
+    # Caches the list just written to path from compliance_list; see compliance_ingest.store_normalized
+    store_normalized(path, 'compliance_list', compliance_list, cache_dir)
+
+
+def _detail_text(values):
+    # The non-empty cells of a finding column as trimmed text; whole floats (Day Off 3.0) lose the ".0"
+    text = values.loc[values.notna()].astype(str).str.strip()
+    if pd.api.types.is_float_dtype(values.dtype):
+        text = text.str.removesuffix('.0')
+    return text.loc[text != '']
+
+
+def issue_pairs(compliance_list):
+    """
+    (Trainee Email, Issue, Detail) for every non-empty finding cell of a list,
+    emails normalized, one row per trainee and issue. Issue is a categorical
+    over ISSUE_COLS.
+    """
+    listed = compliance_list.loc[compliance_list['Trainee Email'].notna()]
+    emails = listed['Trainee Email'].astype(str).str.strip().str.lower()
+    parts = [pd.DataFrame({'Trainee Email': emails.loc[detail.index], 'Issue': code, 'Detail': detail})
+             for code, detail in ((code, _detail_text(listed[col])) for code, col in enumerate(ISSUE_COLS)
+                                  if col in listed.columns)]
+    pairs = (pd.concat(parts, ignore_index=True) if parts else
+             pd.DataFrame({'Trainee Email': pd.Series(dtype=object), 'Issue': pd.Series(dtype=np.int64),
+                           'Detail': pd.Series(dtype=object)}))
+    pairs = pairs.drop_duplicates(subset=PAIR_KEY, ignore_index=True)
+    pairs['Issue'] = pd.Categorical.from_codes(pairs['Issue'].to_numpy(), categories=ISSUE_COLS)
+    return pairs
+
+
+# ---------- Diff ----------
+def _identity_rows(compliance_list):
+    # Email plus IDENTITY_COLS (missing ones empty), emails normalized as in issue_pairs
+    identity = compliance_list.reindex(columns=['Trainee Email'] + IDENTITY_COLS).astype(object)
+    identity['Trainee Email'] = identity['Trainee Email'].astype(str).str.strip().str.lower()
+    return identity.loc[compliance_list['Trainee Email'].notna().to_numpy()]
+
+
+def diff_lists(previous, current):
+    """
+    CHANGE_COLS, one row per (trainee, issue) in either list: Change is New,
+    Resolved or Persisting, Previous/Current the issue's detail in each list.
+    Identity comes from the current list, else the previous one. Sorted by
+    email, then issue in ISSUE_COLS order; Issue and Change are categoricals.
+    """
+    previous_pairs, current_pairs = issue_pairs(previous), issue_pairs(current)
+    # One int64 key per (trainee, issue): emails coded (in sorted order) over both lists, issue code in the low digits
+    email_codes, emails = pd.factorize(pd.concat([previous_pairs['Trainee Email'], current_pairs['Trainee Email']],
+                                                 ignore_index=True), sort=True)
+    issue_codes = np.concatenate([previous_pairs['Issue'].cat.codes, current_pairs['Issue'].cat.codes])
+    keys = email_codes.astype(np.int64) * len(ISSUE_COLS) + issue_codes
+    n_previous = len(previous_pairs)
+    pairs = pd.DataFrame({'Key': keys[:n_previous], 'Previous': previous_pairs['Detail'].to_numpy()}).merge(
+        pd.DataFrame({'Key': keys[n_previous:], 'Current': current_pairs['Detail'].to_numpy()}),
+        on='Key', how='outer', indicator=True, sort=True)
+
+    key = pairs['Key'].to_numpy()
+    change_codes = pairs['_merge'].cat.codes.to_numpy()  # left_only, right_only, both
+    changes = pd.DataFrame({
+        'Trainee Email': np.asarray(emails, dtype=object)[key // len(ISSUE_COLS)],
+        'Issue': pd.Categorical.from_codes(key % len(ISSUE_COLS), categories=ISSUE_COLS),
+        'Change': pd.Categorical.from_codes(np.array([CHANGES.index(RESOLVED), CHANGES.index(NEW),
+                                                      CHANGES.index(PERSISTING)])[change_codes], categories=CHANGES),
+        'Previous': pairs['Previous'].to_numpy(),
+        'Current': pairs['Current'].to_numpy(),
+    })
+    identity = trainee_identity(*[_identity_rows(f) for f in (current, previous)])
+    changes[IDENTITY_COLS] = identity.reindex(changes['Trainee Email']).to_numpy()
+    return changes[CHANGE_COLS]
+
+
+def trainee_changes(changes):
+    """
+    One row per trainee with a new or resolved issue: identity, then the
+    trainee's New, Resolved and Persisting issues (comma-separated, in
+    ISSUE_COLS order).
+    """
+    email_codes, emails = pd.factorize(changes['Trainee Email'], sort=True)
+    # Each trainee's issues per change as a bitmask (bit i: ISSUE_COLS[i]); pairs are unique, so sums are ORs
+    bits = np.left_shift(1, changes['Issue'].cat.codes.to_numpy().astype(np.int64))
+    change_codes = changes['Change'].cat.codes.to_numpy()
+    masks = {change: np.bincount(email_codes[change_codes == i], weights=bits[change_codes == i],
+                                 minlength=len(emails)).astype(np.int64)
+             for i, change in enumerate(CHANGES)}
+    names = {mask: ', '.join(col for i, col in enumerate(ISSUE_COLS) if mask >> i & 1)
+             for mask in np.unique(np.concatenate(list(masks.values()))) if mask}
+
+    listed = (masks[NEW] > 0) | (masks[RESOLVED] > 0)
+    identity = changes.drop_duplicates(subset='Trainee Email').set_index('Trainee Email')[IDENTITY_COLS]
+    summary = identity.reindex(np.asarray(emails, dtype=object)[listed]).rename_axis('Trainee Email').reset_index()
+    for change in CHANGES:
+        summary[f"{change} Issues"] = pd.Series(masks[change][listed]).map(names).to_numpy(dtype=object)
+    return summary
+
+
+def compare_lists(previous_path, current_path, cache_dir=None):
+    # diff_lists of two list workbooks, read through the ingest cache
+    changes = diff_lists(load_list(previous_path, cache_dir), load_list(current_path, cache_dir))
+    logging.info(f"{previous_path} -> {current_path}: "
+                 + ', '.join(f"{(changes['Change'] == change).sum()} {change.lower()}" for change in CHANGES))
+    return changes
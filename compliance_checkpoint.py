@@ -0,0 +1,154 @@
+# compliance_checkpoint.py
+"""
+Stage checkpoints, so a failed run resumes where it stopped.
+
+A run is identified by its job and period (e.g. monthly_2025_11), by the
+content hashes of its input workbooks and by the settings it ran with.
+open_run() keeps one directory per run:
+
+    <root>/<run id>/manifest.json        run id, input hashes and settings
+    <root>/<run id>/<stage>.done.json    completion marker: run id, input hash, outputs
+    <root>/<run id>/<stage>.<i>.parquet  the stage's DataFrame outputs
+
+resume() runs a stage only if it has no marker for the run's inputs; otherwise
+its outputs are read back. The marker is written after the outputs, so a stage
+either completed or is run again. A checkpoint left by different inputs or
+settings is discarded. An input missing since it was recorded is taken as
+archived by the run itself, so a run that stopped mid-archive still resumes.
+finish_run() removes the directory once the run's last stage, the archive, is
+done.
+
+Checkpoint failures are logged and never fail the run; the stage just runs again
+next time.
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+import pandas as pd
+from compliance_ingest import file_digest
+
+MANIFEST_NAME = 'manifest.json'
+
+
+# ---------- Runs ----------
+def open_run(root, run_id, inputs, params=None):
+    """
+    Checkpoint state of run_id with inputs, a {name: workbook path} dict, and
+    params, a dict of JSON-serializable settings; a stale checkpoint (different
+    inputs or params) is removed first.
+    """
+    params = json.loads(json.dumps(params or {}, default=str))
+    run_dir = os.path.join(root, run_id)
+    manifest_path = os.path.join(run_dir, MANIFEST_NAME)
+    digests = {name: file_digest(path) if os.path.exists(path) else None for name, path in inputs.items()}
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        recorded = manifest['inputs']
+        if (manifest['params'] == params and recorded.keys() == digests.keys()
+                and all(digests[name] in (recorded[name], None) for name in inputs)):
+            digests = recorded
+            logging.info(f"Resuming run {run_id} from its checkpoints")
+        else:
+            logging.info(f"Inputs or settings of run {run_id} changed; discarding its checkpoints")
+            shutil.rmtree(run_dir)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning(f"Checkpoint of run {run_id} unreadable, starting over: {e}")
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    run = {'id': run_id, 'dir': run_dir, 'inputs': digests,
+           'input_hash': hashlib.sha256(json.dumps([digests, params], sort_keys=True).encode()).hexdigest()}
+    try:
+        os.makedirs(run_dir, exist_ok=True)
+        _write_json({'run_id': run_id, 'inputs': digests, 'params': params}, manifest_path)
+    except Exception as e:
+        logging.warning(f"Could not write checkpoint manifest for run {run_id}: {e}")
+    return run
+
+
+def finish_run(run):
+    # The run is committed; its checkpoints are no longer needed
+    shutil.rmtree(run['dir'], ignore_errors=True)
+    logging.info(f"Run {run['id']} complete; checkpoints removed")
+
+
+def _write_json(obj, path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+# ---------- Stages ----------
+def _marker_path(run, name):
+    return os.path.join(run['dir'], f"{name}.done.json")
+
+
+def completed(run, name):
+    try:
+        with open(_marker_path(run, name)) as f:
+            marker = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return marker if marker.get('input_hash') == run['input_hash'] else None
+
+
+def _save(run, name, out):
+    # out (a DataFrame, a tuple of outputs, or a JSON value) -> its JSON description; frames go to Parquet
+    frames = []
+
+    def encode(value):
+        if isinstance(value, pd.DataFrame):
+            file_name = f"{name}.{len(frames)}.parquet"
+            frames.append((value, file_name))
+            return {'frame': file_name}
+        if isinstance(value, tuple):
+            return {'tuple': [encode(v) for v in value]}
+        json.dumps(value)  # anything else must round-trip as JSON
+        return {'value': value}
+
+    encoded = encode(out)
+    for frame, file_name in frames:
+        path = os.path.join(run['dir'], file_name)
+        frame.to_parquet(path + '.tmp')
+        os.replace(path + '.tmp', path)
+    return encoded
+
+
+def _load(run, encoded):
+    if 'frame' in encoded:
+        return pd.read_parquet(os.path.join(run['dir'], encoded['frame']))
+    if 'tuple' in encoded:
+        return tuple(_load(run, v) for v in encoded['tuple'])
+    return encoded['value']
+
+
+def resume(run, name, fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs) as stage `name` of run, or its checkpointed outputs when
+    the stage already completed for these inputs. With run None, fn just runs.
+    """
+    marker = completed(run, name) if run is not None else None
+    if marker is not None:
+        try:
+            out = _load(run, marker['outputs'])
+            logging.info(f"Stage {name}: resumed from checkpoint of {marker['completed']}")
+            return out
+        except Exception as e:
+            logging.warning(f"Checkpoint of stage {name} unreadable, running it again: {e}")
+
+    out = fn(*args, **kwargs)
+    if run is not None:
+        try:
+            outputs = _save(run, name, out)
+            _write_json({'stage': name, 'run_id': run['id'], 'input_hash': run['input_hash'],
+                         'completed': datetime.now().isoformat(timespec='seconds'), 'outputs': outputs},
+                        _marker_path(run, name))
+        except Exception as e:
+            logging.warning(f"Could not checkpoint stage {name} of run {run['id']}: {e}")
+    return out
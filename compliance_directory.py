@@ -0,0 +1,59 @@
+# compliance_directory.py
+"""
+Program directory: the PD/PA report list as a program -> director/admin lookup.
+
+program_directory() reduces the normalized list to one row per program and
+admin, with the coordinator's "Last, First" split into admin names, in
+vectorized string ops. compliance_ingest caches the result like any input (kind 'directory',
+keyed by the PD_and_PA_report_list.xlsx content hash), so it is built once per
+export. enrich() attaches it to a findings frame with a single indexed join on
+the normalized program name: per (admin email, program) for the weekly list,
+so a program with several admins keeps each one, and on the program's first
+listing for the monthly list.
+"""
+import numpy as np
+import pandas as pd
+
+KEY_COL = 'Program Key'
+DIRECTOR_COLS = ['Program Director First Name', 'Program Director Last Name', 'Program Director Email']
+DIRECTORY_COLS = (['Program'] + DIRECTOR_COLS +
+                  ['Program Admin First Name', 'Program Admin Last Name', 'Program Admin Email'])
+
+
+def program_key(programs):
+    # Join key: program name stripped and lower-cased
+    return pd.Series(programs).astype(str).str.strip().str.lower()
+
+
+def program_directory(pd_list):
+    """
+    DIRECTORY_COLS plus KEY_COL, one row per program (normalized) and admin
+    email, first listing wins. Missing source columns come through as NaN.
+    """
+    directory = pd.DataFrame(index=pd_list.index)
+    directory['Program'] = pd_list['Program'].astype(str).str.strip()
+    for col in DIRECTOR_COLS:
+        directory[col] = pd_list[col] if col in pd_list.columns else np.nan
+
+    # "Last, First" -> admin last/first name; no comma: all of it is the last name
+    coordinator = (pd_list['programcoordinator'] if 'programcoordinator' in pd_list.columns
+                   else pd.Series('', index=pd_list.index)).fillna('').astype(str).str.partition(',')
+    directory['Program Admin First Name'] = coordinator[2].str.strip()
+    directory['Program Admin Last Name'] = coordinator[0].str.strip()
+    directory['Program Admin Email'] = pd_list['Program Admin Email'] if 'Program Admin Email' in pd_list.columns else np.nan
+
+    directory[KEY_COL] = program_key(directory['Program'])
+    return directory.drop_duplicates(subset=['Program Admin Email', KEY_COL], ignore_index=True)
+
+
+def enrich(findings, directory, columns=DIRECTORY_COLS, by_admin=False, lsuffix='', rsuffix='_info'):
+    """
+    findings with the directory's columns joined on its Program (normalized), and
+    on Program Admin Email as well with by_admin; without it, on the program's
+    first listing. Rows without a match get NaN; a column name in both frames
+    takes the suffixes.
+    """
+    keys = ['Program Admin Email', KEY_COL] if by_admin else [KEY_COL]
+    lookup = (directory if by_admin else directory.drop_duplicates(subset=KEY_COL)).set_index(keys)[columns]
+    findings = findings.assign(**{KEY_COL: program_key(findings['Program']).to_numpy()})
+    return findings.join(lookup, on=keys, lsuffix=lsuffix, rsuffix=rsuffix).drop(columns=KEY_COL)
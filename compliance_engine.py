@@ -0,0 +1,313 @@
+# compliance_engine.py
+"""
+Vectorized compliance computations shared by the weekly and monthly generators.
+"""
+import numpy as np
+import pandas as pd
+
+MIN_DAYS_COVERED = 5
+IDENTITY_COLS = ['Trainee First Name', 'Trainee Last Name', 'Program', 'Program Admin Email']
+NPI_COL = "Person's National Provider Identifier"
+ACGME_MAX_WEEKLY_HOURS = 80
+ACGME_AVERAGING_WEEKS = 4
+ACGME_MAX_CONTINUOUS_HOURS = 24 + 4  # 24 hours of duty plus up to 4 for transitions
+ACGME_MIN_REST_HOURS = 8
+ACGME_MIN_REST_AFTER_24_HOURS = 14
+ACGME_DAYS_OFF_PER_WEEK = 1
+# Work Types that log leave (midnight to midnight), not time on duty
+LEAVE_WORK_TYPES = ['Vacation', 'Sick Day', 'Holiday', 'Personal Day', 'Bereavement', 'Jury Duty',
+                    'Parental Leave', 'Leave of Absence']
+
+
+# ---------- Trainee dimension ----------
+def _encode(values, index):
+    # Position of each value in index, -1 when missing; categoricals are looked up once per category
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        lookup = np.append(index.get_indexer(values.cat.categories), -1)
+        return lookup[values.cat.codes.to_numpy()]
+    return index.get_indexer(values)
+
+
+def trainee_ids(*frames, key_col='Trainee Email', npi_col=NPI_COL):
+    """
+    Encodes the trainees of several frames on one dense integer id space.
+    Rows are keyed by normalized email; a row without an email takes the id its
+    NPI has on another row (e.g. the roster). Returns (emails, ids): emails is a
+    sorted Index whose positions are the ids, so id order is email order, and ids
+    holds an int64 array per frame, -1 where a row cannot be resolved.
+    """
+    uniques = np.concatenate([np.asarray(f[key_col].dropna().unique(), dtype=object) for f in frames])
+    emails = pd.Index(pd.unique(uniques), dtype=object, name=key_col).sort_values()
+    ids = [_encode(f[key_col], emails).astype(np.int64) for f in frames]
+
+    # NPI fallback: rows without a resolvable email borrow the id their NPI has elsewhere
+    npis = [pd.to_numeric(f[npi_col], errors='coerce').to_numpy(dtype=float) if npi_col in f.columns
+            else np.full(len(f), np.nan) for f in frames]
+    by_npi = pd.Series(np.concatenate(ids), index=np.concatenate(npis))
+    by_npi = by_npi[(by_npi.to_numpy() >= 0) & by_npi.index.notna()]
+    by_npi = by_npi[~by_npi.index.duplicated()]
+    for i, n in zip(ids, npis):
+        unresolved = (i < 0) & ~np.isnan(n)
+        if unresolved.any():
+            i[unresolved] = by_npi.reindex(n[unresolved]).fillna(-1).to_numpy(dtype=np.int64)
+    return emails, ids
+
+
+# ---------- Week bucketing ----------
+def week_index(ts, first_week_start, n_weeks):
+    """
+    Returns the 0-based week number of each timestamp, counting 7-day weeks
+    from first_week_start (a Sunday at midnight). Timestamps outside the
+    n_weeks window, and NaT, get -1. Weeks cover whole days, Sunday through
+    Saturday.
+    """
+    day = _day_ordinals(ts)
+    anchor = np.datetime64(pd.Timestamp(first_week_start).normalize(), 'D').astype(np.int64)
+    week = (day - anchor) // 7
+    valid = pd.Series(ts).notna().to_numpy() & (week >= 0) & (week < n_weeks)
+    return np.where(valid, week, -1)
+
+
+def missing_week_pairs(expected, weeks, ids, n_weeks, n_ids):
+    """
+    (week, trainee id) arrays for every id in expected with no row in a week,
+    given each row's week number and trainee id (-1 in either is ignored).
+    A week x trainee bitmap stands in for the set difference.
+    """
+    seen = np.zeros((n_weeks, n_ids), dtype=bool)
+    ok = (weeks >= 0) & (ids >= 0)
+    seen[weeks[ok], ids[ok]] = True
+    expected = np.unique(expected[expected >= 0])
+    week, col = np.nonzero(~seen[:, expected])
+    return week, expected[col]
+
+
+# ---------- Day coverage ----------
+def _day_ordinals(ts):
+    # Calendar-day number for each timestamp; NaT maps to the int64 minimum
+    return ts.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+
+
+def covered_day_counts(hours, window_start=None, window_end=None, key_col='Trainee Email'):
+    """
+    Counts the distinct calendar days covered by each trainee's shifts.
+    A shift covers every day from its start date through its end date; a shift
+    ending before it starts covers its start date only, and a shift without an
+    end covers nothing (the trainee still appears with whatever else they have).
+    With a window, only shifts whose Actual Start falls inside it are counted.
+    key_col may be a list (e.g. ['Week', 'Trainee Email']) to count per group.
+    Returns a Series indexed by key_col value(s).
+    """
+    key_cols = [key_col] if isinstance(key_col, str) else list(key_col)
+    if window_start is not None or window_end is not None:
+        mask = pd.Series(True, index=hours.index)
+        if window_start is not None:
+            mask &= hours['Actual Start'] >= window_start
+        if window_end is not None:
+            mask &= hours['Actual Start'] <= window_end
+        hours = hours.loc[mask]
+
+    hours = hours.dropna(subset=key_cols)
+    if len(key_cols) == 1:
+        codes, trainees = pd.factorize(hours[key_cols[0]])
+        trainees = pd.Index(trainees, name=key_cols[0])
+    else:
+        codes, trainees = pd.MultiIndex.from_frame(hours[key_cols]).factorize()
+        trainees = trainees.set_names(key_cols)
+    if len(trainees) == 0:
+        return pd.Series(dtype=np.int64, index=trainees, name='Days Covered')
+
+    start = pd.Series(hours['Actual Start'])
+    end = pd.Series(hours['Actual End'])
+    valid = start.notna().to_numpy() & end.notna().to_numpy()
+
+    codes = codes[valid]
+    first_day = _day_ordinals(start[valid])
+    last_day = np.maximum(_day_ordinals(end[valid]), first_day)
+    n_days = last_day - first_day + 1
+
+    # Expand each shift into its day ordinals without building Python lists
+    row_offsets = np.repeat(np.cumsum(n_days) - n_days, n_days)
+    days = np.repeat(first_day, n_days) + (np.arange(n_days.sum()) - row_offsets)
+    owners = np.repeat(codes, n_days)
+
+    # Deduplicate (trainee, day) pairs via a single packed integer key
+    if days.size:
+        base = days.min()
+        span = days.max() - base + 1
+        pairs = np.unique(owners * span + (days - base))
+        owners = pairs // span
+
+    counts = np.bincount(owners, minlength=len(trainees))
+    return pd.Series(counts, index=trainees, name='Days Covered')
+
+
+def partial_coverage(hours, window_start=None, window_end=None, min_days=MIN_DAYS_COVERED,
+                     key_col='Trainee Email'):
+    # Trainees with at least one entry in the window but fewer than min_days covered
+    counts = covered_day_counts(hours, window_start, window_end, key_col)
+    return counts.index[counts < min_days]
+
+
+# ---------- Hour rules ----------
+def on_duty(hours):
+    # Rows that are time on duty: every Work Type but LEAVE_WORK_TYPES (all rows when there is no Work Type)
+    if 'Work Type' not in hours.columns:
+        return np.ones(len(hours), dtype=bool)
+    work_type = pd.Series(hours['Work Type']).astype(object).fillna('').astype(str).str.strip().str.lower()
+    return ~work_type.isin([t.lower() for t in LEAVE_WORK_TYPES]).to_numpy()
+
+
+def shift_hours(hours):
+    # Hours per shift: Actual Hours Worked where logged, else the Actual Start -> Actual End span
+    span = (pd.Series(hours['Actual End']) - pd.Series(hours['Actual Start'])).dt.total_seconds() / 3600
+    if 'Actual Hours Worked' in hours.columns:
+        span = pd.to_numeric(hours['Actual Hours Worked'], errors='coerce').fillna(span)
+    return span.clip(lower=0).fillna(0).to_numpy(dtype=float)
+
+
+def weekly_hours(hours, first_week_start, n_weeks, n_keys, key_col='Trainee Id'):
+    """
+    Hours worked per (trainee, week) as an (n_keys, n_weeks) array; key_col holds
+    dense ids 0..n_keys-1 (-1 rows and leave rows are skipped) and weeks count
+    7-day spans from first_week_start, a Sunday at midnight. A shift crossing a
+    week boundary is split between the weeks in proportion to its time in each;
+    a shift without a (later) end counts in its start week.
+    """
+    week_ns = np.int64(7 * 86400 * 10**9)
+    anchor = np.datetime64(pd.Timestamp(first_week_start).normalize(), 'ns').astype(np.int64)
+    start = pd.Series(hours['Actual Start'])
+    end = pd.Series(hours['Actual End'])
+    keys = np.asarray(hours[key_col], dtype=np.int64)
+    worked = shift_hours(hours)
+
+    valid = start.notna().to_numpy() & (keys >= 0) & on_duty(hours)
+    s = start.to_numpy(dtype='datetime64[ns]').astype(np.int64) - anchor
+    e = end.to_numpy(dtype='datetime64[ns]').astype(np.int64) - anchor
+    spans = valid & end.notna().to_numpy() & (e > s)
+    e = np.where(spans, e, s)
+
+    # One piece per (shift, week touched), limited to the n_weeks window
+    first_week = np.maximum(np.floor_divide(s, week_ns), 0)
+    last_week = np.minimum(np.where(spans, np.floor_divide(e - 1, week_ns), np.floor_divide(s, week_ns)), n_weeks - 1)
+    n_pieces = np.where(valid, np.maximum(last_week - first_week + 1, 0), 0)
+    rows = np.repeat(np.arange(len(keys)), n_pieces)
+    week = np.repeat(first_week, n_pieces) + (np.arange(n_pieces.sum()) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces))
+
+    lo = np.maximum(s[rows], week * week_ns)
+    hi = np.minimum(e[rows], (week + 1) * week_ns)
+    share = np.where(spans[rows], (hi - lo) / np.maximum(e[rows] - s[rows], 1), 1.0)
+    totals = np.bincount(keys[rows] * n_weeks + week, weights=worked[rows] * share, minlength=n_keys * n_weeks)
+    return totals.reshape(n_keys, n_weeks)
+
+
+def rolling_average_hours(weekly, weeks=ACGME_AVERAGING_WEEKS):
+    # Mean weekly hours over the `weeks` weeks ending at each column (earlier weeks outside the array count as 0)
+    cumulative = np.concatenate([np.zeros((weekly.shape[0], 1)), np.cumsum(weekly, axis=1)], axis=1)
+    lagged = np.concatenate([np.zeros((weekly.shape[0], weeks)), cumulative], axis=1)[:, :cumulative.shape[1]]
+    return (cumulative - lagged)[:, 1:] / weeks
+
+
+# ---------- Duty periods ----------
+def duty_periods(hours, key_col='Trainee Id'):
+    """
+    Merges each trainee's overlapping or back-to-back shifts into continuous duty
+    periods: one sort by (trainee, start), then a sweep that opens a new period
+    wherever a shift starts after every earlier shift of that trainee has ended.
+    Shifts without a (later) end, and leave rows, are skipped (so leave days are
+    duty-free days). Returns a frame of key_col, Start,
+    End, Hours, and Rest Before / Hours Before: the gap since, and the length of,
+    the trainee's previous period (NaN for the first).
+    """
+    keys = np.asarray(hours[key_col], dtype=np.int64)
+    start = pd.Series(hours['Actual Start']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    end = pd.Series(hours['Actual End']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    valid = (keys >= 0) & pd.Series(hours['Actual Start']).notna().to_numpy() \
+        & pd.Series(hours['Actual End']).notna().to_numpy() & (end > start) & on_duty(hours)
+    keys, start, end = keys[valid], start[valid], end[valid]
+    order = np.lexsort((start, keys))
+    keys, start, end = keys[order], start[order], end[order]
+
+    # A shift opens a period if it starts after the latest end among the trainee's earlier shifts
+    running_end = pd.Series(end).groupby(keys, sort=False).cummax().to_numpy()
+    opens = np.ones(len(keys), dtype=bool)
+    opens[1:] = (keys[1:] != keys[:-1]) | (start[1:] > running_end[:-1])
+    first = np.flatnonzero(opens)
+    p_keys, p_start = keys[first], start[first]
+    p_end = np.maximum.reduceat(end, first) if len(first) else end[:0]
+
+    ns_per_hour = 3600 * 10**9
+    p_hours = (p_end - p_start) / ns_per_hour
+    same_trainee = np.zeros(len(p_keys), dtype=bool)
+    same_trainee[1:] = p_keys[1:] == p_keys[:-1]
+    rest = np.where(same_trainee, (p_start - np.r_[0, p_end[:-1]]) / ns_per_hour, np.nan)
+    before = np.where(same_trainee, np.r_[np.nan, p_hours[:-1]], np.nan)
+    return pd.DataFrame({key_col: p_keys,
+                         'Start': p_start.astype('datetime64[ns]'), 'End': p_end.astype('datetime64[ns]'),
+                         'Hours': p_hours, 'Rest Before': rest, 'Hours Before': before})
+
+
+def short_rest(periods):
+    # Periods starting under 8 hours after the previous one ended (14 after one of 24 hours or more)
+    required = np.where(periods['Hours Before'] >= 24, ACGME_MIN_REST_AFTER_24_HOURS, ACGME_MIN_REST_HOURS)
+    return (periods['Rest Before'] < required).to_numpy()
+
+
+def duty_free_days(periods, first_day, n_days, n_keys, key_col='Trainee Id'):
+    """
+    Calendar days in the n_days from first_day with no duty at all, per key, as
+    an array of n_keys. A period ending exactly at midnight leaves the next day free.
+    """
+    anchor = np.datetime64(pd.Timestamp(first_day).normalize(), 'D').astype(np.int64)
+    keys = periods[key_col].to_numpy(dtype=np.int64)
+    first = _day_ordinals(periods['Start']) - anchor
+    last = (periods['End'].to_numpy(dtype='datetime64[ns]') - np.timedelta64(1, 'ns')).astype('datetime64[D]').astype(np.int64) - anchor
+    first, last = np.maximum(first, 0), np.minimum(last, n_days - 1)
+    n = np.maximum(last - first + 1, 0)
+    days = np.repeat(first, n) + (np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n))
+    on_duty = np.zeros(n_keys * n_days, dtype=bool)
+    on_duty[np.repeat(keys, n) * n_days + days] = True
+    return n_days - on_duty.reshape(n_keys, n_days).sum(axis=1)
+
+
+def period_messages(periods, value_col, unit):
+    # "MM/DD/YYYY (<value><unit>)" per period, dated by its start
+    return periods['Start'].dt.strftime('%m/%d/%Y') + ' (' + periods[value_col].round(1).astype(str) + unit + ')'
+
+
+# ---------- Consolidation ----------
+def join_sorted_unique(values):
+    return ', '.join(sorted(set(values.dropna())))
+
+
+def join_sorted_unique_by(keys, values):
+    """
+    join_sorted_unique of values per key, as a Series indexed by the sorted keys.
+    One sort of the (key, value) pairs instead of a Python call per group.
+    """
+    pairs = (pd.DataFrame({'key': np.asarray(keys), 'value': np.asarray(values, dtype=object)})
+             .dropna().drop_duplicates().sort_values(['key', 'value']))
+    if pairs.empty:
+        return pd.Series(dtype=object)
+    key = pairs['key'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    groups = np.split(pairs['value'].to_numpy(), starts[1:])
+    return pd.Series([', '.join(g) for g in groups], index=key[starts], dtype=object)
+
+
+def violation_messages(violations):
+    # "MM/DD/YYYY <Rules Violated>" per violation row
+    dates = violations['Actual Start'].dt.strftime('%m/%d/%Y').fillna('')
+    rules = violations['Rules Violated'].fillna('').astype(str)
+    return (dates + ' ' + rules).str.strip()
+
+
+def trainee_identity(*frames, key_col='Trainee Email'):
+    """
+    First non-null identity fields (IDENTITY_COLS) per trainee.
+    Frames are taken in priority order, e.g. the active roster before hours rows.
+    """
+    parts = [f[[key_col] + IDENTITY_COLS] for f in frames if len(f)]
+    if not parts:
+        return pd.DataFrame(columns=IDENTITY_COLS, index=pd.Index([], name=key_col))
+    return pd.concat(parts, ignore_index=True).groupby(key_col, sort=False)[IDENTITY_COLS].first()
@@ -0,0 +1,208 @@
+# compliance_findings.py
+"""
+Per-(trainee, week) findings, and the SQLite store the weekly runs keep them in.
+
+A week's findings hold one row per trainee and week: rows logged, days covered,
+ResQ, the week's violation messages and the trainee's identity (roster first,
+else the week's flagged rows). Roster trainees without entries get a row with
+Rows = 0. aggregate_weeks() turns the rows of a month's weeks into the monthly
+list, so the monthly job can read 4-5 weeks from the store instead of the export.
+
+The store (standard-library sqlite3) is indexed on email, program and week, so
+ad-hoc questions are plain SQL, e.g. every week with missing hours this year:
+
+    SELECT week_start FROM findings WHERE trainee_email = ? AND week_start >= '2025-07-01'
+      AND (rows = 0 OR days_covered < 5)
+"""
+import sqlite3
+import logging
+from contextlib import closing
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from compliance_engine import (IDENTITY_COLS, MIN_DAYS_COVERED, trainee_ids, join_sorted_unique_by,
+                               trainee_identity)
+from compliance_incremental import CELL_KEY, MESSAGE_SEP, cell_findings
+
+FINDINGS_COLS = CELL_KEY + ['Rows', 'Days Covered', 'ResQ', 'Violations'] + IDENTITY_COLS
+STORE_COLUMNS = dict(zip(FINDINGS_COLS, ['week_start', 'trainee_email', 'rows', 'days_covered', 'resq', 'violations',
+                                         'first_name', 'last_name', 'program', 'program_admin_email']))
+ALL_PROGRAMS = '*'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS findings (
+    trainee_email TEXT NOT NULL,
+    week_start TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    days_covered INTEGER NOT NULL,
+    resq INTEGER NOT NULL,
+    violations TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    program TEXT,
+    program_admin_email TEXT,
+    PRIMARY KEY (trainee_email, week_start)
+);
+CREATE INDEX IF NOT EXISTS findings_program_week ON findings (program, week_start);
+CREATE INDEX IF NOT EXISTS findings_week ON findings (week_start);
+CREATE TABLE IF NOT EXISTS stored_weeks (
+    week_start TEXT NOT NULL,
+    programs TEXT NOT NULL,
+    stored_at TEXT NOT NULL,
+    PRIMARY KEY (week_start, programs)
+);
+"""
+
+
+# ---------- Findings ----------
+def week_findings(active, cells, week_starts, hours=None):
+    """
+    Findings rows for week_starts from cells (compliance_incremental.cell_findings)
+    and the roster. Roster rows without an email resolve through their NPI in
+    hours, when given.
+    """
+    week_starts = pd.DatetimeIndex(week_starts)
+    emails, (active_ids, *_) = trainee_ids(active, *([hours] if hours is not None else []))
+    roster = active.loc[active_ids >= 0].assign(**{'Trainee Email': emails[active_ids[active_ids >= 0]]})
+    roster_identity = trainee_identity(roster)
+
+    cells = cells.loc[cells['Week Start'].isin(week_starts)]
+    expected = pd.MultiIndex.from_product([week_starts, roster_identity.index], names=CELL_KEY)
+    no_entries = expected[~expected.isin(pd.MultiIndex.from_frame(cells[CELL_KEY]))].to_frame(index=False)
+    findings = pd.concat([cells, no_entries.assign(**{'Rows': 0, 'Days Covered': 0, 'ResQ': False})],
+                         ignore_index=True)
+    findings['ResQ'] = findings['ResQ'].astype(bool)
+
+    # Roster identity first, the week's flagged rows for anything it lacks
+    identity = roster_identity.reindex(findings['Trainee Email']).set_axis(findings.index)
+    findings[IDENTITY_COLS] = identity.astype(object).combine_first(findings[IDENTITY_COLS].astype(object))
+    return findings[FINDINGS_COLS].sort_values(CELL_KEY, ignore_index=True)
+
+
+def findings_from_hours(active, hours, week_starts):
+    # week_findings straight from hours rows, emails resolved against the roster as well
+    emails, (_, hours_ids) = trainee_ids(active, hours)
+    row_emails = np.full(len(hours), None, dtype=object)
+    row_emails[hours_ids >= 0] = emails.to_numpy()[hours_ids[hours_ids >= 0]]
+    return week_findings(active, cell_findings(hours, pd.Series(row_emails, index=hours.index)), week_starts, hours)
+
+
+def aggregate_weeks(findings, week_starts, week_labels):
+    """
+    Monthly list from the findings of week_starts (labelled by week_labels):
+    trainees with ResQ, violations, or weeks with no entries or under
+    MIN_DAYS_COVERED days, sorted by email, as process_month returns them.
+    """
+    week_starts = pd.DatetimeIndex(week_starts)
+    findings = findings.loc[findings['Week Start'].isin(week_starts)].sort_values(CELL_KEY)
+    email = findings['Trainee Email'].to_numpy(dtype=object)
+    labels = np.asarray(week_labels, dtype=object)[week_starts.get_indexer(findings['Week Start'])]
+
+    resq = pd.Series('Yes', index=np.unique(email[findings['ResQ'].to_numpy(dtype=bool)]), dtype=object)
+    messages = findings.loc[findings['Violations'].notna(), ['Trainee Email', 'Violations']]
+    messages = messages.assign(Violations=messages['Violations'].str.split(MESSAGE_SEP)).explode('Violations')
+    violations = join_sorted_unique_by(messages['Trainee Email'], messages['Violations'])
+    missing = ((findings['Rows'] == 0) | (findings['Days Covered'] < MIN_DAYS_COVERED)).to_numpy()
+    missing_weeks = join_sorted_unique_by(email[missing], labels[missing])
+
+    consolidated_df = pd.concat({'ResQ Violations': resq,
+                                 'Violations': violations,
+                                 'Week(s) of Missing Hours': missing_weeks}, axis=1).sort_index()
+    identity = findings.groupby('Trainee Email', sort=False)[IDENTITY_COLS].first()
+    consolidated_df = consolidated_df.join(identity, how='left').rename_axis('Trainee Email').reset_index()
+    return consolidated_df[['Trainee Email'] + IDENTITY_COLS + ['ResQ Violations', 'Violations',
+                                                                 'Week(s) of Missing Hours']]
+
+
+# ---------- SQLite store ----------
+def connect(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _week_key(week_start):
+    return pd.Timestamp(week_start).strftime('%Y-%m-%d')
+
+
+def _scope(programs):
+    return ALL_PROGRAMS if programs is None else '\n'.join(sorted(programs))
+
+
+def save_findings(db_path, findings, week_starts, programs=None):
+    """
+    Replaces the stored findings of week_starts for programs (None: all) with
+    findings, in one transaction, and records the weeks as stored for them.
+    Failures are logged, never raised: the store is a by-product of the run.
+    """
+    weeks = [_week_key(w) for w in week_starts]
+    rows = findings.rename(columns=STORE_COLUMNS)[list(STORE_COLUMNS.values())].astype(object)
+    rows['week_start'] = pd.to_datetime(rows['week_start']).dt.strftime('%Y-%m-%d')
+    rows['resq'] = rows['resq'].astype(bool).astype(int)
+    rows = rows.where(rows.notna(), None)
+    try:
+        with closing(connect(db_path)) as conn, conn:
+            for week in weeks:
+                if programs is None:
+                    conn.execute("DELETE FROM findings WHERE week_start = ?", (week,))
+                else:
+                    marks = ', '.join('?' * len(programs))
+                    # Rows without a program are only read for all-program months; those runs replace them
+                    conn.execute(f"DELETE FROM findings WHERE week_start = ? AND program IN ({marks})",
+                                 (week, *programs))
+            conn.executemany(f"INSERT OR REPLACE INTO findings ({', '.join(rows.columns)}) "
+                             f"VALUES ({', '.join('?' * len(rows.columns))})", rows.itertuples(index=False, name=None))
+            stored_at = datetime.now().isoformat(timespec='seconds')
+            conn.executemany("INSERT OR REPLACE INTO stored_weeks VALUES (?, ?, ?)",
+                             [(week, _scope(programs), stored_at) for week in weeks])
+        logging.info(f"Stored {len(rows)} findings rows for {len(weeks)} weeks in {db_path}")
+    except Exception as e:
+        logging.warning(f"Could not store findings in {db_path}: {e}")
+
+
+def covers(db_path, week_starts, programs=None):
+    # True if every week was stored for all programs, or for a superset of programs
+    try:
+        with closing(connect(db_path)) as conn:
+            stored = conn.execute("SELECT week_start, programs FROM stored_weeks").fetchall()
+    except Exception as e:
+        logging.warning(f"Findings store {db_path} unreadable: {e}")
+        return False
+    scopes = {}
+    for week, scope in stored:
+        scopes.setdefault(week, []).append(None if scope == ALL_PROGRAMS else set(scope.split('\n')))
+    return all(any(s is None or (programs is not None and set(programs) <= s) for s in scopes.get(_week_key(w), []))
+               for w in week_starts)
+
+
+def query(db_path, sql, params=()):
+    # Ad-hoc SQL against the store, as a DataFrame
+    with closing(connect(db_path)) as conn:
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+def load_findings(db_path, week_starts, programs=None):
+    """
+    Stored findings of week_starts as a findings frame. With programs, only
+    rows of trainees whose program is listed (or unknown) are read.
+    """
+    weeks = [_week_key(w) for w in week_starts]
+    sql = f"SELECT * FROM findings WHERE week_start IN ({', '.join('?' * len(weeks))})"
+    params = list(weeks)
+    if programs is not None:
+        sql += f" AND (program IN ({', '.join('?' * len(programs))}) OR program IS NULL)"
+        params += list(programs)
+    rows = query(db_path, sql, params).rename(columns={v: k for k, v in STORE_COLUMNS.items()})
+    rows['Week Start'] = pd.to_datetime(rows['Week Start'])
+    rows['ResQ'] = rows['ResQ'].astype(bool)
+    return rows[FINDINGS_COLS]
+
+
+def trainee_history(db_path, email, since=None):
+    # Every stored week of one trainee (optionally from `since`), oldest first
+    sql = "SELECT * FROM findings WHERE trainee_email = ?"
+    params = [email.strip().lower()]
+    if since is not None:
+        sql += " AND week_start >= ?"
+        params.append(_week_key(since))
+    return query(db_path, sql + " ORDER BY week_start", params)
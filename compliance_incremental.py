@@ -0,0 +1,184 @@
+# compliance_incremental.py
+"""
+Incremental processing of the hours export against the last processed snapshot.
+
+Findings are kept per (trainee, week) cell in a persisted store: rows logged,
+days covered, ResQ flag, violation messages and the identity fields of the first
+flagged row. Each new export is diffed against the previous one on a row key
+(NPI, email, Actual Start, Actual End, plus an occurrence number for exact
+duplicates); a row whose other fields changed (Last Update included) counts as
+changed. Only cells touched by an inserted, changed or deleted row are
+recomputed, so finalized weeks are read back from the store. The export is a
+rolling window: weeks before the first one it covers in full are frozen, their
+cells kept as stored even though their rows have aged out of the export.
+
+    store_dir/rows_v<N>.parquet   key, version, email and week of every processed row
+    store_dir/cells_v<N>.parquet  one row per (Week Start, Trainee Email)
+
+Cells are computed from the whole export (every program); rows without an
+email resolve through an NPI seen elsewhere in the export.
+"""
+import os
+import logging
+import numpy as np
+import pandas as pd
+from compliance_ingest import HOURS_RULE_COLS
+from compliance_engine import (IDENTITY_COLS, NPI_COL, trainee_ids, covered_day_counts,
+                               violation_messages)
+
+# Bump whenever the cell computation below changes so an old store is rebuilt
+STORE_VERSION = 1
+CELL_KEY = ['Week Start', 'Trainee Email']
+ROW_KEY_COLS = [NPI_COL, 'Trainee Email', 'Actual Start', 'Actual End']
+MESSAGE_SEP = '\n'
+# Hours columns the store needs: the rule columns plus Last Update for change detection
+STORE_HOURS_COLS = HOURS_RULE_COLS + ['Last Update']
+
+
+# ---------- Rows ----------
+def week_start(ts):
+    # Sunday on or before each timestamp's date; NaT stays NaT
+    day = pd.Series(ts).dt.normalize()
+    return day - pd.to_timedelta((day.dt.dayofweek + 1) % 7, unit='D')
+
+
+def resolve_emails(hours):
+    # Email per row, NPI fallback within the export itself; unresolvable rows -> NaN
+    emails, (ids,) = trainee_ids(hours)
+    values = np.full(len(hours), None, dtype=object)
+    values[ids >= 0] = emails.to_numpy()[ids[ids >= 0]]
+    return pd.Series(values, index=hours.index, dtype=object)
+
+
+def row_index(hours):
+    """
+    Key, version, email and week of every row. Rows sharing a key are told apart
+    by their order of appearance (Occurrence).
+    """
+    email = resolve_emails(hours)
+    key_frame = hours[[c for c in ROW_KEY_COLS if c != 'Trainee Email']].assign(**{'Trainee Email': email})
+    rows = pd.DataFrame({
+        'Key': pd.util.hash_pandas_object(key_frame[ROW_KEY_COLS], index=False).to_numpy(),
+        'Version': pd.util.hash_pandas_object(hours[[c for c in STORE_HOURS_COLS if c in hours.columns]],
+                                              index=False).to_numpy(),
+        'Trainee Email': email.to_numpy(),
+        'Week Start': week_start(hours['Actual Start']).to_numpy(),
+    })
+    rows['Occurrence'] = rows.groupby('Key').cumcount()
+    return rows
+
+
+def covered_from(hours):
+    # First week the export covers in full: the Sunday on or after its earliest shift (None if it has none)
+    first = hours['Actual Start'].min()
+    if pd.isna(first):
+        return None
+    first_day = first.normalize()
+    return first_day + pd.Timedelta(days=(6 - first_day.dayofweek) % 7)
+
+
+def diff_rows(old, new):
+    """
+    Compares two row_index frames. Returns (inserted, changed, deleted) counts
+    and the CELL_KEY frame of every cell an inserted, changed or deleted row
+    belongs to (for changed rows, both the old and the new cell).
+    """
+    merged = old.merge(new, on=['Key', 'Occurrence'], how='outer', suffixes=('_old', '_new'), indicator=True)
+    deleted = merged['_merge'] == 'left_only'
+    inserted = merged['_merge'] == 'right_only'
+    changed = (merged['_merge'] == 'both') & (merged['Version_old'] != merged['Version_new'])
+
+    touched_old = merged.loc[deleted | changed, ['Week Start_old', 'Trainee Email_old']]
+    touched_new = merged.loc[inserted | changed, ['Week Start_new', 'Trainee Email_new']]
+    cells = pd.concat([touched_old.set_axis(CELL_KEY, axis=1), touched_new.set_axis(CELL_KEY, axis=1)],
+                      ignore_index=True).dropna().drop_duplicates(ignore_index=True)
+    return (int(inserted.sum()), int(changed.sum()), int(deleted.sum())), cells
+
+
+# ---------- Cells ----------
+def cell_findings(hours, emails=None):
+    """
+    Per (Week Start, Trainee Email) findings for the given hours rows: Rows,
+    Days Covered, ResQ, Violations (messages joined by MESSAGE_SEP) and the
+    IDENTITY_COLS of the cell's first ResQ row, else its first violation row.
+    """
+    emails = resolve_emails(hours) if emails is None else emails
+    rows = hours.assign(**{'Trainee Email': emails.to_numpy(), 'Week Start': week_start(hours['Actual Start'])})
+    rows = rows.loc[rows['Week Start'].notna() & rows['Trainee Email'].notna()]
+    if rows.empty:
+        return pd.DataFrame(columns=CELL_KEY + ['Rows', 'Days Covered', 'ResQ', 'Violations'] + IDENTITY_COLS)
+
+    grouped = rows.groupby(CELL_KEY, sort=True)
+    cells = grouped.size().rename('Rows').to_frame()
+    cells['Days Covered'] = covered_day_counts(rows, key_col=CELL_KEY).reindex(cells.index, fill_value=0)
+
+    is_resq = rows['Work Type'].astype(str).str.contains('ResQ', na=False, case=False).to_numpy()
+    is_violation = rows['In Violation'].astype(str).str.strip().str.lower().isin(['yes', 'y']).to_numpy()
+    resq_rows, violation_rows = rows.loc[is_resq], rows.loc[is_violation]
+    cells['ResQ'] = cells.index.isin(pd.MultiIndex.from_frame(resq_rows[CELL_KEY]))
+
+    messages = violation_rows[CELL_KEY].assign(Message=violation_messages(violation_rows))
+    cells['Violations'] = (messages.dropna().drop_duplicates().sort_values(CELL_KEY + ['Message'])
+                           .groupby(CELL_KEY)['Message'].agg(MESSAGE_SEP.join))
+
+    # Identity for trainees off the roster: first non-null field over ResQ rows, then violation rows
+    flagged = pd.concat([resq_rows, violation_rows])[CELL_KEY + IDENTITY_COLS].astype({c: object for c in IDENTITY_COLS})
+    cells = cells.join(flagged.groupby(CELL_KEY, sort=False)[IDENTITY_COLS].first())
+    return cells.reset_index()
+
+
+def _read(path):
+    return pd.read_parquet(path) if os.path.exists(path) else None
+
+
+def _write(df, path):
+    tmp_path = path + '.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def update_cells(hours, store_dir):
+    """
+    Brings the cell store in store_dir up to date with hours (the full normalized
+    export) and returns all cells. Only cells touched since the stored snapshot
+    are recomputed; without a usable store every cell is built. Cells of weeks
+    before the export's window (covered_from) are frozen: kept as stored, never
+    recomputed from partial or aged-out rows. Store read/write failures are
+    logged and the cells are computed from scratch.
+    """
+    rows_path = os.path.join(store_dir, f"rows_v{STORE_VERSION}.parquet")
+    cells_path = os.path.join(store_dir, f"cells_v{STORE_VERSION}.parquet")
+    new_rows = row_index(hours)
+
+    try:
+        old_rows, old_cells = _read(rows_path), _read(cells_path)
+    except Exception as e:
+        logging.warning(f"Result store unreadable, rebuilding {store_dir}: {e}")
+        old_rows = old_cells = None
+
+    if old_rows is None or old_cells is None:
+        logging.info("No result store yet; computing every (trainee, week) cell")
+        cells = cell_findings(hours, new_rows.set_index(hours.index)['Trainee Email'])
+    else:
+        (n_ins, n_chg, n_del), touched = diff_rows(old_rows, new_rows)
+        window_start = covered_from(hours)
+        if window_start is not None:
+            # Rows of earlier weeks have aged out of the export, not been deleted
+            touched = touched.loc[touched['Week Start'] >= window_start]
+        logging.info(f"Hours diff: {n_ins} inserted, {n_chg} changed, {n_del} deleted rows; "
+                     f"recomputing {len(touched)} of {len(old_cells)} cells"
+                     + (f", weeks before {window_start:%Y-%m-%d} frozen" if window_start is not None else ''))
+        touched_index = pd.MultiIndex.from_frame(touched)
+        in_touched = pd.MultiIndex.from_frame(new_rows[CELL_KEY]).isin(touched_index)
+        fresh = cell_findings(hours.loc[in_touched], new_rows.loc[in_touched].set_index(hours.index[in_touched])['Trainee Email'])
+        kept = old_cells.loc[~pd.MultiIndex.from_frame(old_cells[CELL_KEY]).isin(touched_index)]
+        cells = pd.concat([kept, fresh], ignore_index=True).sort_values(CELL_KEY, ignore_index=True)
+
+    try:
+        os.makedirs(store_dir, exist_ok=True)
+        _write(cells, cells_path)
+        _write(new_rows, rows_path)
+    except Exception as e:
+        # Parquet support (pyarrow) is optional; the cells are still usable for this run
+        logging.warning(f"Could not write result store {store_dir}: {e}")
+    return cells
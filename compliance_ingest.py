@@ -0,0 +1,669 @@
+# compliance_ingest.py
+"""
+Shared ingest layer for the weekly and monthly compliance generators.
+
+Each input workbook is parsed with openpyxl once, normalized, and stored as a
+typed Parquet file keyed by the workbook's content hash. Later runs on the same
+export (reruns, or the weekly and monthly jobs reading the same hours.xlsx)
+load the Parquet copy instead of re-parsing the workbook. concurrent_inputs()
+loads the three workbooks at once, the hours parse in its own process. The
+PD/PA list is also cached as its program directory (kind 'directory', see
+compliance_directory), so the lookup is built once per export. The weekly
+compliance list (kind 'compliance_list') is cached by the run that writes it
+(store_normalized), so the next week's diff reads it without a parse.
+
+Columns are bound by header name, not position: check_workbook() reads only
+the header and a few rows of a workbook, binds each header to its canonical
+name (exact, alias, or ignoring case and punctuation), and raises ValueError
+in milliseconds if a required column is missing, ambiguous or of the wrong
+type. The full parse then reads only the bound columns.
+"""
+import os
+import re
+import glob
+import hashlib
+import logging
+import operator
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pandas as pd
+import numpy as np
+from openpyxl import load_workbook
+from datetime import date
+from compliance_directory import program_directory
+
+# Bump whenever the normalization below changes so stale cache files are ignored
+INGEST_CACHE_VERSION = 6
+CACHE_KEEP_PER_KIND = 4
+
+# Headers as exported, in export order; normalize_* binds them by name to the *_COLS_NEW at the same position
+HOURS_COLS_RAW = ["Person's National Provider Identifier", 'Person', 'Status', 'Program',
+       'Work Type', 'Start Date/Time', 'End Date/Time', 'Hours Worked',
+       'Rotation', 'Rotation Start Date', 'Rotation End Date', 'Source',
+       'Resident Approved', 'Administrator Approved', 'Institution/Location',
+       'In Violation', 'Violations', 'Rules Violated', 'Comment', 'Comment By',
+       'Last Update', 'Date Logged', "Person's Coordinator Email",
+       "Person's Primary E-Mail Address", "Person's Program Coordinator",
+       "Person's Program Director"]
+
+ACTIVE_COLS_RAW = ['ID Number', 'Last Name', 'First Name', 'Middle Name',
+       "Person's National Provider Identifier",
+       "Person's Primary E-Mail Address", 'Department/Division', 'Program',
+       "Person's Program Director", 'Status', "Person's Program Start Date",
+       "Person's Program End Date", "Person's Coordinator Email",
+       "Person's Program Coordinator"]
+
+PD_LIST_COLS_RAW = ['program', 'programtype', 'department', 'programdirector_first_name',
+       'programdirector_last_name', 'programdirector', 'programdirectoremail',
+       'programcoordinator', 'programcoordinatoremail']
+
+HOURS_COLS_NEW = ["Person's National Provider Identifier", 'Person', 'Status', 'Program',
+       'Work Type', 'Actual Start', 'Actual End', 'Actual Hours Worked',
+       'Rotation', 'Rotation Start Date', 'Rotation End Date', 'Source',
+       'Resident Approved', 'Administrator Approved', 'Institution/Location',
+       'In Violation', 'Violation(s)', 'Rules Violated', 'Comment', 'Comment By',
+       'Last Update', "Date Logged", "Program Admin Email",
+       "Trainee Email", "Person's Program Coordinator",
+       "Person's Program Director", 'Trainee Last Name', 'Trainee First Name']
+
+ACTIVE_COLS_NEW = ['ID Number', 'Trainee Last Name', 'Trainee First Name', 'Middle Name',
+       "Person's National Provider Identifier",
+       "Trainee Email", 'Department/Division', 'Program',
+       "Person's Program Director", 'Status', "Person's Program Start Date",
+       "Person's Program End Date", "Program Admin Email",
+       "Person's Program Coordinator"]
+
+PD_LIST_COLS_NEW = ['Program', 'programtype', 'department', 'Program Director First Name',
+       'Program Director Last Name', 'programdirector', 'Program Director Email',
+       'programcoordinator', 'Program Admin Email']
+
+# The weekly compliance list as written (work_hours_compliance_generator), read back for the week-over-week diff
+COMPLIANCE_LIST_COLS = ['Trainee Email', 'Trainee First Name', 'Trainee Last Name', 'Program Admin Email', 'Program',
+       'ResQ Violations', 'Week of Missing Hours', 'Violations', '80 Hr', 'Day Off', '24+', 'SB',
+       'Program Director First Name', 'Program Director Last Name', 'Program Director Email']
+
+HOURS_DATETIME_COLS = ['Actual Start', 'Actual End', 'Date Logged', 'Last Update']
+
+# Column types for hours batches read in streaming mode, so every batch (and the
+# Parquet cache written from them) has the same schema regardless of nulls
+HOURS_FLOAT_COLS = ["Person's National Provider Identifier", 'Actual Hours Worked']
+HOURS_STREAM_DATETIME_COLS = ['Actual Start', 'Actual End', 'Rotation Start Date',
+                              'Rotation End Date', 'Date Logged']
+STREAM_BATCH_SIZE = 50_000
+
+# Hours columns read by the compliance rules; the rest (Comment, Source, Rotation fields, ...)
+# are skipped when a projection is requested
+HOURS_RULE_COLS = ['Trainee Email', "Person's National Provider Identifier", 'Trainee First Name',
+                   'Trainee Last Name', 'Program', 'Program Admin Email', 'Work Type',
+                   'Actual Start', 'Actual End', 'Actual Hours Worked', 'In Violation', 'Rules Violated']
+
+# Low-cardinality columns held as categoricals once normalized: one small integer code
+# per row instead of a string object, and .str/isin work runs once per category
+CATEGORICAL_COLS = {
+    'hours': ['Trainee Email', 'Trainee First Name', 'Trainee Last Name', 'Program',
+              'Program Admin Email', 'Work Type', 'Status', 'In Violation', 'Rules Violated',
+              'Source', 'Resident Approved', 'Administrator Approved', 'Institution/Location',
+              "Person's Program Coordinator", "Person's Program Director"],
+    'active': ['Program', 'Status', 'Program Admin Email', 'Department/Division',
+               "Person's Program Director", "Person's Program Coordinator"],
+    'pd_list': [],
+    'directory': [],
+    'compliance_list': [],
+}
+
+# Other headers accepted for an exported column (the canonical *_COLS_NEW name always is)
+HEADER_ALIASES = {
+    'hours': {'Person': ['Name', 'Person Name'],
+              "Person's Primary E-Mail Address": ['Primary E-Mail Address', 'E-Mail Address'],
+              "Person's Coordinator Email": ['Coordinator Email', 'Coordinator E-Mail Address'],
+              'Start Date/Time': ['Start'], 'End Date/Time': ['End'],
+              "Person's National Provider Identifier": ['NPI', 'National Provider Identifier']},
+    'active': {"Person's Primary E-Mail Address": ['Primary E-Mail Address', 'E-Mail Address'],
+               "Person's Coordinator Email": ['Coordinator Email', 'Coordinator E-Mail Address'],
+               "Person's National Provider Identifier": ['NPI', 'National Provider Identifier']},
+    'pd_list': {},
+    'compliance_list': {},
+}
+
+# Exported columns a workbook must have; any other missing column is read as empty
+REQUIRED_HEADERS = {
+    'hours': ["Person's National Provider Identifier", 'Person', 'Program', 'Work Type', 'Start Date/Time',
+              'End Date/Time', 'Hours Worked', 'In Violation', 'Rules Violated', "Person's Coordinator Email",
+              "Person's Primary E-Mail Address"],
+    'active': ["Person's National Provider Identifier", 'Last Name', 'First Name', "Person's Primary E-Mail Address",
+               'Program', "Person's Coordinator Email"],
+    'pd_list': ['program', 'programdirector_first_name', 'programdirector_last_name', 'programdirectoremail',
+                'programcoordinator', 'programcoordinatoremail'],
+    'compliance_list': ['Trainee Email'],
+}
+
+# Value types checked on the sampled rows: 'datetime' (or a parseable string) and 'number'
+HEADER_TYPES = {
+    'hours': {'Start Date/Time': 'datetime', 'End Date/Time': 'datetime', 'Hours Worked': 'number'},
+    'active': {},
+    'pd_list': {},
+    'compliance_list': {},
+}
+SCHEMA_SAMPLE_ROWS = 20
+SCHEMA_KINDS = {'hours': 'hours', 'active': 'active', 'pd_list': 'pd_list', 'directory': 'pd_list',
+                'compliance_list': 'compliance_list'}
+
+
+# ---------- Schema ----------
+def _header_key(name):
+    # "Person's Primary E-Mail Address" and "persons primary email address" bind alike
+    return re.sub(r'[^0-9a-z]+', '', str(name).lower())
+
+
+def _schema(kind):
+    # [(exported header, canonical name, {accepted header keys})] in export order
+    kind = SCHEMA_KINDS[kind]
+    raw, new = {'hours': (HOURS_COLS_RAW, HOURS_COLS_NEW), 'active': (ACTIVE_COLS_RAW, ACTIVE_COLS_NEW),
+                'pd_list': (PD_LIST_COLS_RAW, PD_LIST_COLS_NEW),
+                'compliance_list': (COMPLIANCE_LIST_COLS, COMPLIANCE_LIST_COLS)}[kind]
+    return [(r, n, {_header_key(h) for h in [r, n] + HEADER_ALIASES[kind].get(r, [])})
+            for r, n in zip(raw, new)]
+
+
+def bind_header(kind, header, source=None):
+    """
+    {header: canonical name} for the headers of a `kind` workbook (or frame).
+    Unknown headers are left out. Raises ValueError naming every required
+    column that is missing and every column more than one header binds to.
+    """
+    source = source or kind
+    exact = {h: i for i, h in enumerate(header)}
+    keys = {}
+    for i, h in enumerate(header):
+        keys.setdefault(_header_key(h), []).append(i)
+
+    binding, missing, ambiguous = {}, [], []
+    required = REQUIRED_HEADERS[SCHEMA_KINDS[kind]]
+    for raw, new, accepted in _schema(kind):
+        if raw in exact or new in exact:
+            matches = [exact[raw] if raw in exact else exact[new]]
+        else:
+            matches = sorted({i for key in accepted for i in keys.get(key, [])})
+        if len(matches) > 1:
+            ambiguous.append(f"{raw!r} <- {[header[i] for i in matches]}")
+        elif matches:
+            binding[header[matches[0]]] = new
+        elif raw in required:
+            missing.append(raw)
+
+    if missing or ambiguous:
+        raise ValueError(f"{source}: unexpected {SCHEMA_KINDS[kind]} layout"
+                         + (f"; missing required column(s) {missing}" if missing else '')
+                         + (f"; ambiguous column(s) {ambiguous}" if ambiguous else '')
+                         + f"; headers found: {list(header)}")
+    unused = [h for h in header if h not in binding and h is not None]
+    if unused:
+        logging.info(f"{source}: ignoring unrecognized column(s) {unused}")
+    return binding
+
+
+def _type_errors(kind, header, rows, binding):
+    # "<column> row <n>: <value>" for sampled values that do not have their column's type
+    errors = []
+    types = HEADER_TYPES[SCHEMA_KINDS[kind]]
+    canonical = {raw: new for raw, new, _ in _schema(kind)}
+    for i, h in enumerate(header):
+        expected = next((t for raw, t in types.items() if binding.get(h) == canonical[raw]), None)
+        if expected is None:
+            continue
+        for n, row in enumerate(rows, start=2):
+            v = row[i] if i < len(row) else None
+            if v is None or v == '':
+                continue
+            if expected == 'datetime':
+                ok = isinstance(v, date) or (isinstance(v, str) and not pd.isna(pd.to_datetime(v, errors='coerce')))
+            else:
+                ok = (isinstance(v, (int, float)) and not isinstance(v, bool)) or (
+                    isinstance(v, str) and not pd.isna(pd.to_numeric(v, errors='coerce')))
+            if not ok:
+                errors.append(f"{h!r} row {n}: {v!r}")
+    return errors
+
+
+def check_workbook(path, kind, sample_rows=SCHEMA_SAMPLE_ROWS):
+    """
+    Binds the header row of the workbook at path (see bind_header) and checks
+    the value types of its first sample_rows rows, reading nothing else.
+    Returns the bound headers, in workbook order; raises ValueError on a mismatch.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = list(wb.worksheets[0].iter_rows(max_row=sample_rows + 1, values_only=True))
+    finally:
+        wb.close()
+    if not rows:
+        raise ValueError(f"{path}: empty workbook, expected a {SCHEMA_KINDS[kind]} export")
+    header = rows[0]
+    binding = bind_header(kind, header, path)
+    errors = _type_errors(kind, header, rows[1:], binding)
+    if errors:
+        raise ValueError(f"{path}: unexpected value type(s): {errors[:5]}")
+    return [h for h in header if h in binding]
+
+
+def read_workbook(path, kind):
+    # The workbook's bound columns only, checked (check_workbook) before the full parse starts
+    return pd.read_excel(path, usecols=check_workbook(path, kind))
+
+
+def bind_frame(df, kind):
+    # df with its columns bound by name and in canonical order; unbound optional columns are added empty
+    binding = bind_header(kind, list(df.columns))
+    df = df[list(binding)].rename(columns=binding)
+    return df.reindex(columns=[new for _, new, _ in _schema(kind)])
+
+
+# ---------- Normalization ----------
+def _lower_emails(df, col):
+    if col in df.columns:
+        df[col] = df[col].astype(str).str.lower().str.strip().replace({'nan': np.nan})
+
+
+def normalize_hours(hours):
+    hours = bind_frame(hours, 'hours')
+    # Split 'Person' into first/last names
+    names = hours['Person'].str.split(',', n=1, expand=True).reindex(columns=[0, 1])
+    hours[['Trainee Last Name', 'Trainee First Name']] = names.to_numpy()
+    hours['Trainee Last Name'] = hours['Trainee Last Name'].str.strip()
+    hours['Trainee First Name'] = hours['Trainee First Name'].str.strip()
+
+    _lower_emails(hours, 'Trainee Email')
+    _lower_emails(hours, 'Program Admin Email')
+
+    for c in HOURS_DATETIME_COLS:
+        if c in hours.columns:
+            hours[c] = pd.to_datetime(hours[c], errors='coerce')
+    return categorize(hours, 'hours')
+
+
+def normalize_active(active):
+    active = bind_frame(active, 'active')
+    _lower_emails(active, 'Trainee Email')
+    _lower_emails(active, 'Program Admin Email')
+
+    # Remove Chief Residents
+    if 'Status' in active.columns:
+        active = active[active['Status'] != 'Chief Resident']
+    return categorize(active, 'active')
+
+
+def normalize_pd_list(pd_list):
+    pd_list = bind_frame(pd_list, 'pd_list')
+    _lower_emails(pd_list, 'Program Admin Email')
+    return pd_list
+
+
+def normalize_compliance_list(compliance_list):
+    compliance_list = bind_frame(compliance_list, 'compliance_list')
+    _lower_emails(compliance_list, 'Trainee Email')
+    _lower_emails(compliance_list, 'Program Admin Email')
+    return compliance_list
+
+
+def categorize(df, kind):
+    cols = [c for c in CATEGORICAL_COLS[kind]
+            if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype)]
+    return df.astype({c: 'category' for c in cols}) if cols else df
+
+
+def decategorize(df):
+    # Categorical columns back to plain values, for outputs and anything that concatenates frames
+    cols = {c: df[c].cat.categories.dtype for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)}
+    return df.astype(cols) if cols else df
+
+
+NORMALIZERS = {
+    'hours': normalize_hours,
+    'active': normalize_active,
+    'pd_list': normalize_pd_list,
+    'directory': lambda pd_list: program_directory(normalize_pd_list(pd_list)),
+    'compliance_list': normalize_compliance_list,
+}
+
+
+# ---------- Streaming ----------
+def _hours_batch(records, header):
+    return _coerce_hours_batch(normalize_hours(pd.DataFrame.from_records(records, columns=header)))
+
+
+def _coerce_hours_batch(batch):
+    for c in batch.columns:
+        if c in HOURS_FLOAT_COLS:
+            batch[c] = pd.to_numeric(batch[c], errors='coerce').astype('float64')
+        elif c in HOURS_STREAM_DATETIME_COLS or c in HOURS_DATETIME_COLS:
+            batch[c] = pd.to_datetime(batch[c], errors='coerce')
+        else:
+            # read_excel treats empty cells as missing; openpyxl returns ''
+            batch[c] = batch[c].astype('str').replace('', np.nan)
+    return batch
+
+
+def _whole_cols(batch, cols):
+    # Of cols, those with every value present and a whole number: read_excel reads such a column as int64
+    return {c for c in cols if c in batch.columns and batch[c].notna().all() and (batch[c] % 1 == 0).all()}
+
+
+def _cast_parquet(src, dst, cols, pa, pq):
+    # src rewritten to dst batch by batch, cols as int64; memory stays at one row group
+    source = pq.ParquetFile(src)
+    schema = pa.schema([f.with_type(pa.int64()) if f.name in cols else f for f in source.schema_arrow],
+                       metadata=source.schema_arrow.metadata)
+    with pq.ParquetWriter(dst, schema) as writer:
+        for batch in source.iter_batches():
+            writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+
+
+def iter_hours_batches(path, batch_size=STREAM_BATCH_SIZE):
+    """
+    Yields normalized, typed hours frames of at most batch_size rows, read with
+    openpyxl in read-only mode so only one batch of cells is held at a time.
+    Only bound columns are kept, renamed exactly as in normalize_hours.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        binding = bind_header('hours', header, path)
+        keep = [i for i, h in enumerate(header) if h in binding]
+        header = [header[i] for i in keep]
+        buf = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            buf.append([row[i] if i < len(row) else None for i in keep])
+            if len(buf) >= batch_size:
+                yield _hours_batch(buf, header)
+                buf = []
+        if buf:
+            yield _hours_batch(buf, header)
+    finally:
+        wb.close()
+
+
+def _load_hours_streaming(path, cached, columns, filters, batch_size, keep=True):
+    # Filters/projects each batch as it arrives and, when cached is set, appends the
+    # full batch to the Parquet cache; peak memory is one batch plus the kept rows.
+    # Without keep, nothing is kept and None is returned once the cache is written.
+    # Batches are typed float64 for a fixed schema; a numeric column that turns out
+    # whole and complete is cast to int64 at the end, as the non-streaming path reads it.
+    if cached:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            # Parquet support (pyarrow) is optional; the rows are still loaded
+            logging.warning(f"Could not write ingest cache for {path}: {e}")
+            cached = None
+    keep = keep or not cached
+
+    writer = None
+    tmp_path = cached + '.tmp' if cached else None
+    kept = []
+    whole = set(HOURS_FLOAT_COLS)
+    try:
+        for batch in iter_hours_batches(path, batch_size):
+            whole = _whole_cols(batch, whole)
+            if cached:
+                table = pa.Table.from_pandas(batch, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+            if keep:
+                kept.append(project(apply_filters(batch, filters), columns))
+        if writer is not None:
+            writer.close()
+            writer = None
+            if whole:
+                _cast_parquet(tmp_path, tmp_path + '.cast', whole, pa, pq)
+                os.replace(tmp_path + '.cast', tmp_path)
+            os.replace(tmp_path, cached)
+            logging.info(f"Cached normalized hours to {cached}")
+    finally:
+        if writer is not None:
+            writer.close()
+        for leftover in ([tmp_path, tmp_path + '.cast'] if tmp_path else []):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    if not keep:
+        return None
+    if not kept:
+        return project(pd.DataFrame(columns=HOURS_COLS_NEW), columns)
+    hours = pd.concat(kept, ignore_index=True)
+    return categorize(hours.astype({c: 'int64' for c in whole if c in hours.columns}), 'hours')
+
+
+# ---------- Filters ----------
+# Row filters use the pyarrow DNF form: a list of AND-ed [(column, op, value), ...]
+# lists that are OR-ed together. They are pushed into the Parquet scan on a cache
+# hit and applied in memory otherwise.
+_FILTER_OPS = {
+    '==': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    'in': lambda s, v: s.isin(v),
+    'not in': lambda s, v: ~s.isin(v) & s.notna(),
+}
+
+
+def apply_filters(df, filters):
+    if not filters:
+        return df
+    keep = np.zeros(len(df), dtype=bool)
+    for conjunction in filters:
+        mask = np.ones(len(df), dtype=bool)
+        for col, op, value in conjunction:
+            mask &= _FILTER_OPS[op](df[col], value).fillna(False).to_numpy(dtype=bool)
+        keep |= mask
+    return df.loc[keep].reset_index(drop=True)
+
+
+def project(df, columns):
+    if columns is None:
+        return df
+    return df[[c for c in columns if c in df.columns]]
+
+
+def hours_filters(window_start=None, window_end=None, programs=None, active=None):
+    """
+    DNF filters for hours rows with window_start <= Actual Start < window_end.
+    With programs, keeps rows of trainees on the roster (active) in those programs,
+    plus rows of trainees missing from the roster whose Program is one of them.
+    """
+    window = []
+    if window_start is not None:
+        window.append(('Actual Start', '>=', pd.Timestamp(window_start)))
+    if window_end is not None:
+        window.append(('Actual Start', '<', pd.Timestamp(window_end)))
+    if programs is None:
+        return [window] if window else None
+
+    programs = list(programs)
+    if active is None:
+        return [window + [('Program', 'in', programs)]]
+
+    in_programs = active['Program'].isin(programs)
+    roster_in = sorted(set(active.loc[in_programs, 'Trainee Email'].dropna()))
+    roster_out = sorted(set(active.loc[~in_programs, 'Trainee Email'].dropna()))
+
+    # Empty value lists are dropped: pyarrow cannot type them
+    filters = []
+    if roster_in:
+        filters.append(window + [('Trainee Email', 'in', roster_in)])
+    off_roster = window + [('Program', 'in', programs)]
+    if roster_out:
+        off_roster.append(('Trainee Email', 'not in', roster_out))
+    filters.append(off_roster)
+    return filters
+
+
+def active_filters(programs=None):
+    if programs is None:
+        return None
+    return [[('Program', 'in', list(programs))]]
+
+
+# ---------- Content-hash cache ----------
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_file_path(cache_dir, kind, digest):
+    return os.path.join(cache_dir, f"{kind}_v{INGEST_CACHE_VERSION}_{digest}.parquet")
+
+
+def _prune_cache(cache_dir, kind, keep=CACHE_KEEP_PER_KIND):
+    entries = sorted(glob.glob(os.path.join(cache_dir, f"{kind}_v*.parquet")),
+                     key=os.path.getmtime, reverse=True)
+    for stale in entries[keep:]:
+        try:
+            os.remove(stale)
+        except OSError as e:
+            logging.warning(f"Could not remove stale cache file {stale}: {e}")
+
+
+def _write_cache(df, cached, cache_dir, kind):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cached + '.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, cached)
+    _prune_cache(cache_dir, kind)
+    logging.info(f"Cached normalized {kind} to {cached}")
+
+
+def store_normalized(path, kind, df, cache_dir):
+    """
+    Caches df, the frame the workbook at path was just written from, as that
+    workbook's normalized frame, so reading it back never parses it.
+    Failures are logged, never raised.
+    """
+    try:
+        _write_cache(NORMALIZERS[kind](df), cache_file_path(cache_dir, kind, file_digest(path)), cache_dir, kind)
+    except Exception as e:
+        logging.warning(f"Could not write ingest cache for {path}: {e}")
+
+
+def load_normalized(path, kind, cache_dir=None, columns=None, filters=None, batch_size=None, digest=None):
+    """
+    Returns the normalized frame for an input workbook.
+    kind is one of 'hours', 'active', 'pd_list', 'directory', 'compliance_list'.
+    With cache_dir set, a Parquet copy keyed by the workbook's content hash
+    is read when present and written after a fresh parse otherwise.
+    columns projects the result and filters (DNF, see hours_filters) drops rows;
+    on a cache hit both are applied inside the Parquet scan.
+    batch_size (hours only) parses the workbook in streaming batches of that many
+    rows instead of loading it whole; see iter_hours_batches. digest is the
+    workbook's content hash, when the caller already has it.
+    """
+    normalize = NORMALIZERS[kind]
+    stream = batch_size is not None and kind == 'hours'
+    if cache_dir is None:
+        if stream:
+            check_workbook(path, kind)
+            return _load_hours_streaming(path, None, columns, filters, batch_size)
+        return project(apply_filters(normalize(read_workbook(path, kind)), filters), columns)
+
+    cached = cache_file_path(cache_dir, kind, digest or file_digest(path))
+    if os.path.exists(cached):
+        try:
+            df = pd.read_parquet(cached, columns=columns, filters=filters)
+            logging.info(f"Loaded {kind} from ingest cache {cached}")
+            # Streamed caches are written with plain string columns
+            return categorize(df, kind)
+        except Exception as e:
+            logging.warning(f"Ingest cache unreadable, re-parsing {path}: {e}")
+
+    if stream:
+        check_workbook(path, kind)
+        os.makedirs(cache_dir, exist_ok=True)
+        df = _load_hours_streaming(path, cached, columns, filters, batch_size)
+        _prune_cache(cache_dir, kind)
+        return df
+
+    df = normalize(read_workbook(path, kind))
+    try:
+        _write_cache(df, cached, cache_dir, kind)
+    except Exception as e:
+        # Parquet support (pyarrow) is optional; the parsed frame is still usable
+        logging.warning(f"Could not write ingest cache for {path}: {e}")
+    return project(apply_filters(df, filters), columns)
+
+
+# ---------- Concurrent loading ----------
+def _parse_hours(path, digest, cache_dir, columns, filters, batch_size):
+    """
+    Worker process: parses hours into the ingest cache and returns None once it
+    is cached; otherwise (no cache_dir, or the cache could not be written) the
+    rows passing filters, projected to columns. A streamed parse that is cached
+    keeps no rows, so it holds one batch at a time.
+    """
+    if cache_dir is None:
+        return load_normalized(path, 'hours', None, columns, filters, batch_size)
+    cached = cache_file_path(cache_dir, 'hours', digest)
+    if batch_size is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        df = _load_hours_streaming(path, cached, columns, filters, batch_size, keep=False)
+        _prune_cache(cache_dir, 'hours')
+    else:
+        df = load_normalized(path, 'hours', cache_dir, columns, filters, digest=digest)
+    return None if os.path.exists(cached) else df
+
+
+@contextmanager
+def concurrent_inputs(active_path, hours_path, pd_list_path, cache_dir=None, window_start=None,
+                      window_end=None, programs=None, hours_columns=None, batch_size=None):
+    """
+    Yields futures of the normalized (active, hours) frames and the program
+    directory of the PD list (active, hours, directory), as read
+    by load_normalized with active_filters(programs) and hours_filters(window_start,
+    window_end, programs, roster). An uncached hours.xlsx is parsed in a worker
+    process while the roster and directory load in threads, so the critical path is
+    about the hours parse alone; the hours rows are then filtered against the
+    roster (a Parquet scan when the parse could be cached). Rows that do come
+    back from the worker are already limited to the window.
+    """
+    hours_digest = file_digest(hours_path) if cache_dir is not None else None
+    hours_cached = cache_dir is not None and os.path.exists(cache_file_path(cache_dir, 'hours', hours_digest))
+    # A workbook with an unexpected layout fails here, in milliseconds, before any parse starts
+    if not hours_cached:
+        check_workbook(hours_path, 'hours')
+    for path, kind in [(active_path, 'active'), (pd_list_path, 'directory')]:
+        if cache_dir is None or not os.path.exists(cache_file_path(cache_dir, kind, file_digest(path))):
+            check_workbook(path, kind)
+    # The process pool is started before any thread so its fork copies a single-threaded parent
+    processes = None if hours_cached else ProcessPoolExecutor(max_workers=1)
+    threads = ThreadPoolExecutor(max_workers=4)
+    try:
+        # The roster filters are not known yet: the worker applies the window and keeps the columns they need
+        parse_columns = None if hours_columns is None else list(dict.fromkeys(
+            list(hours_columns) + ['Trainee Email', 'Program']))
+        parsed = None if hours_cached else processes.submit(
+            _parse_hours, hours_path, hours_digest, cache_dir, parse_columns,
+            hours_filters(window_start, window_end), batch_size)
+        roster = threads.submit(load_normalized, active_path, 'active', cache_dir)
+        active = threads.submit(lambda: apply_filters(roster.result(), active_filters(programs)))
+        directory = threads.submit(load_normalized, pd_list_path, 'directory', cache_dir)
+
+        def load_hours():
+            filters = hours_filters(window_start, window_end, programs, roster.result())
+            frame = parsed.result() if parsed is not None else None
+            if frame is not None:
+                return project(apply_filters(frame, filters), hours_columns)
+            return load_normalized(hours_path, 'hours', cache_dir, columns=hours_columns, filters=filters,
+                                   batch_size=batch_size, digest=hours_digest)
+
+        yield active, threads.submit(load_hours), directory
+    finally:
+        threads.shutdown(wait=True, cancel_futures=True)
+        if processes is not None:
+            processes.shutdown(wait=True, cancel_futures=True)
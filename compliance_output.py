@@ -0,0 +1,67 @@
+# compliance_output.py
+"""
+Single-pass workbook writer for the compliance lists.
+
+Rows are streamed into a write-only openpyxl workbook and each sheet's styled
+table is declared before the one and only save, so the file is never re-opened.
+"""
+import logging
+import warnings
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.filters import AutoFilter
+from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+
+TABLE_STYLE = "TableStyleMedium9"
+
+
+def table_ref(n_rows, n_cols):
+    # Header plus data rows; an empty frame still gets one (blank) data row, as Excel expects
+    return f"A1:{get_column_letter(max(n_cols, 1))}{max(n_rows, 1) + 1}"
+
+
+def _styled_table(display_name, header, n_rows):
+    ref = table_ref(n_rows, len(header))
+    tab = Table(displayName=display_name, ref=ref)
+    tab.tableStyleInfo = TableStyleInfo(name=TABLE_STYLE, showRowStripes=True)
+    # Write-only sheets cannot infer the columns from the cells
+    tab.tableColumns = [TableColumn(id=i, name=name) for i, name in enumerate(header, start=1)]
+    tab.autoFilter = AutoFilter(ref=ref)
+    return tab
+
+
+def _rows(df):
+    # NaN/NaT -> empty cell, numpy scalars -> Python values
+    values = df.astype(object).where(df.notna(), None)
+    for row in values.itertuples(index=False, name=None):
+        yield [v.item() if hasattr(v, 'item') else v for v in row]
+
+
+def write_workbook(out_path, sheets):
+    """
+    Writes sheets, a list of (sheet_name, DataFrame), to out_path in one pass.
+    Sheet i gets a styled table named Table<i>, for any number of columns.
+    """
+    wb = Workbook(write_only=True)
+    for i, (sheet_name, df) in enumerate(sheets, start=1):
+        ws = wb.create_sheet(sheet_name)
+        header = [str(c) for c in df.columns] or ['Column1']
+        ws.append(header)
+        for row in _rows(df):
+            ws.append(row)
+        with warnings.catch_warnings():
+            # The columns are set in _styled_table; openpyxl warns regardless in write-only mode
+            warnings.filterwarnings('ignore', message='In write-only mode')
+            ws.add_table(_styled_table(f"Table{i}", header, len(df)))
+    wb.save(out_path)
+    logging.info(f"Saved output to {out_path}")
+    return out_path
+
+
+def summary_frame(consolidated_df):
+    # QC summary: one cell listing "<Program> → <n> trainees" per program
+    qc_df = consolidated_df.groupby('Program').size().reset_index(name='Count')
+    qc_df['SummaryLine'] = qc_df['Program'] + ' → ' + qc_df['Count'].astype(str) + ' trainees'
+    full_summary = '\n'.join(qc_df['SummaryLine'].astype(str))
+    return pd.DataFrame({'FullSummary': [full_summary]})
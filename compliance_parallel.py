@@ -0,0 +1,146 @@
+# compliance_parallel.py
+"""
+Program-sharded execution of the weekly/monthly compliance computations.
+
+Findings are independent per trainee, and every trainee belongs to one program,
+so the roster and hours rows can be split into program shards, processed in a
+ProcessPoolExecutor and concatenated back into the serial result. A trainee's
+rows always stay together: each trainee is assigned the roster's program (or,
+off-roster, the program on their first hours row), even if some rows carry another.
+
+Where the 'fork' start method is available the workers inherit the full frames
+from the parent (copy-on-write, nothing pickled) and receive only a shard
+number; elsewhere each worker is sent just its own shard's rows. map_tasks()
+runs independent jobs (e.g. backfilled months) over the same pool machinery.
+"""
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from compliance_engine import trainee_ids
+from compliance_telemetry import stage
+
+SHARDS_PER_WORKER = 4
+
+# Inputs shared with forked workers; set only while a pool is running
+_shared = {}
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def program_shards(active, hours, n_shards):
+    """
+    Returns (active_shard, hours_shard): the shard number of every roster and
+    hours row. Programs are spread over n_shards by hours volume (largest first,
+    each to the lightest shard) so the shards take about the same time.
+    """
+    emails, (active_ids, hours_ids) = trainee_ids(active, hours)
+
+    # Program per trainee id: the roster's, else the first hours row's
+    program_of = pd.concat([
+        pd.Series(active['Program'].to_numpy(dtype=object)[active_ids >= 0], index=active_ids[active_ids >= 0]),
+        pd.Series(hours['Program'].to_numpy(dtype=object)[hours_ids >= 0], index=hours_ids[hours_ids >= 0]),
+    ])
+    program_of = program_of[~program_of.index.duplicated()].reindex(np.arange(len(emails)))
+
+    def row_programs(frame, ids):
+        own = frame['Program'].to_numpy(dtype=object)
+        return np.where(ids >= 0, program_of.to_numpy()[np.maximum(ids, 0)], own) if len(emails) else own
+
+    active_programs = pd.Series(row_programs(active, active_ids)).fillna('')
+    hours_programs = pd.Series(row_programs(hours, hours_ids)).fillna('')
+
+    # Longest-processing-time-first assignment of programs to shards
+    load = hours_programs.value_counts().add(active_programs.value_counts(), fill_value=0)
+    bins = np.zeros(max(1, min(n_shards, len(load))))
+    shard_of = {}
+    for program, rows in load.sort_values(ascending=False, kind='stable').items():
+        k = int(bins.argmin())
+        shard_of[program] = k
+        bins[k] += rows
+    return active_programs.map(shard_of).to_numpy(dtype=int), hours_programs.map(shard_of).to_numpy(dtype=int)
+
+
+def _run_shared_shard(fn, k, args):
+    # Forked worker: slice this shard out of the inherited frames
+    active, hours = _shared['active'], _shared['hours']
+    return fn(active.loc[_shared['active_shard'] == k], hours.loc[_shared['hours_shard'] == k], *args)
+
+
+def _run_shard(fn, active, hours, args):
+    return fn(active, hours, *args)
+
+
+def map_program_shards(fn, active, hours, *args, workers=None, sort_col='Trainee Email'):
+    """
+    Runs fn(active, hours, *args) per program shard in a process pool and
+    concatenates the results, sorted by sort_col like the serial output. Only
+    active and hours are split; args go to every shard whole. fn must be a
+    module-level function (process_month, process_week). workers defaults to
+    default_workers(); with one worker, or nothing to split, fn runs in-process.
+    """
+    workers = workers or default_workers()
+    if workers <= 1 or len(hours) == 0:
+        return fn(active, hours, *args)
+
+    with stage(f"{fn.__name__}_sharded", rows_in=len(hours)) as record:
+        active_shard, hours_shard = program_shards(active, hours, workers * SHARDS_PER_WORKER)
+        shards = sorted(set(active_shard) | set(hours_shard))
+        workers = min(workers, len(shards))
+        record['shards'], record['workers'] = len(shards), workers
+        logging.info(f"Running {fn.__name__} over {len(shards)} program shards with {workers} workers")
+
+        fork = 'fork' in multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if fork else None)
+        if fork:
+            _shared.update(active=active, hours=hours, active_shard=active_shard, hours_shard=hours_shard)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                if fork:
+                    futures = [pool.submit(_run_shared_shard, fn, k, args) for k in shards]
+                else:
+                    futures = [pool.submit(_run_shard, fn, active.loc[active_shard == k],
+                                           hours.loc[hours_shard == k], args) for k in shards]
+                parts = [f.result() for f in futures]
+        finally:
+            _shared.clear()
+
+        parts = [p for p in parts if len(p)] or parts[:1]
+        result = pd.concat(parts, ignore_index=True).sort_values(sort_col, kind='stable', ignore_index=True)
+        record['rows_out'] = len(result)
+    return result
+
+
+def _run_shared_task(fn, i):
+    return fn(*_shared['tasks'][i])
+
+
+def map_tasks(fn, tasks, workers=None):
+    """
+    Runs fn(*task) for every argument tuple in tasks in a process pool and returns
+    the results in task order. Tasks may share frames: forked workers inherit them,
+    elsewhere each task's arguments are pickled. With one worker (or one task) the
+    tasks run in-process, one after another.
+    """
+    workers = min(workers or default_workers(), len(tasks))
+    if workers <= 1:
+        return [fn(*task) for task in tasks]
+
+    logging.info(f"Running {len(tasks)} {fn.__name__} tasks with {workers} workers")
+    fork = 'fork' in multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if fork else None)
+    if fork:
+        _shared.update(tasks=tasks)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            if fork:
+                futures = [pool.submit(_run_shared_task, fn, i) for i in range(len(tasks))]
+            else:
+                futures = [pool.submit(fn, *task) for task in tasks]
+            return [f.result() for f in futures]
+    finally:
+        _shared.clear()
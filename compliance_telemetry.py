@@ -0,0 +1,196 @@
+# compliance_telemetry.py
+"""
+Per-stage run telemetry for the compliance generators.
+
+run_report() opens a report for one run; inside it, stage() (a context manager)
+and instrument() (a decorator) record each stage's wall and CPU seconds, the
+process's peak resident memory so far, input/output row counts and, with
+trace_memory, the stage's own tracemalloc peak. write_report() saves the report
+as JSON, normally next to the output workbook. With profile_stage set, that one
+stage also runs under cProfile and its stats are dumped beside the report
+(inspect with `python -m pstats <file>`).
+
+Stages may nest. Outside a run_report() a stage still logs its timings; it is
+just not recorded anywhere. Only the standard library is imported here.
+"""
+import os
+import json
+import time
+import logging
+import cProfile
+import platform
+import inspect
+import functools
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Open run reports and stage records, innermost last; each holds its running memory peak
+_open = []
+
+
+def _rows(obj):
+    # Row count of a frame, or of the largest frame in a tuple/list of results or arguments
+    if hasattr(obj, 'columns') and hasattr(obj, '__len__'):
+        return len(obj)
+    if isinstance(obj, (tuple, list)):
+        counts = [n for n in map(_rows, obj) if n is not None]
+        return max(counts) if counts else None
+    return None
+
+
+def _max_rss_mb():
+    # Process high-water mark; ru_maxrss is KiB on Linux, bytes on macOS
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2**20 if platform.system() == 'Darwin' else 2**10), 1)
+
+
+def _enter(entry):
+    # Fold the tracemalloc peak so far into the enclosing entry, then restart it for this one
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        if _open:
+            _open[-1]['_peak'] = max(_open[-1]['_peak'], peak)
+        tracemalloc.reset_peak()
+        entry['_start_mem'], entry['_peak'] = current, current
+    _open.append(entry)
+
+
+def _exit(entry):
+    _open.remove(entry)
+    start_mem, peak = entry.pop('_start_mem', None), entry.pop('_peak', None)
+    if start_mem is not None and tracemalloc.is_tracing():
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if _open:
+            _open[-1]['_peak'] = max(_open[-1]['_peak'], peak)
+        entry['peak_mb'] = round((peak - start_mem) / 2**20, 2)
+
+
+@contextmanager
+def run_report(job, trace_memory=False, profile_stage=None, **info):
+    """
+    Collects the stages run inside the block into a report dict (yielded).
+    trace_memory starts tracemalloc for per-stage peaks; it slows Python-heavy
+    stages several-fold (the workbook parse most of all). info is stored as-is.
+    """
+    report = {'job': job, 'started': datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(), 'pid': os.getpid(),
+              'trace_memory': trace_memory, 'profile_stage': profile_stage,
+              'info': info, 'stages': []}
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    t0, c0 = time.perf_counter(), time.process_time()
+    _enter(report)
+    try:
+        yield report
+    except Exception as e:
+        report['error'] = repr(e)
+        raise
+    finally:
+        report['wall_seconds'] = round(time.perf_counter() - t0, 4)
+        report['cpu_seconds'] = round(time.process_time() - c0, 4)
+        report['max_rss_mb'] = _max_rss_mb()
+        _exit(report)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def _current_report():
+    for entry in reversed(_open):
+        if 'stages' in entry:
+            return entry
+    return None
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    Times the block as stage `name` and yields its record; set record['rows_out']
+    (and anything else worth keeping) inside the block.
+    """
+    report = _current_report()
+    record = {'stage': name, 'rows_in': rows_in, 'rows_out': None}
+    if report is not None:
+        report['stages'].append(record)
+    profiler = cProfile.Profile() if report is not None and report['profile_stage'] == name else None
+
+    _enter(record)
+    t0, c0 = time.perf_counter(), time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = repr(e)
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            report['_profile'] = profiler
+        record['wall_seconds'] = round(time.perf_counter() - t0, 4)
+        record['cpu_seconds'] = round(time.process_time() - c0, 4)
+        record['max_rss_mb'] = _max_rss_mb()
+        _exit(record)
+        logging.info(f"Stage {name}: {record['wall_seconds']:.2f}s wall, {record['cpu_seconds']:.2f}s CPU"
+                     + (f", peak {record['peak_mb']} MB" if 'peak_mb' in record else '')
+                     + (f", rows {record['rows_in']} -> {record['rows_out']}"
+                        if record['rows_in'] is not None or record['rows_out'] is not None else ''))
+
+
+def instrument(name=None, rows_arg=None, outputs=None):
+    """
+    Decorator form of stage(): rows_in is the row count of the argument named
+    rows_arg, by default of the first DataFrame argument; rows_out that of the
+    return value (the largest DataFrame it holds). outputs names the frames of a
+    tuple return value, e.g. ('active', 'hours', 'directory'); rows_out then
+    counts each, {name: rows}.
+    """
+    def decorate(fn):
+        signature = inspect.signature(fn)
+
+        def rows_in(args, kwargs):
+            if rows_arg is not None:
+                return _rows(signature.bind_partial(*args, **kwargs).arguments.get(rows_arg))
+            return next((n for n in map(_rows, list(args) + list(kwargs.values())) if n is not None), None)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name or fn.__name__, rows_in=rows_in(args, kwargs)) as record:
+                out = fn(*args, **kwargs)
+                record['rows_out'] = (_rows(out) if outputs is None
+                                      else {key: _rows(frame) for key, frame in zip(outputs, out)})
+            return out
+        return wrapper
+    return decorate
+
+
+def report_path_for(output_path):
+    # weekly_compliance_email_list.xlsx -> weekly_compliance_email_list.run.json
+    return os.path.splitext(output_path)[0] + '.run.json'
+
+
+def write_report(report, path):
+    """
+    Writes report as JSON to path, and the profiled stage's stats (if any) to
+    <path without .json>.<stage>.prof. Failures are logged, never raised.
+    """
+    try:
+        profiler = report.pop('_profile', None)
+        if profiler is not None:
+            prof_path = f"{os.path.splitext(path)[0]}.{report['profile_stage']}.prof"
+            profiler.dump_stats(prof_path)
+            report['profile_path'] = prof_path
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        logging.info(f"Saved run report to {path}")
+    except Exception as e:
+        logging.warning(f"Could not write run report {path}: {e}")
+    return path
@@ -0,0 +1,126 @@
+# compliance_watch.py
+"""
+Watch-folder mode for the weekly compliance list.
+
+Polls the working folder and rebuilds weekly_compliance_email_list.xlsx shortly
+after a new export lands. Polling is a few stat() calls, so there is no inotify
+dependency. The parsed roster, program directory and hours export stay in memory
+between builds and are re-read only when their file changes. A build therefore
+costs the parse of the new export plus the weekly computation, with pandas
+already imported. Inputs are left in place; archiving stays with the scheduled
+weekly run.
+
+    python compliance_watch.py [--folder DIR] [--interval SECONDS] [--settle SECONDS]
+        [--workers N] [--once]
+"""
+import os
+import time
+import logging
+import argparse
+import work_hours_compliance_generator as weekly
+from compliance_ingest import HOURS_RULE_COLS, load_normalized, apply_filters, hours_filters, active_filters
+
+POLL_SECONDS = 2.0
+SETTLE_SECONDS = 1.0  # a workbook must be this old before it is read; the export may still be writing it
+
+
+def file_signature(path):
+    # (mtime, size) of path, or None if it does not exist
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def warm_frame(state, path, kind, cache_dir, columns=None):
+    """
+    Normalized frame of path, kept in state and re-read (through the ingest
+    cache) only when the file's signature changes.
+    """
+    signature = file_signature(path)
+    if kind in state and state[kind][0] == signature:
+        return state[kind][1]
+    frame = load_normalized(path, kind, cache_dir, columns=columns)
+    state[kind] = (signature, frame)
+    return frame
+
+
+def refresh(folder_path, state, reference_date=None, workers=1, settle=SETTLE_SECONDS):
+    """
+    One poll: rebuilds the weekly list if an input changed, or a new week began,
+    since the last build (always on the first call) and returns the output path;
+    otherwise returns None. A failed build is retried only after the next change.
+    """
+    paths = {'active': os.path.join(folder_path, weekly.ACTIVE_FILE_NAME),
+             'hours': os.path.join(folder_path, weekly.HOURS_FILE_NAME),
+             'pd_list': os.path.join(folder_path, weekly.PD_LIST_FILE_NAME)}
+    signatures = {kind: file_signature(path) for kind, path in paths.items()}
+    if None in signatures.values():
+        return None
+    if time.time() - max(mtime for mtime, _ in signatures.values()) / 1e9 < settle:
+        return None
+    build_key = (signatures, weekly.last_week_range(reference_date)[0])
+    if state.get('built_from') == build_key:
+        return None
+    state['built_from'] = build_key
+
+    t0 = time.perf_counter()
+    cache_dir = os.path.join(folder_path, weekly.old_file_folder, 'ingest_cache')
+    roster = warm_frame(state, paths['active'], 'active', cache_dir)
+    directory = warm_frame(state, paths['pd_list'], 'directory', cache_dir)
+    hours = warm_frame(state, paths['hours'], 'hours', cache_dir, columns=HOURS_RULE_COLS)
+
+    def loader(window_start, window_end, programs):
+        # Same rows read_inputs would load, filtered from the warm frames
+        return (apply_filters(roster, active_filters(programs)),
+                apply_filters(hours, hours_filters(window_start, window_end, programs, roster)),
+                directory)
+
+    out_path, _ = weekly.run(folder_path, reference_date=reference_date, archive=False,
+                             workers=workers, loader=loader)
+    logging.info(f"Rebuilt {out_path} {time.perf_counter() - t0:.1f}s after detecting the change")
+    return out_path
+
+
+def watch(folder_path, interval=POLL_SECONDS, settle=SETTLE_SECONDS, workers=1, once=False):
+    """
+    Polls folder_path every interval seconds until interrupted (or, with once,
+    returns after the first poll). Build failures are logged, not raised.
+    """
+    state = {}
+    logging.info(f"Watching {folder_path} every {interval}s")
+    while True:
+        try:
+            refresh(folder_path, state, workers=workers, settle=settle)
+        except Exception as e:
+            logging.warning(f"Weekly rebuild failed; waiting for the next change: {e}")
+        if once:
+            return state
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            logging.info("Stopped watching")
+            return state
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the weekly compliance list whenever new exports land.")
+    parser.add_argument('--folder', help=f"Folder to watch (default: ${weekly.FOLDER_ENV_VAR}).")
+    parser.add_argument('--interval', type=float, default=POLL_SECONDS, help="Seconds between polls.")
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS,
+                        help="Seconds a workbook must stay unmodified before it is read.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Process program shards in this many worker processes (0: one per spare CPU).")
+    parser.add_argument('--once', action='store_true', help="Poll once and exit.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    watch(args.folder or os.environ[weekly.FOLDER_ENV_VAR], interval=args.interval, settle=args.settle,
+          workers=args.workers, once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,89 +1,95 @@
 # optimized_monthly_compliance.py
 import os
-import shutil
 import logging
+import argparse
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
-import gc
-from openpyxl import load_workbook
-from openpyxl.worksheet.table import Table, TableStyleInfo
+from compliance_ingest import (HOURS_RULE_COLS, concurrent_inputs, load_normalized, normalize_hours, normalize_active,
+                               normalize_pd_list, decategorize, apply_filters, active_filters, hours_filters)
+from compliance_directory import program_directory, enrich
+from compliance_engine import (IDENTITY_COLS, trainee_ids, week_index, missing_week_pairs,
+                               partial_coverage, violation_messages, join_sorted_unique_by,
+                               trainee_identity)
+from compliance_output import write_workbook, summary_frame
+from compliance_telemetry import run_report, stage, instrument, write_report, report_path_for
+from compliance_parallel import map_program_shards, map_tasks
+from compliance_incremental import STORE_HOURS_COLS, update_cells
+from compliance_findings import week_findings, aggregate_weeks, load_findings, covers
+from compliance_checkpoint import open_run, resume, finish_run
+from compliance_archive import (ARCHIVE_DIR_NAME, archive_input, archive_workbooks, import_legacy, snapshots,
+                                load_snapshot)
 
 # ---------- CONFIG ----------
-folder_path = os.environ["FOLDER_PATH_gme_compliance"]
+FOLDER_ENV_VAR = "FOLDER_PATH_gme_compliance"  # default working folder of main()
 old_file_folder = 'past_lists'
-old_file_folder_path = os.path.join(folder_path, old_file_folder)
 
 PILOT_ONLY = True
 PILOTS = ['NEUROSURG-Neurological Surgery-ACGME', 'Imaging-Diagnostic Radiology-ACGME']
 OUTPUT_PREFIX = "monthly_compliance_email_list"
-
-HOURS_COLS_NEW = ["Person's National Provider Identifier", 'Person', 'Status', 'Program',
-       'Work Type', 'Actual Start', 'Actual End', 'Actual Hours Worked',
-       'Rotation', 'Rotation Start Date', 'Rotation End Date', 'Source',
-       'Resident Approved', 'Administrator Approved', 'Institution/Location',
-       'In Violation', 'Violation(s)', 'Rules Violated', 'Comment', 'Comment By',
-       'Last Update', "Date Logged", "Program Admin Email",
-       "Trainee Email", "Person's Program Coordinator",
-       "Person's Program Director", 'Trainee Last Name', 'Trainee First Name']
-
-ACTIVE_COLS_NEW = ['ID Number', 'Trainee Last Name', 'Trainee First Name', 'Middle Name',
-       "Person's National Provider Identifier",
-       "Trainee Email", 'Department/Division', 'Program',
-       "Person's Program Director", 'Status', "Person's Program Start Date",
-       "Person's Program End Date", "Program Admin Email",
-       "Person's Program Coordinator"]
-
-PD_LIST_COLS_NEW = ['Program', 'programtype', 'department', 'Program Director First Name',
-       'Program Director Last Name', 'programdirector', 'Program Director Email',
-       'programcoordinator', 'Program Admin Email']
+USE_INGEST_CACHE = True
+HOURS_BATCH_SIZE = None  # e.g. 50_000 to stream hours.xlsx in bounded-memory batches
+TRACE_MEMORY = False     # per-stage tracemalloc peaks in the run report (slows the workbook parse)
+PROFILE_STAGE = None     # e.g. 'process_month' to dump its cProfile stats next to the run report
+WORKERS = 1              # >1 (or None: one per spare CPU) runs process_month per program shard in a process pool
+INCREMENTAL = False      # keep per-(trainee, week) findings in result_store and recompute only changed cells
+FROM_FINDINGS = False    # aggregate the month from the weekly runs' findings store when it covers every week
+CHECKPOINTS = True       # persist each stage's output so a failed run resumes from its last completed stage
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 
 # ---------- Utilities ----------
-def ensure_dirs():
-    os.makedirs(old_file_folder_path, exist_ok=True)
-    os.makedirs(os.path.join(old_file_folder_path, 'old_active_list'), exist_ok=True)
-    os.makedirs(os.path.join(old_file_folder_path, 'old_hours_list'), exist_ok=True)
-    os.makedirs(os.path.join(folder_path, 'past_lists', 'old_compliance_list'), exist_ok=True)
-
-def read_inputs():
-    active = pd.read_excel(os.path.join(folder_path, 'active.xlsx'))
-    hours = pd.read_excel(os.path.join(folder_path, 'hours.xlsx'))
-    pd_list = pd.read_excel(os.path.join(folder_path, 'PD_and_PA_report_list.xlsx'))
-    return active, hours, pd_list
-
+def site_paths(folder_path):
+    # Working paths under a site folder's past_lists (shared with the weekly runs)
+    old_file_folder_path = os.path.join(folder_path, old_file_folder)
+    return {
+        'old_file_folder': old_file_folder_path,
+        'ingest_cache': os.path.join(old_file_folder_path, 'ingest_cache'),
+        'result_store': os.path.join(old_file_folder_path, 'result_store'),
+        'findings_db': os.path.join(old_file_folder_path, 'findings.sqlite'),  # written by the weekly runs
+        'archive': os.path.join(old_file_folder_path, ARCHIVE_DIR_NAME),
+        'checkpoints': os.path.join(old_file_folder_path, 'checkpoints'),
+    }
+
+def ingest_cache_dir(folder_path):
+    return site_paths(folder_path)['ingest_cache'] if USE_INGEST_CACHE else None
+
+def ensure_dirs(folder_path):
+    paths = site_paths(folder_path)
+    for name in ('old_file_folder', 'archive', 'ingest_cache', 'result_store'):
+        os.makedirs(paths[name], exist_ok=True)
+    os.makedirs(os.path.join(paths['old_file_folder'], 'old_compliance_list'), exist_ok=True)
+
+@instrument(outputs=('active', 'hours', 'directory'))
+def read_inputs(folder_path, window_start=None, window_end=None, programs=None, hours_columns=None,
+                active_path=None, hours_path=None):
+    """
+    Returns the normalized (active, hours) frames and the program directory.
+    Served from the ingest cache when the workbook content has been seen before.
+    Hours rows outside [window_start, window_end) or outside programs, and hours
+    columns not in hours_columns, are dropped while loading.
+    active_path/hours_path default to the workbooks in folder_path.
+    """
+    cache_dir = ingest_cache_dir(folder_path)
+    # The three workbooks load concurrently; hours.xlsx dominates
+    with concurrent_inputs(active_path or os.path.join(folder_path, 'active.xlsx'),
+                           hours_path or os.path.join(folder_path, 'hours.xlsx'),
+                           os.path.join(folder_path, 'PD_and_PA_report_list.xlsx'), cache_dir,
+                           window_start, window_end, programs, hours_columns, HOURS_BATCH_SIZE) as (active, hours, directory):
+        return active.result(), hours.result(), directory.result()
+
+@instrument(rows_arg='hours', outputs=('active', 'hours', 'directory'))
 def normalize_and_clean(active, hours, pd_list):
-    # Split 'Person' into first/last names for hours
-    hours[['Trainee Last Name', 'Trainee First Name']] = hours['Person'].str.split(',', n=1, expand=True)
-    hours['Trainee Last Name'] = hours['Trainee Last Name'].str.strip()
-    hours['Trainee First Name'] = hours['Trainee First Name'].str.strip()
-    
-    # Rename columns
-    hours.columns = HOURS_COLS_NEW
-    active.columns = ACTIVE_COLS_NEW
-    pd_list.columns = PD_LIST_COLS_NEW
-
-    # Lowercase emails
-    for df, col in [(hours, 'Trainee Email'), (active, 'Trainee Email'),
-                    (hours, 'Program Admin Email'), (active, 'Program Admin Email'),
-                    (pd_list, 'Program Admin Email')]:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.lower().replace({'nan': np.nan})
-
-    # Remove Chief Residents
-    if 'Status' in active.columns:
-        active = active[active['Status'] != 'Chief Resident']
-
-    # Parse datetimes
-    for c in ['Actual Start', 'Actual End', 'Date Logged', 'Last Update']:
-        if c in hours.columns:
-            hours[c] = pd.to_datetime(hours[c], errors='coerce')
-    return active, hours, pd_list
+    # Raw read_excel frames only; read_inputs() already returns normalized frames and the directory
+    hours = normalize_hours(hours)
+    active = normalize_active(active)
+    directory = program_directory(normalize_pd_list(pd_list))
+    return active, hours, directory
 
 def prev_month_range(reference_date=None):
     if reference_date is None:
-        reference_date = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
+        reference_date = datetime.today()
+    reference_date = reference_date.replace(hour=0, minute=0, second=0, microsecond=0)
     first_of_this_month = reference_date.replace(day=1)
     end_last_month = first_of_this_month - timedelta(days=1)
     start_last_month = end_last_month.replace(day=1)
@@ -125,120 +131,64 @@ def generate_full_weeks_for_month(start_month, end_month):
     return weeks
 
 
-# ---------- Core Processing ----------
-def process_month(active, hours, pd_list, start_month, end_month):
-    active = active.copy()
-    active['Trainee Email'] = active['Trainee Email'].str.lower().str.strip()
-    hours['Trainee Email'] = hours['Trainee Email'].str.lower().str.strip()
-    active_emails = set(active['Trainee Email'].dropna())
-
-    trainee_info = {}
-    violations_map = {}
-    resq_map = {}
-    missing_weeks_map = {}
-
-    # Pre-fill trainee info from active
-    for _, row in active.iterrows():
-        email = row.get('Trainee Email')
-        if pd.isna(email):
-            continue
-        trainee_info[email] = {
-            'Trainee First Name': row.get('Trainee First Name'),
-            'Trainee Last Name': row.get('Trainee Last Name'),
-            'Program': row.get('Program'),
-            'Program Admin Email': row.get('Program Admin Email')
-        }
-
+def analysis_window(start_month, end_month):
+    # [first week start, day after last week end) covered by the month's weeks
     weeks = generate_full_weeks_for_month(start_month, end_month)
+    return weeks[0][0], weeks[-1][1] + timedelta(days=1)
+
 
-    for ws, we, week_label in weeks:
-        mask = (hours['Actual Start'] >= ws) & (hours['Actual Start'] <= we)
-        hours_week = hours.loc[mask].copy()
-
-        # RESQ detection
-        resq_entries = hours_week[hours_week['Work Type'].str.contains('ResQ', na=False, case=False)]
-        for _, r in resq_entries.iterrows():
-            email = r.get('Trainee Email')
-            if pd.isna(email): continue
-            resq_map[email] = True
-            if email not in trainee_info:
-                trainee_info[email] = {
-                    'Trainee First Name': r.get('Trainee First Name'),
-                    'Trainee Last Name': r.get('Trainee Last Name'),
-                    'Program': r.get('Program'),
-                    'Program Admin Email': r.get('Program Admin Email')
-                }
-
-        # Violations detection
-        if 'In Violation' in hours_week.columns:
-            inv_series = hours_week['In Violation'].astype(str).str.strip().str.lower()
-            valid_yes = inv_series.isin(['yes','y'])
-            violations_entries = hours_week.loc[valid_yes]
-            for _, v in violations_entries.iterrows():
-                email = v.get('Trainee Email')
-                if pd.isna(email): continue
-                viol_msg = f"{v.get('Actual Start').strftime('%m/%d/%Y') if pd.notna(v.get('Actual Start')) else ''} {v.get('Rules Violated','')}"
-                violations_map.setdefault(email, set()).add(viol_msg.strip())
-                if email not in trainee_info:
-                    trainee_info[email] = {
-                        'Trainee First Name': v.get('Trainee First Name'),
-                        'Trainee Last Name': v.get('Trainee Last Name'),
-                        'Program': v.get('Program'),
-                        'Program Admin Email': v.get('Program Admin Email')
-                    }
-
-        # Missing hours: no entries
-        emails_this_week = set(hours_week['Trainee Email'].dropna())
-        no_entry_emails = active_emails - emails_this_week
-        for email in no_entry_emails:
-            missing_weeks_map.setdefault(email, set()).add(week_label)
-
-        # Partial coverage (<5 days)
-        if not hours_week.empty:
-            def expand_shift_days(row):
-                s, e = row['Actual Start'], row['Actual End']
-                if pd.isna(s) or pd.isna(e): return []
-                start_date, end_date = s.date(), e.date()
-                if end_date < start_date: return [start_date]
-                return list(pd.date_range(start_date, end_date).date)
-            hours_week['Days Covered'] = hours_week.apply(expand_shift_days, axis=1)
-            df_days = hours_week.explode('Days Covered')
-            days_worked = df_days.groupby('Trainee Email')['Days Covered'].nunique().reset_index()
-            partials = days_worked[days_worked['Days Covered'] < 5]
-            for _, p in partials.iterrows():
-                email = p['Trainee Email']
-                missing_weeks_map.setdefault(email, set()).add(week_label)
-
-    # Build final DataFrame — only include trainees who have at least one issue
-    all_emails = set(trainee_info.keys()) | set(violations_map.keys()) | set(resq_map.keys()) | set(missing_weeks_map.keys())
-
-    # Keep only emails that actually have a problem
-    def has_issue(email):
-        if email in resq_map and resq_map.get(email, False):
-            return True
-        if email in violations_map and violations_map.get(email):
-            return True
-        if email in missing_weeks_map and missing_weeks_map.get(email):
-            return True
-        return False
-
-    filtered_emails = {e for e in all_emails if e is not None and not pd.isna(e) and has_issue(e)}
-
-    rows = []
-    for email in sorted(filtered_emails):
-        info = trainee_info.get(email, {})
-        rows.append({
-            'Trainee Email': email,
-            'Trainee First Name': info.get('Trainee First Name'),
-            'Trainee Last Name': info.get('Trainee Last Name'),
-            'Program': info.get('Program'),
-            'Program Admin Email': info.get('Program Admin Email'),
-            'ResQ Violations': 'Yes' if resq_map.get(email, False) else np.nan,
-            'Violations': ', '.join(sorted(violations_map.get(email, []))) if violations_map.get(email) else np.nan,
-            'Week(s) of Missing Hours': ', '.join(sorted(missing_weeks_map.get(email, []))) if missing_weeks_map.get(email) else np.nan
-        })
-
-    consolidated_df = pd.DataFrame(rows)
+# ---------- Core Processing ----------
+@instrument(rows_arg='hours')
+def process_month(active, hours, start_month, end_month):
+    weeks = generate_full_weeks_for_month(start_month, end_month)
+    week_labels = np.array([week_label for _, _, week_label in weeks], dtype=object)
+
+    # Bucket every row into its Sunday-anchored week once; rows outside the month's weeks get -1
+    week_ids = week_index(hours['Actual Start'], weeks[0][0], len(weeks)) if weeks else np.full(len(hours), -1)
+    in_window = week_ids >= 0
+    hours_window = hours.loc[in_window].assign(Week=week_ids[in_window])
+
+    # Trainees as dense integer ids (email, NPI fallback); the set and group work below runs on them
+    emails, (active_ids, row_ids) = trainee_ids(active, hours_window)
+    n_ids = max(len(emails), 1)
+    active = active.assign(**{'Trainee Id': active_ids}).loc[active_ids >= 0]
+    hours_window = hours_window.assign(**{'Trainee Id': row_ids}).loc[row_ids >= 0]
+
+    # RESQ detection
+    resq_entries = hours_window[hours_window['Work Type'].str.contains('ResQ', na=False, case=False)]
+    resq = pd.Series('Yes', index=np.unique(resq_entries['Trainee Id']))
+
+    # Violations detection
+    if 'In Violation' in hours_window.columns:
+        inv_series = hours_window['In Violation'].astype(str).str.strip().str.lower()
+        violations_entries = hours_window.loc[inv_series.isin(['yes','y'])]
+    else:
+        violations_entries = hours_window.iloc[0:0]
+    violations = join_sorted_unique_by(violations_entries['Trainee Id'], violation_messages(violations_entries))
+
+    # Missing hours: active trainees with no entries in a week, plus partial coverage (<5 days),
+    # both computed per (week, trainee) cell in one pass
+    week_no, trainee_no = missing_week_pairs(active['Trainee Id'].to_numpy(), hours_window['Week'].to_numpy(),
+                                             hours_window['Trainee Id'].to_numpy(), len(weeks), n_ids)
+    cells = partial_coverage(hours_window.assign(Cell=hours_window['Week'] * n_ids + hours_window['Trainee Id']),
+                             key_col='Cell').to_numpy(dtype=np.int64)
+    missing_weeks = join_sorted_unique_by(np.concatenate([trainee_no, cells % n_ids]),
+                                          week_labels[np.concatenate([week_no, cells // n_ids])])
+
+    # Build final DataFrame — only trainees with at least one issue, identity from the
+    # roster first and then from the hours rows that raised the issue
+    findings = pd.concat({'ResQ Violations': resq,
+                          'Violations': violations,
+                          'Week(s) of Missing Hours': missing_weeks}, axis=1).sort_index()
+    findings.index.name = 'Trainee Id'
+    identity = trainee_identity(active, resq_entries, violations_entries, key_col='Trainee Id')
+
+    # Id order is email order
+    consolidated_df = findings.join(identity, how='left')
+    consolidated_df.insert(0, 'Trainee Email', emails[consolidated_df.index])
+    consolidated_df = decategorize(consolidated_df.reset_index(drop=True)
+                                   [['Trainee Email'] + IDENTITY_COLS +
+                                    ['ResQ Violations', 'Violations', 'Week(s) of Missing Hours']])
 
     # Optional pilot filter
     if PILOT_ONLY:
@@ -246,195 +196,300 @@ def process_month(active, hours, pd_list, start_month, end_month):
 
     return consolidated_df
 
-# ---------- Output & Save ----------
-def save_output(consolidated_df, start_month, end_month, program_counts_df):
-    month_label_short = start_month.strftime("%m_%Y")
-    output_name = f"{OUTPUT_PREFIX}_{month_label_short}.xlsx"
-    out_path = os.path.join(folder_path, output_name)
-
-    # QC summary
-    qc_df = consolidated_df.groupby('Program').size().reset_index(name='Count')
-    qc_df['SummaryLine'] = qc_df['Program'] + ' → ' + qc_df['Count'].astype(str) + ' trainees'
-    full_summary = '\n'.join(qc_df['SummaryLine'].astype(str))
-    summary_df = pd.DataFrame({'FullSummary': [full_summary]})
-
-    # Save Excel
-    with pd.ExcelWriter(out_path, engine='openpyxl') as writer:
-        consolidated_df.to_excel(writer, sheet_name="Sheet1", index=False)
-        summary_df.to_excel(writer, sheet_name="Sheet2", index=False)
-        program_counts_df.to_excel(writer, sheet_name='Program Counts', index=False)
-
-
-    wb = load_workbook(out_path)
-    ws1 = wb["Sheet1"]
-    ws2 = wb["Sheet2"]
-
-    # Add tables
-    num_rows1, num_cols1 = consolidated_df.shape[0] + 1, consolidated_df.shape[1] if consolidated_df.shape[1] > 0 else 1
-    tab1 = Table(displayName="Table1", ref=f"A1:{chr(64+num_cols1)}{num_rows1}")
-    tab1.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
-    ws1.add_table(tab1)
-
-    num_rows2, num_cols2 = summary_df.shape[0] + 1, summary_df.shape[1]
-    tab2 = Table(displayName="Table2", ref=f"A1:{chr(64+num_cols2)}{num_rows2}")
-    tab2.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
-    ws2.add_table(tab2)
-
-    wb.save(out_path)
-    wb.close()
-    logging.info(f"Saved output to {out_path}")
-    return out_path
 
-# ---------- Output & Save ----------
-def save_output(consolidated_df, start_month, end_month, program_counts_df, folder_path, OUTPUT_PREFIX):
-    month_label_short = start_month.strftime("%m_%Y")
-    output_name = f"{OUTPUT_PREFIX}_{month_label_short}.xlsx"
-    out_path = os.path.join(folder_path, output_name)
-
-    # QC summary
-    qc_df = consolidated_df.groupby('Program').size().reset_index(name='Count')
-    qc_df['SummaryLine'] = qc_df['Program'] + ' → ' + qc_df['Count'].astype(str) + ' trainees'
-    full_summary = '\n'.join(qc_df['SummaryLine'].astype(str))
-    summary_df = pd.DataFrame({'FullSummary': [full_summary]})
-
-    # --- Save Excel using pandas.ExcelWriter ---
-    with pd.ExcelWriter(out_path, engine='openpyxl') as writer:
-        consolidated_df.to_excel(writer, sheet_name="Sheet1", index=False)
-        summary_df.to_excel(writer, sheet_name="Sheet2", index=False)
-        program_counts_df.to_excel(writer, sheet_name='Program Counts', index=False)
-
-    # --- Reopen with openpyxl to add tables ---
-    wb = load_workbook(out_path)
-
-    # Sheet1 table
-    ws1 = wb["Sheet1"]
-    num_rows1 = consolidated_df.shape[0] + 1
-    num_cols1 = consolidated_df.shape[1] if consolidated_df.shape[1] > 0 else 1
-    tab1 = Table(displayName="Table1", ref=f"A1:{chr(64+num_cols1)}{num_rows1}")
-    tab1.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
-    ws1.add_table(tab1)
-
-    # Sheet2 table
-    ws2 = wb["Sheet2"]
-    num_rows2, num_cols2 = summary_df.shape[0] + 1, summary_df.shape[1]
-    tab2 = Table(displayName="Table2", ref=f"A1:{chr(64+num_cols2)}{num_rows2}")
-    tab2.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
-    ws2.add_table(tab2)
-
-    # Program Counts table
-    ws3 = wb["Program Counts"]
-    num_rows3, num_cols3 = program_counts_df.shape[0] + 1, program_counts_df.shape[1]
-    tab3 = Table(displayName="Table3", ref=f"A1:{chr(64+num_cols3)}{num_rows3}")
-    tab3.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
-    ws3.add_table(tab3)
-
-    # Save and close workbook
-    wb.save(out_path)
-    wb.close()
-    del wb
-    gc.collect()  # release file handles
-
-    # Optional: test file is writable
-    try:
-        with open(out_path, 'a'):
-            logging.info(f"File is writable and ready for sync: {out_path}")
-    except Exception as e:
-        logging.warning(f"File still locked: {e}")
+def month_weeks(start_month, end_month):
+    # (week start timestamps, week labels) of the month's weeks
+    weeks = generate_full_weeks_for_month(start_month, end_month)
+    return ([pd.Timestamp(week_start) for week_start, _, _ in weeks],
+            [week_label for _, _, week_label in weeks])
 
-    logging.info(f"Saved output to {out_path}")
-    return out_path
 
-def archive_inputs():
-    date_str = datetime.today().strftime("%m_%d_%Y")
-    active_file = os.path.join(folder_path, 'active.xlsx')
-    hours_file = os.path.join(folder_path, 'hours.xlsx')
+@instrument(rows_arg='hours')
+def process_month_incremental(store_path, active, hours, start_month, end_month):
+    """
+    process_month from the (trainee, week) cell store at store_path. hours is the full
+    export; only the cells touched since the last processed export are recomputed.
+    Identity for trainees off the roster comes from their flagged cells in week order.
+    """
+    week_starts, week_labels = month_weeks(start_month, end_month)
+    cells = update_cells(hours, store_path)
+    findings = week_findings(active, cells, week_starts, hours)
+    consolidated_df = decategorize(aggregate_weeks(findings, week_starts, week_labels))
 
-    active_dest = os.path.join(old_file_folder_path, 'old_active_list', f"active_{date_str}.xlsx")
-    hours_dest = os.path.join(old_file_folder_path, 'old_hours_list', f"hours_{date_str}.xlsx")
+    if PILOT_ONLY:
+        consolidated_df = consolidated_df[consolidated_df['Program'].isin(PILOTS)]
 
-    for src, dst in [(active_file, active_dest), (hours_file, hours_dest)]:
-        if os.path.exists(src):
-            shutil.move(src, dst)
-            logging.info(f"Moved {src} -> {dst}")
-        else:
-            logging.warning(f"File not found, not moved: {src}")
+    return consolidated_df
 
 
-# ---------- Main ----------
-def main():
-    logging.info("Starting monthly compliance processing...")
-    ensure_dirs()
-    active, hours, pd_list = read_inputs()
-    active, hours, pd_list = normalize_and_clean(active, hours, pd_list)
+@instrument()
+def process_month_from_findings(db_path, start_month, end_month):
+    """
+    process_month aggregated from the findings the weekly runs stored in db_path
+    for the month's weeks, without reading the hours export.
+    """
+    week_starts, week_labels = month_weeks(start_month, end_month)
+    findings = load_findings(db_path, week_starts, programs=PILOTS if PILOT_ONLY else None)
+    consolidated_df = aggregate_weeks(findings, week_starts, week_labels)
 
-    start_month, end_month = prev_month_range()
-    logging.info(f"Analyzing previous month: {start_month.date()} -> {end_month.date()}")
+    if PILOT_ONLY:
+        consolidated_df = consolidated_df[consolidated_df['Program'].isin(PILOTS)]
+
+    return consolidated_df
 
-    # ---------- 1. Create consolidated_df ----------
-    consolidated_df = process_month(active, hours, pd_list, start_month, end_month)
+# ---------- Output & Save ----------
+def output_file_path(start_month, folder_path, output_prefix):
+    month_label_short = start_month.strftime("%m_%Y")
+    output_name = f"{output_prefix}_{month_label_short}.xlsx"
+    return os.path.join(folder_path, output_name)
 
+@instrument()
+def save_output(consolidated_df, start_month, end_month, program_counts_df, folder_path, OUTPUT_PREFIX):
+    out_path = output_file_path(start_month, folder_path, OUTPUT_PREFIX)
+
+    # Sheets and their styled tables (Table1..Table3) are written in a single pass
+    return write_workbook(out_path, [
+        ("Sheet1", consolidated_df),
+        ("Sheet2", summary_frame(consolidated_df)),
+        ('Program Counts', program_counts_df),
+    ])
+
+@instrument()
+def archive_inputs(folder_path, reference_date):
+    # active.xlsx / hours.xlsx -> content-addressed archive (see compliance_archive); archived workbooks are removed
+    archive_workbooks(site_paths(folder_path)['archive'],
+                      [(os.path.join(folder_path, f'{kind}.xlsx'), kind) for kind in ('active', 'hours')],
+                      reference_date, ingest_cache_dir(folder_path))
+
+
+# ---------- Program Info ----------
+@instrument()
+def add_program_info(consolidated_df, directory):
+    """
+    Adds director/admin columns from the program directory to the findings and
+    builds the per-program counts sheet. Returns (consolidated_df, program_counts_df).
+    """
+    consolidated_df = consolidated_df.copy()
     # ---------- 2. Clean Program column for merging ----------
     consolidated_df['Program'] = consolidated_df['Program'].astype(str).str.strip()
-    programs_info = pd_list.copy()
-    programs_info['Program'] = programs_info['Program'].astype(str).str.strip()
 
-    # ---------- 3. Prepare program/director/admin info from pd_list ----------
-    # Ensure all needed columns exist
-    for col in ['Program Director First Name', 'Program Director Last Name', 'Program Director Email',
-                'programcoordinator', 'Program Admin Email']:
-        if col not in programs_info.columns:
-            programs_info[col] = np.nan
+    # ---------- 3-4. Merge info into consolidated_df (Sheet1) ----------
+    consolidated_df = enrich(consolidated_df, directory)
 
-    # Split 'programcoordinator' into First/Last
-    programs_info['programcoordinator'] = programs_info['programcoordinator'].fillna('')
-    def split_coordinator(x):
-        parts = x.split(',', 1)
-        if len(parts) == 2:
-            last, first = parts
-        else:
-            last = parts[0]
-            first = ''
-        return pd.Series([last.strip(), first.strip()])
+    # ---------- 5. Build program_counts_df (Sheet2) ----------
+    all_programs = sorted(consolidated_df['Program'].dropna().astype(str).str.strip().unique())
+    program_counts = consolidated_df['Program'].value_counts().reindex(all_programs, fill_value=0)
 
-    programs_info[['Program Admin Last Name', 'Program Admin First Name']] = programs_info['programcoordinator'].apply(split_coordinator)
+    program_counts_df = pd.DataFrame({
+        'Program': program_counts.index,
+        'Count': program_counts.values
+    })
 
+    # Merge program/director/admin info into program_counts_df
+    program_counts_df = enrich(program_counts_df, directory, lsuffix='_x', rsuffix='_y')
+    return consolidated_df, program_counts_df
+
+# ---------- Backfill ----------
+def month_range(first_month, last_month):
+    # (start, end) of every calendar month from first_month through last_month
+    months = []
+    current = first_month.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while current <= last_month:
+        next_month = (current + timedelta(days=32)).replace(day=1)
+        months.append((current, next_month - timedelta(days=1)))
+        current = next_month
+    return months
+
+
+def archived_snapshots(folder_path, kind):
+    """
+    Archive entries of kind in folder_path, oldest first. Workbooks still in the
+    old layout (past_lists/old_<kind>_list/<kind>_MM_DD_YYYY.xlsx) and the
+    current <kind>.xlsx (as taken now, left in place) are archived first.
+    """
+    paths, cache_dir = site_paths(folder_path), ingest_cache_dir(folder_path)
+    import_legacy(paths['archive'], os.path.join(paths['old_file_folder'], f'old_{kind}_list'), kind, cache_dir)
+    archive_input(paths['archive'], os.path.join(folder_path, f'{kind}.xlsx'), kind, datetime.now(), cache_dir)
+    return snapshots(paths['archive'], kind)
 
-    # Keep only needed columns
-    pd_info = programs_info[['Program', 'Program Director First Name', 'Program Director Last Name',
-                            'Program Director Email', 'Program Admin First Name', 'Program Admin Last Name',
-                            'Program Admin Email']]
 
-    # Deduplicate one row per Program
-    pd_info = pd_info.drop_duplicates(subset=['Program'])
+def snapshot_for_month(entries, end_month):
+    # The first snapshot taken on or after the month's last day (what its monthly run read); None if none was.
+    # Dates, not datetimes: end_month is the last day at 00:00, and a snapshot later that day still counts
+    later = [entry for entry in entries if entry['taken'].date() >= end_month.date()]
+    return later[0] if later else None
 
-    # ---------- 4. Merge info into consolidated_df (Sheet1) ----------
-    # Clean Program columns for merge
-    consolidated_df['Program_clean'] = consolidated_df['Program'].str.lower().str.strip()
-    pd_info['Program_clean'] = pd_info['Program'].str.lower().str.strip()
 
+def first_shift(hours):
+    # Date of the earliest shift in an hours frame (None when it has none)
+    earliest = hours['Actual Start'].min()
+    return None if pd.isna(earliest) else earliest.date()
 
-    consolidated_df = consolidated_df.merge(pd_info, on='Program_clean', how='left', suffixes=('', '_info'))
 
+def snapshot_inputs(archive_path, active_entry, hours_entry, directory, programs=None):
+    # (active, hours, directory) from archived snapshots, loaded as read_inputs would load the workbooks
+    roster = load_snapshot(archive_path, active_entry)
+    hours = load_snapshot(archive_path, hours_entry, HOURS_RULE_COLS, hours_filters(programs=programs, active=roster))
+    return apply_filters(roster, active_filters(programs)), hours, directory
 
-    consolidated_df = consolidated_df.drop(columns=['Program_clean'])
 
-    # ---------- 5. Build program_counts_df (Sheet2) ----------
-    all_programs = sorted(consolidated_df['Program'].astype(str).str.strip().unique())
-    program_counts = consolidated_df['Program'].value_counts().reindex(all_programs, fill_value=0)
+def backfill_month(active, hours, directory, start_month, end_month, folder_path):
+    consolidated_df = process_month(active, hours, start_month, end_month)
+    consolidated_df, program_counts_df = add_program_info(consolidated_df, directory)
+    return save_output(consolidated_df, start_month, end_month, program_counts_df, folder_path, OUTPUT_PREFIX)
 
-    program_counts_df = pd.DataFrame({
-        'Program': program_counts.index,
-        'Count': program_counts.values
-    })
 
-    # Merge program/director/admin info into program_counts_df
-    program_counts_df['Program_clean'] = program_counts_df['Program'].str.lower().str.strip()
-    program_counts_df = program_counts_df.merge(pd_info, on='Program_clean', how='left')
-    program_counts_df = program_counts_df.drop(columns=['Program_clean'])
+def backfill(folder_path, first_month, last_month, workers=None):
+    """
+    Regenerates folder_path's monthly list for every month from first_month through
+    last_month from the archived snapshots, one workbook per month. Each month
+    reads the hours/active snapshot its own run would have read, from the
+    archive; each snapshot is loaded once and shared by its months, which run in
+    parallel. A month is skipped, with a warning, when no snapshot was taken
+    by its last day or the hours snapshot starts after its first day: the list
+    would report the uncovered weeks as missing hours. Existing lists of the
+    month are overwritten (logged). The current inputs are archived but left
+    in place. Returns the output paths.
+    """
+    months = month_range(first_month, last_month)
+    hours_snapshots = archived_snapshots(folder_path, 'hours')
+    active_snapshots = archived_snapshots(folder_path, 'active')
+    if not months or not hours_snapshots or not active_snapshots:
+        raise FileNotFoundError(f"Nothing to backfill between {first_month:%Y-%m} and {last_month:%Y-%m}")
+    label = f"{first_month:%m_%Y}_to_{last_month:%m_%Y}"
+
+    report = None
+    try:
+        with run_report('monthly_backfill', TRACE_MEMORY, PROFILE_STAGE, first_month=first_month,
+                        last_month=last_month, pilot_only=PILOT_ONLY, months=len(months)) as report:
+            directory = load_normalized(os.path.join(folder_path, 'PD_and_PA_report_list.xlsx'), 'directory',
+                                        ingest_cache_dir(folder_path))
+            inputs, starts, tasks = {}, {}, []
+            for start_month, end_month in months:
+                active_entry = snapshot_for_month(active_snapshots, end_month)
+                hours_entry = snapshot_for_month(hours_snapshots, end_month)
+                if active_entry is None or hours_entry is None:
+                    logging.warning(f"Skipping {start_month:%Y-%m}: no snapshot was taken by {end_month:%Y-%m-%d}")
+                    continue
+                key = (active_entry['digest'], hours_entry['digest'])
+                if key not in inputs:
+                    logging.info(f"Loading hours snapshot {hours_entry['source']} ({hours_entry['taken']:%Y-%m-%d}) "
+                                 f"for {start_month:%Y-%m}")
+                    inputs[key] = snapshot_inputs(site_paths(folder_path)['archive'], active_entry, hours_entry,
+                                                  directory, PILOTS if PILOT_ONLY else None)
+                    starts[key] = first_shift(inputs[key][1])
+                if starts[key] is None or starts[key] > start_month.date():
+                    logging.warning(f"Skipping {start_month:%Y-%m}: hours snapshot {hours_entry['source']} "
+                                    f"({hours_entry['taken']:%Y-%m-%d}) has no shifts before "
+                                    f"{starts[key] or 'its end'}, so it does not cover the month")
+                    continue
+                out_path = output_file_path(start_month, folder_path, OUTPUT_PREFIX)
+                if os.path.exists(out_path):
+                    logging.warning(f"Backfill overwrites {out_path}")
+                tasks.append(inputs[key] + (start_month, end_month, folder_path))
+            if not tasks:
+                raise FileNotFoundError(f"No snapshot covers a month from {first_month:%Y-%m} to {last_month:%Y-%m}")
+
+            with stage('backfill_months', rows_in=len(tasks)) as record:
+                out_paths = map_tasks(backfill_month, tasks, workers=workers)
+                record['rows_out'] = len(out_paths)
+    finally:
+        if report is not None:
+            write_report(report, report_path_for(os.path.join(folder_path, f"{OUTPUT_PREFIX}_backfill_{label}.xlsx")))
+    return out_paths
+
+
+# ---------- Main ----------
+def run(folder_path, reference_date=None, archive=True):
+    """
+    Produces folder_path's monthly compliance list for the month before
+    reference_date (default: today), archives the inputs (unless archive is
+    False) and returns the output path. A run report is written next to it as
+    <output>.run.json.
+    """
+    if reference_date is None:
+        reference_date = datetime.now()
+    paths = site_paths(folder_path)
+    ensure_dirs(folder_path)
+
+    start_month, end_month = prev_month_range(reference_date)
+    logging.info(f"Analyzing previous month: {start_month.date()} -> {end_month.date()}")
+    out_path = output_file_path(start_month, folder_path, OUTPUT_PREFIX)
+    # Completed stages of an earlier, failed run on the same inputs and settings are not repeated
+    ckpt = open_run(paths['checkpoints'], f"monthly_{start_month:%Y_%m}",
+                    {'active': os.path.join(folder_path, 'active.xlsx'), 'hours': os.path.join(folder_path, 'hours.xlsx'),
+                     'pd_list': os.path.join(folder_path, 'PD_and_PA_report_list.xlsx')},
+                    {'pilot_only': PILOT_ONLY, 'incremental': INCREMENTAL, 'from_findings': FROM_FINDINGS,
+                     'archive': archive}
+                    ) if CHECKPOINTS else None
+
+    report = None
+    try:
+        with run_report('monthly', TRACE_MEMORY, PROFILE_STAGE, month=start_month,
+                        pilot_only=PILOT_ONLY, output=out_path) as report:
+            # ---------- 1. Create consolidated_df ----------
+            programs = PILOTS if PILOT_ONLY else None
+            if FROM_FINDINGS and covers(paths['findings_db'], month_weeks(start_month, end_month)[0], programs):
+                # Program info still needs the PD/PA list's directory; the export is not read
+                directory = resume(ckpt, 'read_inputs', load_normalized,
+                                   os.path.join(folder_path, 'PD_and_PA_report_list.xlsx'), 'directory',
+                                   ingest_cache_dir(folder_path))
+                consolidated_df = resume(ckpt, 'process_month', process_month_from_findings, paths['findings_db'],
+                                         start_month, end_month)
+            elif INCREMENTAL:
+                # The whole export is diffed against the result store; the pilot filter applies to the findings
+                active, hours, directory = resume(ckpt, 'read_inputs', read_inputs, folder_path,
+                                                  hours_columns=STORE_HOURS_COLS)
+                consolidated_df = resume(ckpt, 'process_month', process_month_incremental, paths['result_store'],
+                                         active, hours, start_month, end_month)
+            else:
+                # Only the month's weeks, the piloted programs and the rule columns are loaded
+                window_start, window_end = analysis_window(start_month, end_month)
+                active, hours, directory = resume(ckpt, 'read_inputs', read_inputs, folder_path, window_start,
+                                                  window_end, programs=programs, hours_columns=HOURS_RULE_COLS)
+                consolidated_df = resume(ckpt, 'process_month', map_program_shards, process_month, active, hours,
+                                         start_month, end_month, workers=WORKERS)
+
+            # ---------- 2-5. Program/director/admin info and per-program counts ----------
+            consolidated_df, program_counts_df = resume(ckpt, 'add_program_info', add_program_info,
+                                                        consolidated_df, directory)
+
+            resume(ckpt, 'save_output', save_output, consolidated_df, start_month, end_month, program_counts_df,
+                   folder_path, OUTPUT_PREFIX)
+            if archive:
+                # Last: the inputs leave the folder only once everything else is done
+                resume(ckpt, 'archive_inputs', archive_inputs, folder_path, reference_date)
+        if ckpt is not None:
+            finish_run(ckpt)
+    finally:
+        # Written for failed runs too, with the failing stage's error recorded
+        if report is not None:
+            write_report(report, report_path_for(out_path))
+    return out_path
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the monthly compliance list for last month.")
+    parser.add_argument('--folder', help=f"Working folder (default: ${FOLDER_ENV_VAR}).")
+    parser.add_argument('--reference-date', type=lambda s: datetime.strptime(s, '%Y-%m-%d'),
+                        help="Run as if today were this date (YYYY-MM-DD); last month is the month before it.")
+    parser.add_argument('--no-archive', action='store_true', help="Leave the inputs in place.")
+    parser.add_argument('--backfill', nargs=2, metavar=('FIRST', 'LAST'),
+                        type=lambda s: datetime.strptime(s, '%Y-%m'),
+                        help="Regenerate every month FIRST..LAST (YYYY-MM) from the archived snapshots instead.")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Backfill months in this many worker processes (0: one per spare CPU).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    folder_path = args.folder or os.environ[FOLDER_ENV_VAR]
+    if args.backfill:
+        return backfill(folder_path, *args.backfill, workers=args.workers)
+    logging.info("Starting monthly compliance processing...")
+    out_path = run(folder_path, reference_date=args.reference_date, archive=not args.no_archive)
+    logging.info(f"Processing complete: {out_path}")
+    return out_path
 
-    save_output(consolidated_df, start_month, end_month, program_counts_df, folder_path, OUTPUT_PREFIX)
-    archive_inputs()
-    logging.info("Processing complete.")
 
 if __name__ == "__main__":
     main()
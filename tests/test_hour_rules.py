@@ -0,0 +1,52 @@
+# test_hour_rules.py
+from datetime import datetime, timedelta
+import pandas as pd
+from compliance_engine import (ACGME_AVERAGING_WEEKS, ACGME_MAX_WEEKLY_HOURS, ACGME_MAX_CONTINUOUS_HOURS,
+                               weekly_hours, rolling_average_hours, duty_periods, duty_free_days)
+
+FIRST_WEEK = datetime(2025, 10, 19)  # a Sunday
+
+
+def shifts(days, work_type, hours_per_day, start_hour=0, key=0):
+    # One row per day from FIRST_WEEK + days[i], as the export logs them
+    starts = [FIRST_WEEK + timedelta(days=d, hours=start_hour) for d in days]
+    return pd.DataFrame({'Trainee Id': key, 'Work Type': work_type, 'Actual Start': starts,
+                         'Actual End': [s + timedelta(hours=hours_per_day) for s in starts],
+                         'Actual Hours Worked': hours_per_day})
+
+
+def average(hours):
+    weekly = weekly_hours(hours, FIRST_WEEK, ACGME_AVERAGING_WEEKS, 1)
+    return rolling_average_hours(weekly)[0, -1]
+
+
+def test_vacation_week_is_not_flagged():
+    # Three weeks of 12-hour weekday shifts, then a week of vacation logged midnight to midnight
+    duty = shifts([w * 7 + d for w in range(3) for d in range(1, 6)], 'Assigned Work/Shift', 12, start_hour=7)
+    vacation = shifts(range(21, 28), 'Vacation', 24)
+    assert average(pd.concat([duty, vacation], ignore_index=True)) == average(duty) == 45
+    assert average(pd.concat([duty, vacation], ignore_index=True)) <= ACGME_MAX_WEEKLY_HOURS
+
+
+def test_sick_days_do_not_count_as_hours():
+    sick = shifts(range(28), 'Sick Day', 24)
+    assert average(sick) == 0
+
+
+def test_duty_work_types_count():
+    duty = shifts(range(28), 'In-House Call', 24)
+    assert average(duty) == 24 * 7
+
+
+def test_vacation_days_are_not_a_duty_period():
+    vacation = shifts(range(7, 12), 'Vacation', 24)
+    assert duty_periods(vacation).empty
+
+
+def test_leave_days_are_free_days():
+    # Duty every day but a week of sick days: that week's 7 days are free
+    duty = shifts([d for d in range(28) if not 7 <= d < 14], 'Assigned Work/Shift', 10, start_hour=7)
+    sick = shifts(range(7, 14), 'Sick Day', 24)
+    periods = duty_periods(pd.concat([duty, sick], ignore_index=True))
+    assert (periods['Hours'] <= ACGME_MAX_CONTINUOUS_HOURS).all()
+    assert duty_free_days(periods, FIRST_WEEK, 28, 1)[0] == 7
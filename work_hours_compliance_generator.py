@@ -1,427 +1,483 @@
+# work_hours_compliance_generator.py
+"""
+Weekly work-hours compliance list.
+
+Importing this module has no side effects and does not import pandas; call
+main() (or run()) to read the inputs, compute last week's findings, write
+weekly_compliance_email_list.xlsx (with a Changes sheet against the previous
+list, plus a .run.json stage report) and archive the inputs. A long-lived worker can call run() repeatedly and pays the
+pandas/openpyxl import once.
+
+    python work_hours_compliance_generator.py [--reference-date YYYY-MM-DD] [--no-archive]
+        [--folder DIR] [--active PATH] [--hours PATH] [--pd-list PATH] [--output PATH]
+        [--profile STAGE] [--trace-memory] [--workers N] [--no-findings] [--no-checkpoints]
+"""
 import os
-import pandas as pd
-pd.set_option('future.no_silent_downcasting', True)
-import warnings
-warnings.simplefilter(action='ignore', category=FutureWarning)
-
-from openpyxl import load_workbook
-import numpy as np
-
-import ast
-
-import requests
 import shutil
-
 import logging
-import sys
-import re
-from pathlib import Path
+import argparse
+import warnings
 from datetime import datetime, timedelta
-from openpyxl import load_workbook
-from openpyxl.worksheet.table import Table, TableStyleInfo
-
+from compliance_telemetry import run_report, instrument, write_report, report_path_for
 
-current_directory = os.getcwd()
-
-
-print("#############################################################################################################################################################")
-
-today = pd.Timestamp.today()
-
-folder_path = os.environ["FOLDER_PATH_gme_compliance"]
+warnings.simplefilter(action='ignore', category=FutureWarning)
 
+# ---------- CONFIG ----------
+FOLDER_ENV_VAR = "FOLDER_PATH_gme_compliance"
 old_file_folder = 'past_lists'
 
-old_file_folder_path = os.path.join(folder_path, old_file_folder)
-
-# Load Excel files into a DataFrame
-
-active_file_name = 'active.xlsx'
-hours_file_name = 'hours.xlsx'
-
-active_file_path = os.path.join(folder_path, active_file_name)
-hours_file_path = os.path.join(folder_path, hours_file_name)
+ACTIVE_FILE_NAME = 'active.xlsx'
+HOURS_FILE_NAME = 'hours.xlsx'
+PD_LIST_FILE_NAME = 'PD_and_PA_report_list.xlsx'
+COMPLIANCE_LIST_NAME = 'weekly_compliance_email_list.xlsx'
+FINDINGS_DB_NAME = 'findings.sqlite'  # per-(trainee, week) findings under past_lists, read by the monthly job
 
-active = pd.read_excel(active_file_path)
-hours = pd.read_excel(hours_file_path)
-
-# load in directors info
-pd_list_file_name = 'PD_and_PA_report_list.xlsx'
-pd_list_file_path = os.path.join(folder_path, pd_list_file_name)
-pd_list = pd.read_excel(pd_list_file_path)
-
-
-# generating new active file, move old into "past" folder
-src_file_name = "weekly_compliance_email_list.xlsx"
-src_file = os.path.join(folder_path, src_file_name)
-target_folder_name = "past_lists/old_compliance_list"
-target_folder = os.path.join(folder_path, target_folder_name)
-
-os.makedirs(target_folder, exist_ok=True)
-
-
-# Get today's date
-today = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
-
-weekday = today.weekday()  # Monday=0, ..., Sunday=6
-
-# Determine reference date
-if weekday == 0:  # Monday
-    # Get previous Thursday
-    ref_date = today - timedelta(days=4)
-elif weekday == 3:  # Thursday
-    # Get previous Monday
-    ref_date = today - timedelta(days=3)
-else:
-    # Default: just use today
-    ref_date = today
-
-# Format the reference date
-date_str = ref_date.strftime("%m_%d_%Y")
-
-# Build new file name
-base_name, ext = os.path.splitext(os.path.basename(src_file))
-new_file_name = f"{base_name}_{date_str}{ext}"
-dst_file = os.path.join(target_folder, new_file_name)
-
-# Move the file
-shutil.move(src_file, dst_file)
-print(f"Moved file to: {dst_file}")
-
-hours[['Trainee Last Name', 'Trainee First Name']] = hours['Person'].str.split(',', n=1, expand=True)
-
-# Remove any leading/trailing spaces
-hours['Trainee Last Name'] = hours['Trainee Last Name'].str.strip()
-hours['Trainee First Name'] = hours['Trainee First Name'].str.strip()
-#rename columns 
-
-hours_columns = ["Person's National Provider Identifier", 'Person', 'Status', 'Program',
-       'Work Type', 'Start Date/Time', 'End Date/Time', 'Hours Worked',
-       'Rotation', 'Rotation Start Date', 'Rotation End Date', 'Source',
-       'Resident Approved', 'Administrator Approved', 'Institution/Location',
-       'In Violation', 'Violations', 'Rules Violated', 'Comment', 'Comment By',
-       'Last Update', 'Date Logged', "Person's Coordinator Email",
-       "Person's Primary E-Mail Address", "Person's Program Coordinator",
-       "Person's Program Director", 'Trainee Last Name', 'Trainee First Name']
+# Pilot Programs
+PILOTS = ['NEUROSURG-Neurological Surgery-ACGME', 'Imaging-Diagnostic Radiology-ACGME', 'MED-Pulmonary Disease & Critical Care Medicine-ACGME',
+          'RAD-Radiation Oncology-ACGME', 'PEDS-Pediatric Medicine-ACGME', 'Surgery-Advanced GI MIS/Bariatric', 'MED-Hospice & Palliative Care Medicine-ACGME',
+          'OB/GYN-Obstetrics & Gynecology-ACGME', 'MED-Rheumatology-ACGME']
 
-active_columns = ['ID Number', 'Last Name', 'First Name', 'Middle Name',
-       "Person's National Provider Identifier",
-       "Person's Primary E-Mail Address", 'Department/Division', 'Program',
-       "Person's Program Director", 'Status', "Person's Program Start Date",
-       "Person's Program End Date", "Person's Coordinator Email",
-       "Person's Program Coordinator"]
+# test cases removed from the list
+EXCLUDED_EMAILS = ['jeffrey.mckelvey@cshs.org']
 
 #build list for email automation
 table_list_columns = ["Trainee First Name", "Trainee Last Name", "Trainee Email", "Date of Missing Hours", "Week of Missing Hours", "Violations", "ResQ Violations",
                      "Program Admin First Name",	"Program Admin Last Name", "Program Admin Email", "Program Director First Name", "Program Director Last Name", "Program Director Email",
                      "80 Hr", "Day Off", "Call", "24+", "SB"]
 
-hours_column_update = ["Person's National Provider Identifier", 'Person', 'Status', 'Program',
-       'Work Type', 'Actual Start', 'Actual End', 'Actual Hours Worked', 
-       'Rotation', 'Rotation Start Date', 'Rotation End Date', 'Source', 
-       'Resident Approved', 'Administrator Approved', 'Institution/Location', 
-       'In Violation', 'Violation(s)', 'Rules Violated', 'Comment', 'Comment By',
-       'Last Update', "Date Logged", "Program Admin Email", 
-       "Trainee Email", "Person's Program Coordinator", 
-       "Person's Program Director", 'Trainee Last Name', 'Trainee First Name',]
-
-active_columns_update = ['ID Number', 'Trainee Last Name', 'Trainee First Name', 'Middle Name',
-       "Person's National Provider Identifier",
-       "Trainee Email", 'Department/Division', 'Program',
-       "Person's Program Director", 'Status', "Person's Program Start Date",
-       "Person's Program End Date", "Program Admin Email",
-       "Person's Program Coordinator"]
-
-
-#update column names
-hours.columns = hours_column_update
-active.columns = active_columns_update
-
-hours['Trainee Email'] = hours['Trainee Email'].str.lower()
-active['Trainee Email'] = active['Trainee Email'].str.lower()
-
-hours['Program Admin Email'] = hours['Program Admin Email'].str.lower()
-active['Program Admin Email'] = active['Program Admin Email'].str.lower()
-
-pd_list['programcoordinatoremail'] = pd_list['programcoordinatoremail'].str.lower()
-active = active[active['Status']!='Chief Resident']
-pd_list_columns = ['program', 'programtype', 'department', 'programdirector_first_name',
-       'programdirector_last_name', 'programdirector', 'programdirectoremail',
-       'programcoordinator', 'programcoordinatoremail']
-
-pd_list_columns_update = ['Program', 'programtype', 'department', 'Program Director First Name',
-       'Program Director Last Name', 'programdirector', 'Program Director Email',
-       'programcoordinator', 'Program Admin Email']
-pd_list.columns = pd_list_columns_update
-# filter down hours based on week of interest
-# define week of interest
-
-# Get today's date (midnight)
-today = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
-
-# Determine most recent Sunday (start of the current week)
-# weekday(): Monday=0, Sunday=6 → days_since_sunday = (weekday + 1) % 7
-days_since_sunday = (today.weekday() + 1) % 7
-start_of_this_week = today - timedelta(days=days_since_sunday)
-
-# Define last week's range (Sunday → next Saturday)
-start_of_last_week = start_of_this_week - timedelta(days=7)
-end_of_last_week = start_of_this_week - timedelta(days=1)   # Saturday
-
-# Adjust times
-start_of_last_week = start_of_last_week.replace(hour=0, minute=0, second=0, microsecond=0)  # Sunday 12:00 AM
-end_of_last_week = end_of_last_week.replace(hour=23, minute=59, second=0, microsecond=0)      # Saturday 11:59 PM
-
-
-# Filter rows between end and start of week
-mask = (hours['Actual Start'] >= start_of_last_week) & (hours['Actual Start'] <= end_of_last_week)
-df_last_week = hours.loc[mask].copy() 
-resQ = df_last_week[df_last_week['Work Type']=='ResQ Working']
-
-df_last_week['In Violation'] = df_last_week['In Violation'].str.strip().str.lower()
-
-valid_yes = ['yes', 'y']
-
-violations = df_last_week[df_last_week['In Violation'].isin(valid_yes)]
-
-#missing_hours
-unique_emails_hours_entry = df_last_week["Trainee Email"].unique().tolist()
-
-# Convert to set for faster lookup
-email_set_hours = set(unique_emails_hours_entry)
-
-# Get emails in df1 that are NOT in df2
-emails_not_in_hours = set(active["Trainee Email"]) - email_set_hours
-
-# Convert to a list if you want
-emails_not_in_hours = list(emails_not_in_hours)
-
-print(emails_not_in_hours)
-
-violations['Violations'] = violations['Actual Start'].dt.strftime('%m/%d/%Y') +' '+ violations['Rules Violated']
-# group by unique email
-consolidated_violations = (
-    violations.groupby(['Trainee Email'], as_index=False)
-      .agg({
-          'Trainee First Name': 'first',
-          'Trainee Last Name': 'first',
-          'Program Admin Email':'first',
-          'Program':'first',
-          'Violations': lambda x: ', '.join(sorted(set(x.dropna())))
-      })
-)
-consolidated_resQ = (
-    resQ.groupby(['Trainee Email'], as_index=False)
-      .agg({
-          'Trainee First Name': 'first',
-          'Trainee Last Name': 'first',
-          'Program Admin Email':'first',
-          'Program':'first',
-          'Work Type': lambda x: ', '.join(sorted(set(x.dropna())))
-      })
-)
-consolidated_resQ['ResQ Violations'] = 'Yes'
-consolidated_resQ = consolidated_resQ.drop('Work Type', axis=1)
-# partial hour inclusion to the missing hours variable 
-
-#get count of days each day has added hours, if that count is less than 5, they are considered missing hours
-df_last_week['Shift Date'] = df_last_week['Actual Start'].dt.date
-days_worked = (
-    df_last_week.groupby('Trainee Email')['Actual Start']
-      .nunique()   # count unique dates
-      .reset_index(name='Days Worked')
-)
-
-less_than_5 = days_worked[days_worked['Days Worked'] < 5]
-
-df_filtered = df_last_week[df_last_week['Trainee Email'].isin(less_than_5['Trainee Email'])]
-
-df_filtered = df_filtered.drop(columns= 'Shift Date')
-
-df_filtered_unique = df_filtered.drop_duplicates(subset='Trainee Email', keep='first')
-
-def expand_shift_days(row):
-    start = row['Actual Start'].normalize()
-    end = row['Actual End'].normalize()
-
-    # Generate daily date range
-    return pd.date_range(start, end, freq='D').date
-
-df_last_week['Days Covered'] = df_last_week.apply(expand_shift_days, axis=1)
-df_days = df_last_week.explode('Days Covered')
-
-days_worked = (
-    df_days.groupby('Trainee Email')['Days Covered']
-           .nunique()
-           .reset_index(name='Days Worked')
-)
-
-less_than_5 = days_worked[days_worked['Days Worked'] < 5]
-
-df_filtered = df_last_week[
-    df_last_week['Trainee Email'].isin(less_than_5['Trainee Email'])
-]
-
-df_filtered_unique = df_filtered.drop_duplicates(
-    subset='Trainee Email',
-    keep='first'
-)
-
-consolidated_partial_hours_miss = (
-    df_filtered_unique.groupby(['Trainee Email'], as_index=False)
-      .agg({
-          'Trainee First Name': 'first',
-          'Trainee Last Name': 'first',
-          'Program':'first',
-          'Program Admin Email':'first'
-      })
-)
-
-consolidated_partial_hours_miss['Week of Missing Hours'] = start_of_last_week.strftime('%m/%d/%Y') +'-' + end_of_last_week.strftime('%m/%d/%Y')
-#get hours together
-hours_miss = active[active['Trainee Email'].isin(emails_not_in_hours)]
-consolidated_hours_miss = (
-    hours_miss.groupby(['Trainee Email'], as_index=False)
-      .agg({
-          'Trainee First Name': 'first',
-          'Trainee Last Name': 'first',
-          'Program':'first',
-          'Program Admin Email':'first'
-      })
-)
-consolidated_hours_miss['Week of Missing Hours'] = start_of_last_week.strftime('%m/%d/%Y') +'-' + end_of_last_week.strftime('%m/%d/%Y')
-total_consolidated_hours_miss = pd.concat([consolidated_hours_miss,consolidated_partial_hours_miss], ignore_index= True)
-total_consolidated_hours_miss_unique = total_consolidated_hours_miss.drop_duplicates(subset='Trainee Email', keep='first')
-#join together 
-table = pd.concat([consolidated_resQ, total_consolidated_hours_miss_unique, consolidated_violations], ignore_index= True)
-id_cols = ['Trainee Email']
-
-# All other columns to keep, filling NaNs where possible
-value_cols = [col for col in table.columns if col not in id_cols]
-
-# Group by email and take the first non-NaN for each column
-consolidated_df = table.groupby(id_cols, as_index=False).agg(
-    {col: 'first' for col in value_cols}
-)
-columns_to_use = ['Program Admin Email','Program Director First Name', 'Program Director Last Name', 'Program Director Email', 'Program']
-consolidated_df1 = consolidated_df.merge(pd_list[columns_to_use], 
-                                         on=["Program Admin Email","Program"], how="left")
-#remove program that do not have "ACGME" in title
-consolidated_df1 = consolidated_df1[consolidated_df1['Program'].str.contains('ACGME')]
-# remove test cases from jeffrey.mckelvey@cshs.org	
-consolidated_df1 = consolidated_df1[consolidated_df1['Trainee Email']!='jeffrey.mckelvey@cshs.org']
-# Added filter for Pilot Programs
-pilots = ['NEUROSURG-Neurological Surgery-ACGME', 'Imaging-Diagnostic Radiology-ACGME', 'MED-Pulmonary Disease & Critical Care Medicine-ACGME',
-          'RAD-Radiation Oncology-ACGME', 'PEDS-Pediatric Medicine-ACGME', 'Surgery-Advanced GI MIS/Bariatric', 'MED-Hospice & Palliative Care Medicine-ACGME',
-          'OB/GYN-Obstetrics & Gynecology-ACGME', 'MED-Rheumatology-ACGME']
-consolidated_df1 = consolidated_df1[consolidated_df1['Program'].isin(pilots)]
-
-
-# Load Excel files into a DataFrame
-
-active_file_name = 'active.xlsx'
-hours_file_name = 'hours.xlsx'
-
-active_file_path = os.path.join(folder_path, active_file_name)
-hours_file_path = os.path.join(folder_path, hours_file_name)
-
-
-new_active_file_path = os.path.join(old_file_folder_path, 'old_active_list')
-new_hours_file_path = os.path.join(old_file_folder_path, 'old_hours_list')
-
-date_str = datetime.today().strftime("%m_%d_%Y")  # e.g., "10_22_2025"
-
-# Build new file name
-base_name, ext = os.path.splitext(os.path.basename(active_file_name))
-new_active_file_name = f"{base_name}_{date_str}{ext}"
-
-# Get the full destination path
-active_destination_file = os.path.join(new_active_file_path, new_active_file_name)
-
-# Move the file
-shutil.move(active_file_path, active_destination_file)
-#print(source_file, destination_file)
-print(f'Moved: {new_active_file_name}')
-
-# Build new file name
-base_name, ext = os.path.splitext(os.path.basename(hours_file_name))
-new_hours_file_name = f"{base_name}_{date_str}{ext}"
-
-# Get the full destination path
-hours_destination_file = os.path.join(new_hours_file_path, new_hours_file_name)
-
-
-shutil.move(hours_file_path, hours_destination_file)
-#print(source_file, destination_file)
-print(f'Moved: {new_hours_file_name}')
-qc_df = (consolidated_df1
-        .groupby('Program')
-        .size()
-        .reset_index(name='Count')
-        )
-qc_df['SummaryLine'] = qc_df['Program'] + ' → ' + qc_df['Count'].astype(str) + ' trainees'
-
-# Convert 'SummaryLine' column into a single string with newline separators
-full_summary = '\n'.join(qc_df['SummaryLine'].astype(str))
-
-# Optionally, save it back to Excel in a new column or a single cell
-# For example, create a new row with the concatenated summary
-summary_df = pd.DataFrame({'FullSummary': [full_summary]})
-
-compliance_list_name = 'weekly_compliance_email_list.xlsx'
-compliance_list_location = os.path.join(folder_path, compliance_list_name)
-
-# --- Save both DataFrames ---
-with pd.ExcelWriter(compliance_list_location, engine='openpyxl') as writer:
-    consolidated_df1.to_excel(writer, sheet_name="Sheet1", index=False)
-    summary_df.to_excel(writer, sheet_name="Sheet2", index=False)
-
-# ensure writer handle released
-try:
-    del writer
-except NameError:
-    pass
-
-
-import time
-# small pause to let OS release file lock
-time.sleep(2)   # try 2 seconds; increase to 3-4 if still locked
-
-import gc
-# force garbage collection
-gc.collect()
-
-# --- Reopen workbook to add tables ---
-wb = load_workbook(compliance_list_location)
-
-# --- Table for Sheet1 ---
-ws1 = wb["Sheet1"]
-num_rows1 = consolidated_df1.shape[0] + 1
-num_cols1 = consolidated_df1.shape[1]
-table_ref1 = f"A1:{chr(64 + num_cols1)}{num_rows1}"
-tab1 = Table(displayName="Table1", ref=table_ref1)
-style1 = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
-tab1.tableStyleInfo = style1
-ws1.add_table(tab1)
-
-# --- Table for Sheet2 ---
-ws2 = wb["Sheet2"]
-num_rows2 = summary_df.shape[0] + 1
-num_cols2 = summary_df.shape[1]
-table_ref2 = f"A1:{chr(64 + num_cols2)}{num_rows2}"
-tab2 = Table(displayName="Table2", ref=table_ref2)
-style2 = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
-tab2.tableStyleInfo = style2
-ws2.add_table(tab2)
-
-# --- Save ---
-wb.save(compliance_list_location)
-wb.close()
-del wb
-gc.collect()
-import os
-try:
-    with open(compliance_list_location, 'a'):
-        print("File is writable")
-except Exception as e:
-    print("File still locked:", e)
+# set (e.g. 50_000) to stream hours.xlsx in bounded-memory batches
+HOURS_BATCH_SIZE = None
+
+# shifts starting up to this many days before the 4-week rule period can still run into it
+RULE_LOOKBACK_DAYS = 2
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+
+# ---------- Dates ----------
+def last_week_range(reference_date=None):
+    """
+    Returns (start_of_last_week, end_of_last_week, start_of_this_week):
+    Sunday 12:00 AM through Saturday 11:59 PM of the week before reference_date.
+    """
+    if reference_date is None:
+        reference_date = datetime.today()
+    today = reference_date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # weekday(): Monday=0, Sunday=6 → days_since_sunday = (weekday + 1) % 7
+    days_since_sunday = (today.weekday() + 1) % 7
+    start_of_this_week = today - timedelta(days=days_since_sunday)
+
+    start_of_last_week = start_of_this_week - timedelta(days=7)
+    end_of_last_week = (start_of_this_week - timedelta(days=1)).replace(hour=23, minute=59)
+    return start_of_last_week, end_of_last_week, start_of_this_week
+
+
+def previous_list_date(reference_date):
+    # The list being replaced was produced on the previous run day (runs are Monday/Thursday)
+    today = reference_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    weekday = today.weekday()  # Monday=0, ..., Sunday=6
+    if weekday == 0:  # Monday -> previous Thursday
+        return today - timedelta(days=4)
+    if weekday == 3:  # Thursday -> previous Monday
+        return today - timedelta(days=3)
+    return today
+
+
+# ---------- Inputs ----------
+@instrument(outputs=('active', 'hours', 'directory'))
+def read_inputs(active_path, hours_path, pd_list_path, cache_dir, window_start, window_end,
+                programs=PILOTS, batch_size=HOURS_BATCH_SIZE):
+    """
+    Returns the normalized (active, hours) frames and the PD list's program
+    directory. Only the window's rows, the pilot programs and the columns the rules
+    use are loaded; normalized frames are cached by workbook content hash, shared
+    with the monthly job.
+    """
+    from compliance_ingest import HOURS_RULE_COLS, concurrent_inputs
+
+    # The three workbooks load concurrently; hours.xlsx dominates
+    with concurrent_inputs(active_path, hours_path, pd_list_path, cache_dir, window_start, window_end,
+                           programs, HOURS_RULE_COLS, batch_size) as (active, hours, directory):
+        return active.result(), hours.result(), directory.result()
+
+
+# ---------- Core Processing ----------
+@instrument(rows_arg='hours')
+def process_week(active, hours, directory, start_of_last_week, end_of_last_week, programs=PILOTS):
+    import numpy as np
+    import pandas as pd
+    from compliance_engine import (ACGME_AVERAGING_WEEKS, ACGME_MAX_WEEKLY_HOURS, ACGME_MAX_CONTINUOUS_HOURS,
+                                   ACGME_DAYS_OFF_PER_WEEK, partial_coverage, trainee_ids, weekly_hours,
+                                   rolling_average_hours, duty_periods, short_rest, duty_free_days,
+                                   period_messages, join_sorted_unique_by)
+    from compliance_ingest import decategorize
+    from compliance_directory import DIRECTOR_COLS, enrich
+
+    # Filter rows between end and start of week
+    mask = (hours['Actual Start'] >= start_of_last_week) & (hours['Actual Start'] <= end_of_last_week)
+    df_last_week = hours.loc[mask].copy()
+
+    # Trainees as dense integer ids (email, NPI fallback); the set and group work below runs on them.
+    # Rows keep the resolved email so NPI-only rows are reported under it.
+    emails, (active_ids, week_ids, hours_ids) = trainee_ids(active, df_last_week, hours)
+    active = active.loc[active_ids >= 0].assign(**{'Trainee Id': active_ids[active_ids >= 0]})
+    active['Trainee Email'] = emails[active['Trainee Id']]
+    df_last_week = df_last_week.loc[week_ids >= 0].assign(**{'Trainee Id': week_ids[week_ids >= 0]})
+    df_last_week['Trainee Email'] = emails[df_last_week['Trainee Id']]
+    hours = hours.loc[hours_ids >= 0].assign(**{'Trainee Id': hours_ids[hours_ids >= 0]})
+    hours['Trainee Email'] = emails[hours['Trainee Id']]
+
+    resQ = df_last_week[df_last_week['Work Type'] == 'ResQ Working']
+
+    df_last_week['In Violation'] = df_last_week['In Violation'].str.strip().str.lower()
+    violations = decategorize(df_last_week[df_last_week['In Violation'].isin(['yes', 'y'])])
+
+    #missing_hours: active trainees with no entry last week
+    ids_not_in_hours = np.setdiff1d(active['Trainee Id'].to_numpy(), df_last_week['Trainee Id'].to_numpy())
+    logging.info(f"{len(ids_not_in_hours)} active trainees without hours entries")
+
+    violations = violations.assign(
+        Violations=violations['Actual Start'].dt.strftime('%m/%d/%Y') + ' ' + violations['Rules Violated'])
+    # group by unique trainee
+    consolidated_violations = (
+        violations.groupby(['Trainee Id'], as_index=False)
+          .agg({
+              'Trainee Email': 'first',
+              'Trainee First Name': 'first',
+              'Trainee Last Name': 'first',
+              'Program Admin Email': 'first',
+              'Program': 'first',
+              'Violations': lambda x: ', '.join(sorted(set(x.dropna())))
+          })
+    )
+    consolidated_resQ = (
+        resQ.groupby(['Trainee Id'], as_index=False)
+          .agg({
+              'Trainee Email': 'first',
+              'Trainee First Name': 'first',
+              'Trainee Last Name': 'first',
+              'Program Admin Email': 'first',
+              'Program': 'first',
+          })
+    )
+    consolidated_resQ['ResQ Violations'] = 'Yes'
+
+    # ACGME hour rules over the 4 weeks ending with last week: 80-hour average and days off,
+    # then duty periods of last week over 24+4 hours (24+) or after too short a rest (SB)
+    n_ids = max(len(emails), 1)
+    first_rule_week = start_of_last_week - timedelta(weeks=ACGME_AVERAGING_WEEKS - 1)
+    average_hours = rolling_average_hours(
+        weekly_hours(hours, first_rule_week, ACGME_AVERAGING_WEEKS, n_ids))[:, -1]
+    periods = duty_periods(hours)
+    free_days = duty_free_days(periods, first_rule_week, 7 * ACGME_AVERAGING_WEEKS, n_ids)
+    last_week_periods = periods[(periods['Start'] >= start_of_last_week)
+                                & (periods['Start'] < start_of_last_week + timedelta(days=7))]
+    long_duty = last_week_periods[last_week_periods['Hours'] > ACGME_MAX_CONTINUOUS_HOURS]
+    short_breaks = last_week_periods[short_rest(last_week_periods)]
+    rule_findings = pd.concat({
+        '80 Hr': pd.Series(average_hours.round(1)).loc[average_hours > ACGME_MAX_WEEKLY_HOURS],
+        'Day Off': pd.Series(free_days).loc[free_days < ACGME_DAYS_OFF_PER_WEEK * ACGME_AVERAGING_WEEKS],
+        '24+': join_sorted_unique_by(long_duty['Trainee Id'], period_messages(long_duty, 'Hours', 'h')),
+        'SB': join_sorted_unique_by(short_breaks['Trainee Id'], period_messages(short_breaks, 'Rest Before', 'h rest')),
+    }, axis=1)
+    consolidated_rules = (
+        hours[hours['Trainee Id'].isin(rule_findings.index)].groupby(['Trainee Id'], as_index=False)
+          .agg({
+              'Trainee Email': 'first',
+              'Trainee First Name': 'first',
+              'Trainee Last Name': 'first',
+              'Program Admin Email': 'first',
+              'Program': 'first',
+          })
+    )
+    consolidated_rules = consolidated_rules.join(rule_findings, on='Trainee Id')
+
+    # partial hour inclusion to the missing hours variable
+    #get count of days covered by each trainee's shifts, if that count is less than 5, they are considered missing hours
+    less_than_5 = partial_coverage(df_last_week, key_col='Trainee Id')
+    df_filtered_unique = df_last_week[df_last_week['Trainee Id'].isin(less_than_5)].drop_duplicates(
+        subset='Trainee Id', keep='first')
+
+    week_of_missing_hours = start_of_last_week.strftime('%m/%d/%Y') + '-' + end_of_last_week.strftime('%m/%d/%Y')
+    consolidated_partial_hours_miss = (
+        df_filtered_unique.groupby(['Trainee Id'], as_index=False)
+          .agg({
+              'Trainee Email': 'first',
+              'Trainee First Name': 'first',
+              'Trainee Last Name': 'first',
+              'Program': 'first',
+              'Program Admin Email': 'first'
+          })
+    )
+    consolidated_partial_hours_miss['Week of Missing Hours'] = week_of_missing_hours
+
+    #get hours together
+    hours_miss = active[active['Trainee Id'].isin(ids_not_in_hours)]
+    consolidated_hours_miss = (
+        hours_miss.groupby(['Trainee Id'], as_index=False)
+          .agg({
+              'Trainee Email': 'first',
+              'Trainee First Name': 'first',
+              'Trainee Last Name': 'first',
+              'Program': 'first',
+              'Program Admin Email': 'first'
+          })
+    )
+    consolidated_hours_miss['Week of Missing Hours'] = week_of_missing_hours
+    total_consolidated_hours_miss = pd.concat([consolidated_hours_miss, consolidated_partial_hours_miss], ignore_index=True)
+    total_consolidated_hours_miss_unique = total_consolidated_hours_miss.drop_duplicates(subset='Trainee Id', keep='first')
+
+    #join together
+    table = decategorize(pd.concat([consolidated_resQ, total_consolidated_hours_miss_unique, consolidated_violations,
+                                    consolidated_rules], ignore_index=True))
+    id_cols = ['Trainee Id']
+
+    # Group by trainee and take the first non-NaN for each other column (id order is email order)
+    value_cols = [col for col in table.columns if col not in id_cols]
+    consolidated_df = table.groupby(id_cols, as_index=False).agg(
+        {col: 'first' for col in value_cols}
+    ).drop(columns=id_cols)
+    consolidated_df1 = enrich(consolidated_df, directory, DIRECTOR_COLS, by_admin=True)
+    #remove program that do not have "ACGME" in title
+    consolidated_df1 = consolidated_df1[consolidated_df1['Program'].str.contains('ACGME')]
+    # remove test cases
+    consolidated_df1 = consolidated_df1[~consolidated_df1['Trainee Email'].isin(EXCLUDED_EMAILS)]
+    # Added filter for Pilot Programs
+    if programs is not None:
+        consolidated_df1 = consolidated_df1[consolidated_df1['Program'].isin(programs)]
+    return consolidated_df1
+
+
+@instrument(rows_arg='hours')
+def store_findings(db_path, active, hours, week_starts, programs=PILOTS):
+    # Per-(trainee, week) findings of every week loaded for the rules; late entries refresh earlier weeks
+    from compliance_findings import findings_from_hours, save_findings
+
+    findings = findings_from_hours(active, hours, week_starts)
+    save_findings(db_path, findings, week_starts, programs)
+    return findings
+
+
+# ---------- Output & Archive ----------
+@instrument()
+def list_changes(previous_path, consolidated_df1, cache_dir):
+    """
+    Week-over-week changes (compliance_changes.diff_lists) of consolidated_df1
+    against the list at previous_path, read through the ingest cache. None
+    without a previous list, or when it cannot be read.
+    """
+    from compliance_changes import load_list, diff_lists
+
+    if not os.path.exists(previous_path):
+        logging.info(f"No previous list at {previous_path}; no Changes sheet this run")
+        return None
+    try:
+        return diff_lists(load_list(previous_path, cache_dir), consolidated_df1)
+    except Exception as e:
+        logging.warning(f"Could not compare with the previous list {previous_path}: {e}")
+        return None
+
+
+@instrument()
+def save_output(consolidated_df1, out_path, changes=None, cache_dir=None):
+    from compliance_output import write_workbook, summary_frame
+    from compliance_changes import trainee_changes, cache_list
+
+    # --- Save both DataFrames (and the changes since the previous list) with their styled tables in one pass ---
+    sheets = [("Sheet1", consolidated_df1), ("Sheet2", summary_frame(consolidated_df1))]
+    if changes is not None:
+        sheets.append(("Changes", trainee_changes(changes)))
+    write_workbook(out_path, sheets)
+    # Next run's diff reads this list back from the ingest cache
+    if cache_dir is not None:
+        cache_list(out_path, consolidated_df1, cache_dir)
+    return out_path
+
+
+def _move(src, dst):
+    if os.path.exists(src):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.move(src, dst)
+        logging.info(f"Moved {src} -> {dst}")
+    else:
+        logging.warning(f"File not found, not moved: {src}")
+
+
+def archived_list_path(out_path, old_file_folder_path, reference_date):
+    # past_lists/old_compliance_list/<name>_<previous run date>.xlsx
+    date_str = previous_list_date(reference_date).strftime("%m_%d_%Y")
+    base_name, ext = os.path.splitext(os.path.basename(out_path))
+    return os.path.join(old_file_folder_path, 'old_compliance_list', f"{base_name}_{date_str}{ext}")
+
+
+def latest_archived_list(out_path, old_file_folder_path, reference_date):
+    """
+    The newest archived list produced on or before the previous run day, the
+    baseline of a run that does not archive (the list in place may be its own
+    earlier output); archived_list_path() when there is none.
+    """
+    base_name, ext = os.path.splitext(os.path.basename(out_path))
+    folder = os.path.join(old_file_folder_path, 'old_compliance_list')
+    cutoff = previous_list_date(reference_date)
+    dated = []
+    for name in (os.listdir(folder) if os.path.isdir(folder) else []):
+        stem, name_ext = os.path.splitext(name)
+        if name_ext != ext or not stem.startswith(f"{base_name}_"):
+            continue
+        try:
+            produced = datetime.strptime(stem[len(base_name) + 1:], "%m_%d_%Y")
+        except ValueError:
+            continue
+        if produced <= cutoff:
+            dated.append((produced, os.path.join(folder, name)))
+    return max(dated)[1] if dated else archived_list_path(out_path, old_file_folder_path, reference_date)
+
+
+@instrument()
+def archive_previous_list(out_path, old_file_folder_path, reference_date):
+    _move(out_path, archived_list_path(out_path, old_file_folder_path, reference_date))
+
+
+@instrument()
+def archive_inputs(active_path, hours_path, old_file_folder_path, reference_date):
+    # inputs -> past_lists/archive, content-addressed (see compliance_archive); archived workbooks are removed
+    from compliance_archive import ARCHIVE_DIR_NAME, archive_workbooks
+
+    archive_workbooks(os.path.join(old_file_folder_path, ARCHIVE_DIR_NAME), [(active_path, 'active'), (hours_path, 'hours')],
+                      reference_date, os.path.join(old_file_folder_path, 'ingest_cache'))
+
+
+# ---------- Main ----------
+def run(folder_path, reference_date=None, archive=True, active_path=None, hours_path=None,
+        pd_list_path=None, output_path=None, programs=PILOTS, batch_size=HOURS_BATCH_SIZE,
+        trace_memory=False, profile_stage=None, workers=1, loader=None, findings=True, checkpoints=True,
+        keep_inputs=False):
+    """
+    Produces the weekly compliance list for the week before reference_date
+    (default: today) and returns (output path, consolidated frame).
+    A run report (per-stage timings, memory, row counts) is written next to the
+    output as <output>.run.json; trace_memory adds tracemalloc peaks per stage,
+    and profile_stage (e.g. 'process_week') dumps that stage's cProfile stats there.
+    workers > 1 (or 0: one per spare CPU) splits process_week into program shards
+    run in a process pool. loader(window_start, window_end, programs), returning
+    (active, hours, directory), replaces reading the workbooks, e.g. with frames
+    kept in memory by compliance_watch. With findings, the per-(trainee, week)
+    findings of the loaded weeks are saved to past_lists/findings.sqlite.
+    With checkpoints (and no loader), each stage's output is kept in
+    past_lists/checkpoints until the run completes, so a rerun after a failure
+    resumes from the last completed stage; the inputs are archived last, unless
+    keep_inputs leaves them for another job reading the same folder next.
+    The list gets a "Changes" sheet: the trainees with issues new or resolved
+    since the previous list (see compliance_changes). Without archive that is
+    the newest archived list from the previous run day or before, never the
+    one in place.
+    """
+    from compliance_parallel import map_program_shards
+    from compliance_engine import ACGME_AVERAGING_WEEKS
+    from compliance_checkpoint import open_run, resume, finish_run
+
+    if reference_date is None:
+        reference_date = datetime.today()
+    old_file_folder_path = os.path.join(folder_path, old_file_folder)
+    active_path = active_path or os.path.join(folder_path, ACTIVE_FILE_NAME)
+    hours_path = hours_path or os.path.join(folder_path, HOURS_FILE_NAME)
+    pd_list_path = pd_list_path or os.path.join(folder_path, PD_LIST_FILE_NAME)
+    output_path = output_path or os.path.join(folder_path, COMPLIANCE_LIST_NAME)
+    cache_dir = os.path.join(old_file_folder_path, 'ingest_cache')
+
+    start_of_last_week, end_of_last_week, start_of_this_week = last_week_range(reference_date)
+    logging.info(f"Analyzing week: {start_of_last_week} -> {end_of_last_week}")
+    ckpt = None
+    if checkpoints and loader is None:
+        ckpt = open_run(os.path.join(old_file_folder_path, 'checkpoints'), f"weekly_{start_of_last_week:%Y_%m_%d}",
+                        {'active': active_path, 'hours': hours_path, 'pd_list': pd_list_path},
+                        {'reference_date': f"{reference_date:%Y-%m-%d}", 'programs': programs, 'output': output_path,
+                         'archive': archive, 'keep_inputs': keep_inputs, 'findings': findings})
+
+    report = None
+    try:
+        with run_report('weekly', trace_memory, profile_stage, reference_date=reference_date,
+                        week_start=start_of_last_week, output=output_path) as report:
+            # The 4-week rules look back over earlier weeks, plus shifts running into the first one
+            rules_start = start_of_last_week - timedelta(weeks=ACGME_AVERAGING_WEEKS - 1, days=RULE_LOOKBACK_DAYS)
+            if loader is not None:
+                active, hours, directory = loader(rules_start, start_of_this_week, programs)
+            else:
+                active, hours, directory = resume(ckpt, 'read_inputs', read_inputs, active_path, hours_path,
+                                                  pd_list_path, cache_dir,
+                                                  rules_start, start_of_this_week, programs, batch_size)
+            consolidated_df1 = resume(ckpt, 'process_week', map_program_shards, process_week, active, hours,
+                                      directory, start_of_last_week, end_of_last_week, programs, workers=workers)
+            if findings:
+                first_rule_week = start_of_last_week - timedelta(weeks=ACGME_AVERAGING_WEEKS - 1)
+                resume(ckpt, 'store_findings', store_findings, os.path.join(old_file_folder_path, FINDINGS_DB_NAME),
+                       active, hours, [first_rule_week + timedelta(weeks=i) for i in range(ACGME_AVERAGING_WEEKS)],
+                       programs)
+
+            # The previous list is still in place, unless an earlier attempt of this run archived it. Without
+            # archiving, the list in place may be this run's own earlier output (compliance_watch rebuilds it)
+            if archive and os.path.exists(output_path):
+                previous_path = output_path
+            elif archive:
+                previous_path = archived_list_path(output_path, old_file_folder_path, reference_date)
+            else:
+                previous_path = latest_archived_list(output_path, old_file_folder_path, reference_date)
+            changes = resume(ckpt, 'list_changes', list_changes, previous_path, consolidated_df1, cache_dir)
+
+            if archive:
+                resume(ckpt, 'archive_previous_list', archive_previous_list, output_path, old_file_folder_path,
+                       reference_date)
+            resume(ckpt, 'save_output', save_output, consolidated_df1, output_path, changes, cache_dir)
+            if archive and not keep_inputs:
+                # Last: the inputs leave the folder only once everything else is done
+                resume(ckpt, 'archive_inputs', archive_inputs, active_path, hours_path, old_file_folder_path,
+                       reference_date)
+        if ckpt is not None:
+            finish_run(ckpt)
+    finally:
+        # Written for failed runs too, with the failing stage's error recorded
+        if report is not None:
+            write_report(report, report_path_for(output_path))
+    return output_path, consolidated_df1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the weekly work-hours compliance list.")
+    parser.add_argument('--reference-date', type=lambda s: datetime.strptime(s, '%Y-%m-%d'),
+                        help="Run as if today were this date (YYYY-MM-DD); last week is the week before it.")
+    parser.add_argument('--no-archive', action='store_true',
+                        help="Leave inputs and the previous list in place.")
+    parser.add_argument('--folder', help=f"Working folder (default: ${FOLDER_ENV_VAR}).")
+    parser.add_argument('--active', help="active.xlsx path (default: <folder>/active.xlsx).")
+    parser.add_argument('--hours', help="hours.xlsx path (default: <folder>/hours.xlsx).")
+    parser.add_argument('--pd-list', help="PD_and_PA_report_list.xlsx path (default: <folder>/PD_and_PA_report_list.xlsx).")
+    parser.add_argument('--output', help=f"Output workbook (default: <folder>/{COMPLIANCE_LIST_NAME}).")
+    parser.add_argument('--profile', metavar='STAGE',
+                        help="Run this stage (e.g. process_week) under cProfile; stats go next to the run report.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Process program shards in this many worker processes (0: one per spare CPU).")
+    parser.add_argument('--no-findings', action='store_true',
+                        help=f"Do not save the per-week findings to past_lists/{FINDINGS_DB_NAME}.")
+    parser.add_argument('--no-checkpoints', action='store_true',
+                        help="Do not keep stage checkpoints for resuming a failed run.")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Record per-stage tracemalloc peaks in the run report (slows the workbook parse).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    folder_path = args.folder or os.environ[FOLDER_ENV_VAR]
+    logging.info("Starting weekly compliance processing...")
+    out_path, _ = run(folder_path, reference_date=args.reference_date, archive=not args.no_archive,
+                      active_path=args.active, hours_path=args.hours, pd_list_path=args.pd_list,
+                      output_path=args.output, trace_memory=args.trace_memory,
+                      profile_stage=args.profile, workers=args.workers, findings=not args.no_findings,
+                      checkpoints=not args.no_checkpoints)
+    logging.info(f"Processing complete: {out_path}")
+    return out_path
+
+
+if __name__ == "__main__":
+    main()